@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    'ferias.middleware.EstaticosPrecomprimidosMiddleware',
+    'ferias.middleware.InstrumentacaoSQLMiddleware',
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -49,6 +52,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     'ferias.middleware.OnboardingMiddleware',
+    'ferias.middleware.ReplicaLeituraMiddleware',
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -78,6 +82,51 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # No SQLite o select_for_update não trava nada; com BEGIN IMMEDIATE
+            # cada transação pega o lock de escrita logo no início, e aprovações
+            # concorrentes ficam em fila em vez de falhar com "database is locked".
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
+        # Testes de concorrência precisam de um arquivo (modo WAL), não do banco em memória:
+        # FERIAS_TEST_DB=/tmp/ferias_teste.sqlite3 python manage.py test ferias
+        "TEST": {"NAME": os.environ.get("FERIAS_TEST_DB")},
+        # Conexões persistentes: FERIAS_CONN_MAX_AGE=60 reaproveita a conexão por
+        # até 60s; com FERIAS_CONN_HEALTH_CHECKS=1 ela é testada antes do reuso.
+        "CONN_MAX_AGE": int(os.environ.get("FERIAS_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": os.environ.get("FERIAS_CONN_HEALTH_CHECKS") == "1",
+    }
+}
+
+# Réplica de leitura opcional (ferias/db_router.py). Para testar localmente
+# com dois arquivos SQLite, copie o db.sqlite3 e aponte para a cópia:
+#   FERIAS_DB_REPLICA=/tmp/replica.sqlite3 python manage.py runserver
+# Com Postgres, troque ENGINE/NAME/HOST dos dois aliases (principal e réplica).
+if os.environ.get("FERIAS_DB_REPLICA"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": os.environ["FERIAS_DB_REPLICA"],
+        # Nos testes a réplica é o próprio banco de teste
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["ferias.db_router.RoteadorReplica"]
+# Depois de escrever, o usuário lê do principal por estes segundos (atraso de replicação)
+FERIAS_REPLICA_PINAGEM_SEGUNDOS = 10
+# De quanto em quanto tempo a saúde da réplica é verificada (SELECT 1)
+FERIAS_REPLICA_VERIFICACAO_SEGUNDOS = 30
+
+
+# Cache
+# O feed do calendário e os fragmentos versionados usam este cache.
+# LocMemCache é por processo: com vários workers em produção, troque por
+# um backend compartilhado (Redis/Memcached) para a invalidação valer para todos.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "sistema-ferias",
     }
 }
 
@@ -117,19 +166,52 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = "static/"
+# Build dos estáticos (hash no nome + .gz/.br): python manage.py compilar_estaticos
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "ferias.estaticos.EstaticosPrecomprimidos"},
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Instrumentação de SQL (ferias.middleware.InstrumentacaoSQLMiddleware):
+# a partir de quantas repetições da mesma consulta o log acusa um N+1.
+FERIAS_SQL_LIMIAR_DUPLICADAS = 5
+
+# Férias simultâneas por secretaria quando ela não tem RegraCapacidade
+# cadastrada (1 = ninguém pode sair junto com outra pessoa; None = sem limite).
+FERIAS_CAPACIDADE_PADRAO = 1
+
 LOGIN_URL = '/contas/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/contas/login/'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Caixa de saída de e-mails (ferias/notificacoes.py). Quem envia é o comando
+# process_outbox (cron/worker). O despacho imediato manda o lote logo depois
+# do commit, mas ainda na thread da requisição (espera pelo SMTP): só para
+# desenvolvimento ou servidores de e-mail locais e rápidos.
+FERIAS_EMAIL_DESPACHO_IMEDIATO = False
+FERIAS_EMAIL_MAX_TENTATIVAS = 5
+FERIAS_EMAIL_BACKOFF_SEGUNDOS = 60
+
 SESSION_COOKIE_AGE = 1800
 SESSION_SAVE_EVERY_REQUEST = True
+# Sessão deslizante sem um UPDATE por requisição (ver ferias/sessoes.py):
+# só regrava quando os dados mudam ou a cada FERIAS_SESSAO_LIMIAR_SEGUNDOS.
+SESSION_ENGINE = 'ferias.sessoes'
+FERIAS_SESSAO_LIMIAR_SEGUNDOS = 60
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+# Entrega da mídia pelo servidor web (ferias/midia.py). Com nginx, algo como
+#   location /_midia_protegida/ { internal; alias /caminho/para/media/; }
+# e FERIAS_MIDIA_X_ACCEL = '/_midia_protegida/'. Para Apache/lighttpd use
+# FERIAS_MIDIA_SENDFILE = True.
+FERIAS_MIDIA_X_ACCEL = None
+FERIAS_MIDIA_SENDFILE = False
\ No newline at end of file
@@ -1,11 +1,13 @@
 # config/urls.py
 
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 
 # Importações para servir arquivos de mídia (fotos)
 from django.conf import settings
-from django.conf.urls.static import static
+from ferias.midia import servir_midia
 
 # Importações para o login e cadastro
 from django.contrib.auth import views as auth_views
@@ -14,6 +16,9 @@ from ferias import views as ferias_views # Importamos as views para o cadastro
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+
+    # Métricas do processo (Prometheus), só para a equipe técnica
+    path('metrics', ferias_views.metricas, name='metricas'),
     
     # URL de Cadastro Público
     path('contas/cadastrar/', ferias_views.cadastro_view, name='cadastro'),
@@ -31,6 +36,10 @@ urlpatterns = [
     path('', include('ferias.urls')),
 ]
 
-# Adiciona a rota para servir arquivos de Mídia (fotos) em modo DEBUG
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Mídia (fotos) servida pelo ferias.midia, também em produção: ETag/304,
+# Range e, se configurado, X-Accel-Redirect/X-Sendfile para o servidor web.
+# Com MEDIA_URL apontando para outro domínio (CDN), a rota não é criada.
+if settings.MEDIA_URL.startswith('/'):
+    urlpatterns += [
+        re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<caminho>.+)$', servir_midia, name='midia'),
+    ]
\ No newline at end of file
@@ -1,12 +1,14 @@
 # ferias/admin.py
 
 from django.contrib import admin
-from .models import PerfilUsuario, PeriodoAquisitivo, SolicitacaoFerias, DescontoFerias
+from .models import PerfilUsuario, PeriodoAquisitivo, SolicitacaoFerias, DescontoFerias, EmailSaida, RegraCapacidade
+from .imagens import atualizar_miniaturas
+from .services import recalcular_saldos
 
 @admin.register(PerfilUsuario)
 class PerfilUsuarioAdmin(admin.ModelAdmin):
-    list_display = ('user', 'matricula', 'cargo', 'secretaria', 'lotacao', 'gestor', 'data_contratacao', 'onboarding_completo')
-    list_filter = ('secretaria', 'cargo', 'lotacao', 'onboarding_completo')
+    list_display = ('user', 'matricula', 'cargo', 'secretaria', 'lotacao', 'gestor', 'data_contratacao', 'onboarding_completo', 'saldo_total', 'dias_reservados')
+    list_filter = ('secretaria', 'cargo', 'lotacao', 'onboarding_completo', 'resumo_diario')
     search_fields = ('user__username', 'user__first_name', 'matricula', 'cargo')
     autocomplete_fields = ('user', 'gestor')
     
@@ -14,12 +16,32 @@ class PerfilUsuarioAdmin(admin.ModelAdmin):
     # muito mais rápido do que um dropdown padrão
     raw_id_fields = ('gestor',) 
 
+    # Foto trocada pelo admin: as miniaturas acompanham, como no editar_perfil
+    def save_model(self, request, obj, form, change):
+        if 'foto_perfil' in form.changed_data:
+            atualizar_miniaturas(obj, form.cleaned_data['foto_perfil'])
+        super().save_model(request, obj, form, change)
+
 @admin.register(PeriodoAquisitivo)
 class PeriodoAquisitivoAdmin(admin.ModelAdmin):
     list_display = ('perfil', 'data_inicio_aquisitivo', 'data_fim_aquisitivo', 'dias_disponiveis', 'status')
     list_filter = ('status', 'perfil__secretaria')
     search_fields = ('perfil__user__username',)
 
+    # Edições manuais de período precisam refletir no saldo mantido do perfil
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recalcular_saldos(PerfilUsuario.objects.filter(pk=obj.perfil_id))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recalcular_saldos(PerfilUsuario.objects.filter(pk=obj.perfil_id))
+
+    def delete_queryset(self, request, queryset):
+        perfis = list(queryset.values_list('perfil_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        recalcular_saldos(PerfilUsuario.objects.filter(pk__in=perfis))
+
 @admin.register(SolicitacaoFerias)
 class SolicitacaoFeriasAdmin(admin.ModelAdmin):
     list_display = ('solicitante', 'data_inicio', 'data_fim', 'status', 'aprovador_gestor')
@@ -27,6 +49,46 @@ class SolicitacaoFeriasAdmin(admin.ModelAdmin):
     search_fields = ('solicitante__username',)
     date_hierarchy = 'data_solicitacao'
 
+    # Apagar uma pendente ou mudar o status dela muda os dias reservados
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recalcular_saldos(PerfilUsuario.objects.filter(user_id=obj.solicitante_id))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recalcular_saldos(PerfilUsuario.objects.filter(user_id=obj.solicitante_id))
+
+    def delete_queryset(self, request, queryset):
+        usuarios = list(queryset.values_list('solicitante_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        recalcular_saldos(PerfilUsuario.objects.filter(user_id__in=usuarios))
+
 @admin.register(DescontoFerias)
 class DescontoFeriasAdmin(admin.ModelAdmin):
-    list_display = ('solicitacao', 'periodo_aquisitivo', 'dias_descontados')
\ No newline at end of file
+    list_display = ('solicitacao', 'periodo_aquisitivo', 'dias_descontados')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recalcular_saldos(PerfilUsuario.objects.filter(pk=obj.periodo_aquisitivo.perfil_id))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recalcular_saldos(PerfilUsuario.objects.filter(pk=obj.periodo_aquisitivo.perfil_id))
+
+    def delete_queryset(self, request, queryset):
+        perfis = list(queryset.values_list('periodo_aquisitivo__perfil_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        recalcular_saldos(PerfilUsuario.objects.filter(pk__in=perfis))
+
+@admin.register(RegraCapacidade)
+class RegraCapacidadeAdmin(admin.ModelAdmin):
+    list_display = ('secretaria', 'lotacao', 'max_pessoas', 'max_percentual')
+    list_filter = ('secretaria',)
+    search_fields = ('secretaria', 'lotacao')
+
+@admin.register(EmailSaida)
+class EmailSaidaAdmin(admin.ModelAdmin):
+    list_display = ('assunto', 'status', 'tentativas', 'proxima_tentativa', 'criado_em', 'enviado_em')
+    list_filter = ('status',)
+    search_fields = ('assunto',)
+    readonly_fields = ('tentativas', 'ultimo_erro', 'criado_em', 'enviado_em')
@@ -0,0 +1,153 @@
+# ferias/benchmark.py
+
+import datetime
+import math
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import PerfilUsuario, SolicitacaoFerias
+from .urls import urlpatterns
+
+# --- BENCHMARK POR VIEW ---
+# Cada URL de ferias/urls.py tem um cenário: quem acessa (funcionário, gestor
+# ou equipe técnica), o método e os parâmetros. Views que gravam rodam dentro
+# de uma transação desfeita no fim, para as repetições medirem a mesma coisa.
+# URLs novas sem cenário aparecem em "sem_cenario" no relatório.
+def _janela_pico():
+    ano = datetime.date.today().year
+    return {'start': f'{ano}-07-01', 'end': f'{ano}-08-01'}
+
+
+CENARIOS = {
+    'dashboard': {'ator': 'funcionario'},
+    'solicitar_ferias': {'ator': 'funcionario'},
+    'sugestoes_janelas': {'ator': 'funcionario', 'params': lambda: {'dias': 15, 'horizonte': 365}},
+    'ver_perfil': {'ator': 'funcionario'},
+    'editar_perfil': {'ator': 'funcionario'},
+    'onboarding': {'ator': 'funcionario'},
+    'calendario': {'ator': 'funcionario'},
+    'definir_tema': {'ator': 'funcionario', 'args': ['dark']},
+    'api_eventos': {'ator': 'funcionario', 'params': _janela_pico},
+    'api_ocupacao': {'ator': 'funcionario', 'params': _janela_pico},
+    'dashboard_gestor': {'ator': 'gestor', 'params': lambda: {'escopo': 'subarvore'}},
+    'api_equipe': {'ator': 'gestor', 'params': _janela_pico},
+    'aprovar_solicitacao': {'ator': 'gestor', 'metodo': 'post', 'pendente': True},
+    'rejeitar_solicitacao': {'ator': 'gestor', 'metodo': 'post', 'pendente': True},
+    'acao_em_lote': {'ator': 'gestor', 'metodo': 'post', 'lote': True},
+    'api_estatisticas_cache': {'ator': 'staff'},
+}
+
+
+def percentil(valores, p):
+    """Percentil pelo método do posto mais próximo (p entre 0 e 100)."""
+    ordenados = sorted(valores)
+    return ordenados[max(math.ceil(p / 100 * len(ordenados)) - 1, 0)]
+
+
+def escolher_atores():
+    """
+    Funcionário com mais solicitações e o gestor com mais pendências na
+    subárvore, dos dados já no banco (ex.: gerados pelo seed_ferias).
+    """
+    funcionario = User.objects.filter(perfil__isnull=False, is_staff=False).annotate(
+        total=Count('solicitacoes')
+    ).order_by('-total', 'pk').first()
+    gestor = PerfilUsuario.objects.filter(equipe__isnull=False).annotate(
+        total=Count('equipe')
+    ).order_by('-total', 'pk').select_related('user').first()
+    staff, _ = User.objects.get_or_create(username='benchmark_staff', defaults={'is_staff': True})
+    return {'funcionario': funcionario, 'gestor': gestor and gestor.user, 'staff': staff}
+
+
+def _montar_requisicao(nome, cenario, atores):
+    """Retorna (url, dados) do cenário, ou None se faltar dado para ele."""
+    args = list(cenario.get('args', []))
+    dados = cenario['params']() if 'params' in cenario else {}
+    if cenario.get('pendente') or cenario.get('lote'):
+        pendentes = SolicitacaoFerias.objects.filter(
+            status='PENDENTE_GESTOR', solicitante__perfil__gestor__user=atores['gestor']
+        ).values_list('pk', flat=True)
+        if cenario.get('lote'):
+            dados = {'acao': 'aprovar', 'solicitacoes': list(pendentes[:25])}
+            if not dados['solicitacoes']:
+                return None
+        else:
+            pk = pendentes.first()
+            if pk is None:
+                return None
+            args.append(pk)
+    return reverse(f'ferias:{nome}', args=args), dados
+
+
+def medir_views(repeticoes=20, nomes=None):
+    """
+    Roda cada cenário `repeticoes` vezes (depois de uma requisição de
+    aquecimento) e devolve {nome: {p50_ms, p95_ms, consultas, status}}.
+    """
+    atores = escolher_atores()
+    clientes = {}
+    resultados = {}
+    for nome in nomes or sorted(CENARIOS):
+        cenario = CENARIOS[nome]
+        ator = atores.get(cenario['ator'])
+        requisicao = ator and _montar_requisicao(nome, cenario, atores)
+        if not requisicao:
+            resultados[nome] = {'ignorado': 'sem dados para o cenário'}
+            continue
+        url, dados = requisicao
+        if cenario['ator'] not in clientes:
+            clientes[cenario['ator']] = Client(HTTP_ACCEPT='application/json')
+            clientes[cenario['ator']].force_login(ator)
+        cliente = clientes[cenario['ator']]
+        metodo = getattr(cliente, cenario.get('metodo', 'get'))
+
+        tempos, consultas = [], []
+        for rodada in range(repeticoes + 1):
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as contexto:
+                    inicio = time.perf_counter()
+                    resposta = metodo(url, dados)
+                    duracao = time.perf_counter() - inicio
+                if cenario.get('metodo') == 'post':
+                    transaction.set_rollback(True)
+            if rodada:  # a primeira só aquece caches e conexões
+                tempos.append(duracao * 1000)
+                consultas.append(len(contexto.captured_queries))
+
+        resultados[nome] = {
+            'p50_ms': round(statistics.median(tempos), 3),
+            'p95_ms': round(percentil(tempos, 95), 3),
+            'consultas': round(statistics.median(consultas)),
+            'status': resposta.status_code,
+        }
+    cache.clear()
+    return resultados
+
+
+def urls_sem_cenario():
+    return sorted(padrao.name for padrao in urlpatterns if padrao.name not in CENARIOS)
+
+
+def comparar_relatorios(anterior, atual):
+    """Linhas de texto com p50 e consultas de antes/depois, por tamanho e view."""
+    linhas = []
+    for tamanho, views in atual['tamanhos'].items():
+        antes_tamanho = anterior.get('tamanhos', {}).get(tamanho, {})
+        for nome, medida in views.items():
+            antes = antes_tamanho.get(nome)
+            if 'p50_ms' not in medida or not antes or 'p50_ms' not in antes:
+                continue
+            variacao = (medida['p50_ms'] - antes['p50_ms']) / antes['p50_ms'] * 100 if antes['p50_ms'] else 0
+            linhas.append(
+                f'{tamanho:>7} {nome:<24} p50 {antes["p50_ms"]:>8.2f} -> {medida["p50_ms"]:>8.2f} ms '
+                f'({variacao:+.0f}%)  consultas {antes["consultas"]} -> {medida["consultas"]}'
+            )
+    return linhas
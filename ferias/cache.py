@@ -0,0 +1,118 @@
+# ferias/cache.py
+
+import time
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.utils import timezone
+
+# --- VERSÃO DO FEED DE EVENTOS DO CALENDÁRIO ---
+# O payload de cada janela fica no cache sob uma chave que inclui a versão.
+# Quando uma solicitação muda de status, a versão sobe e as chaves antigas
+# simplesmente deixam de ser lidas (e expiram sozinhas).
+CHAVE_VERSAO_EVENTOS = 'ferias:eventos:versao'
+CHAVE_MODIFICADO_EVENTOS = 'ferias:eventos:modificado'
+TEMPO_PAYLOAD_EVENTOS = 60 * 60 * 24
+
+
+def versao_eventos():
+    """
+    Retorna (versao, modificado_em) do feed de eventos.
+    A versão inicial usa o relógio em milissegundos para que um cache
+    reiniciado nunca repita um ETag que o navegador já conhece.
+    """
+    valores = cache.get_many([CHAVE_VERSAO_EVENTOS, CHAVE_MODIFICADO_EVENTOS])
+    versao = valores.get(CHAVE_VERSAO_EVENTOS)
+    modificado = valores.get(CHAVE_MODIFICADO_EVENTOS)
+    if versao is None or modificado is None:
+        agora = timezone.now()
+        cache.add(CHAVE_VERSAO_EVENTOS, int(time.time() * 1000), None)
+        cache.add(CHAVE_MODIFICADO_EVENTOS, agora, None)
+        versao = cache.get(CHAVE_VERSAO_EVENTOS)
+        modificado = cache.get(CHAVE_MODIFICADO_EVENTOS, agora)
+    return versao, modificado
+
+
+def invalidar_eventos():
+    """Sobe a versão do feed de eventos (chamado pelos signals)."""
+    try:
+        cache.incr(CHAVE_VERSAO_EVENTOS)
+    except ValueError:
+        # Chave ainda não existe (ou expirou): versao_eventos() recria
+        cache.delete(CHAVE_MODIFICADO_EVENTOS)
+        return
+    cache.set(CHAVE_MODIFICADO_EVENTOS, timezone.now(), None)
+
+
+def chave_payload_eventos(versao, inicio, fim, secretaria, lotacao):
+    return f'ferias:eventos:{versao}:{inicio}:{fim}:{quote(secretaria or "")}:{quote(lotacao or "")}'
+
+
+def chave_payload_ocupacao(versao, inicio, fim, secretaria, lotacao):
+    # Mesma versão dos eventos: as duas respostas mudam com as férias aprovadas
+    return f'ferias:ocupacao:{versao}:{inicio}:{fim}:{quote(secretaria or "")}:{quote(lotacao or "")}'
+
+
+# --- FRAGMENTOS DE TEMPLATE POR USUÁRIO ---
+# Histórico, card do período e lista de períodos abertos (dashboard e perfil)
+# ficam no cache com a versão do usuário na chave. Os signals sobem a versão
+# quando uma solicitação, desconto ou período dele muda.
+TEMPO_FRAGMENTOS = 60 * 60
+FRAGMENTOS = ('dashboard_periodo', 'dashboard_historico', 'perfil_periodos')
+
+
+def _chave_versao_fragmentos(user_id):
+    return f'ferias:fragmentos:versao:{user_id}'
+
+
+def versao_fragmentos(user_id):
+    """Versão atual dos fragmentos do usuário (criada com o relógio, como a dos eventos)."""
+    chave = _chave_versao_fragmentos(user_id)
+    versao = cache.get(chave)
+    if versao is None:
+        cache.add(chave, int(time.time() * 1000), None)
+        versao = cache.get(chave)
+    return versao
+
+
+def invalidar_fragmentos(user_id):
+    try:
+        cache.incr(_chave_versao_fragmentos(user_id))
+    except ValueError:
+        # Sem versão guardada: a próxima leitura cria uma nova
+        pass
+
+
+def chave_fragmento(nome, partes):
+    return f'ferias:fragmento:{nome}:' + ':'.join(quote(str(parte)) for parte in partes)
+
+
+def _chave_contador(nome, acerto):
+    return f'ferias:fragmentos:{"acertos" if acerto else "falhas"}:{nome}'
+
+
+def registrar_fragmento(nome, acerto):
+    """Conta acertos e falhas de cada fragmento (ver estatisticas_fragmentos)."""
+    chave = _chave_contador(nome, acerto)
+    try:
+        cache.incr(chave)
+    except ValueError:
+        if not cache.add(chave, 1, None):
+            cache.incr(chave)
+
+
+def estatisticas_fragmentos():
+    """{nome: {'acertos', 'falhas', 'taxa_acerto'}} para cada fragmento conhecido."""
+    chaves = {(nome, acerto): _chave_contador(nome, acerto) for nome in FRAGMENTOS for acerto in (True, False)}
+    valores = cache.get_many(chaves.values())
+    estatisticas = {}
+    for nome in FRAGMENTOS:
+        acertos = valores.get(chaves[nome, True], 0)
+        falhas = valores.get(chaves[nome, False], 0)
+        total = acertos + falhas
+        estatisticas[nome] = {
+            'acertos': acertos,
+            'falhas': falhas,
+            'taxa_acerto': round(acertos / total, 3) if total else None,
+        }
+    return estatisticas
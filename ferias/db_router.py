@@ -0,0 +1,101 @@
+# ferias/db_router.py
+
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# --- RÉPLICA DE LEITURA ---
+# As views marcadas com @leitura_na_replica (e as listagens do admin) leem da
+# réplica; todo o resto, e qualquer escrita, vai para o banco principal.
+# O ReplicaLeituraMiddleware liga a réplica só durante a view, e só quando
+# o usuário não escreveu nada nos últimos segundos (ver pinagem abaixo).
+ALIAS_REPLICA = 'replica'
+
+_estado = ContextVar('ferias_replica', default=None)
+
+
+class EstadoLeitura:
+    """Estado da requisição atual: se pode ler da réplica e se já escreveu algo."""
+    __slots__ = ('usar_replica', 'escreveu')
+
+    def __init__(self, usar_replica):
+        self.usar_replica = usar_replica
+        self.escreveu = False
+
+
+def iniciar_requisicao(usar_replica):
+    estado = EstadoLeitura(usar_replica)
+    return estado, _estado.set(estado)
+
+
+def encerrar_requisicao(token):
+    _estado.reset(token)
+
+
+def leitura_na_replica(view_func):
+    """Marca uma view somente-leitura como apta a ler da réplica."""
+    view_func.leitura_na_replica = True
+    return view_func
+
+
+# Resultado da última verificação de saúde da réplica: (disponivel, verificado_em)
+_saude = {'disponivel': False, 'verificado_em': None}
+
+
+def replica_configurada():
+    return ALIAS_REPLICA in settings.DATABASES
+
+
+def replica_disponivel():
+    """
+    A réplica existe e respondeu a um SELECT 1 recentemente? A verificação
+    é refeita a cada FERIAS_REPLICA_VERIFICACAO_SEGUNDOS; fora do ar, as
+    leituras voltam para o principal sem derrubar a página.
+    """
+    if not replica_configurada():
+        return False
+    agora = time.monotonic()
+    intervalo = getattr(settings, 'FERIAS_REPLICA_VERIFICACAO_SEGUNDOS', 30)
+    if _saude['verificado_em'] is None or agora - _saude['verificado_em'] >= intervalo:
+        try:
+            with connections[ALIAS_REPLICA].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            _saude['disponivel'] = True
+        except Exception:
+            _saude['disponivel'] = False
+            connections[ALIAS_REPLICA].close()
+        _saude['verificado_em'] = agora
+    return _saude['disponivel']
+
+
+class RoteadorReplica:
+    """Roteador de banco (DATABASE_ROUTERS)."""
+
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if estado is None or not estado.usar_replica or estado.escreveu:
+            return None
+        # Dentro de uma transação no principal, a leitura tem que ver o que
+        # a própria transação escreveu
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return ALIAS_REPLICA
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            # Escreveu na requisição: o resto dela (e a pinagem) lê do principal
+            estado.escreveu = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e principal têm os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # A réplica recebe o esquema pela replicação, nunca por migrate
+        if db == ALIAS_REPLICA:
+            return False
+        return None
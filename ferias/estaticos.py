@@ -0,0 +1,80 @@
+# ferias/estaticos.py
+
+import gzip
+import logging
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, StaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # opcional: sem o pacote, só .gz
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# --- ARQUIVOS ESTÁTICOS COM HASH E PRÉ-COMPRIMIDOS ---
+# O collectstatic (ou o comando compilar_estaticos) grava em STATIC_ROOT a
+# cópia com hash no nome (style.3f2a9c.css) e, para os tipos de texto, as
+# irmãs .gz e .br. O EstaticosPrecomprimidosMiddleware escolhe a variante
+# pelo Accept-Encoding e manda os nomes com hash como "immutable".
+EXTENSOES_COMPRIMIVEIS = ('.css', '.js', '.svg', '.json', '.txt', '.map', '.html')
+# Só guarda a versão comprimida se ela economizar pelo menos 5%
+RAZAO_MINIMA = 0.95
+
+# (extensão da irmã, Content-Encoding), na ordem de preferência
+VARIANTES = (('.br', 'br'), ('.gz', 'gzip')) if brotli else (('.gz', 'gzip'),)
+
+
+def comprimir(conteudo):
+    """Retorna {extensao: bytes} das variantes que valem a pena."""
+    variantes = {'.gz': gzip.compress(conteudo, compresslevel=9, mtime=0)}
+    if brotli:
+        variantes['.br'] = brotli.compress(conteudo, quality=11)
+    return {
+        extensao: comprimido for extensao, comprimido in variantes.items()
+        if len(comprimido) < len(conteudo) * RAZAO_MINIMA
+    }
+
+
+class EstaticosPrecomprimidos(ManifestStaticFilesStorage):
+    # Sem o build (ex.: testes e desenvolvimento), {% static %} cai no nome original
+    manifest_strict = False
+
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force)
+        except ValueError:
+            return StaticFilesStorage.url(self, name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for nome_com_hash in set(self.hashed_files.values()):
+            if not nome_com_hash.endswith(EXTENSOES_COMPRIMIVEIS):
+                continue
+            with self.open(nome_com_hash) as arquivo:
+                conteudo = arquivo.read()
+            for extensao, comprimido in comprimir(conteudo).items():
+                destino = nome_com_hash + extensao
+                if self.exists(destino):
+                    self.delete(destino)
+                self.save(destino, ContentFile(comprimido))
+
+
+def variante_para(caminho, accept_encoding):
+    """
+    Escolhe o arquivo a servir: (caminho, content_encoding ou None).
+    Respeita q=0 ("br;q=0") no Accept-Encoding.
+    """
+    aceitas = set()
+    for item in accept_encoding.split(','):
+        codificacao, _, parametros = item.strip().partition(';')
+        if parametros.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            aceitas.add(codificacao.strip().lower())
+    for extensao, codificacao in VARIANTES:
+        if (codificacao in aceitas or '*' in aceitas) and os.path.isfile(caminho + extensao):
+            return caminho + extensao, codificacao
+    return caminho, None
@@ -3,7 +3,10 @@
 from django import forms
 from django.utils import timezone
 from dateutil.relativedelta import relativedelta
-from .models import PerfilUsuario, PeriodoAquisitivo, SolicitacaoFerias
+from .models import PerfilUsuario, SolicitacaoFerias
+from .imagens import atualizar_miniaturas
+from .ocupacao import verificar_capacidade
+from .services import criar_periodos_faltantes
 from django.core.exceptions import ValidationError
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib.auth.models import User
@@ -54,33 +57,41 @@ class SolicitacaoFeriasForm(forms.ModelForm):
             raise ValidationError(f"Você só pode solicitar férias após {um_ano_de_casa.strftime('%d/%m/%Y')}.")
 
         # Regra 4: Saldo em Cascata
-        periodos_com_saldo = PeriodoAquisitivo.objects.filter(
-            perfil=perfil,
-            dias_disponiveis__gt=0
-        ).order_by('data_inicio_aquisitivo')
-        saldo_total_disponivel = sum(p.dias_disponiveis for p in periodos_com_saldo)
+        # O saldo é mantido no próprio perfil (ver services.py); os dias já
+        # reservados por solicitações pendentes não podem ser pedidos de novo.
+        saldo_total_disponivel = perfil.saldo_livre
 
         if saldo_total_disponivel < total_dias_solicitados:
+            reservados = (
+                f" ({perfil.dias_reservados} dias já reservados em solicitações pendentes)"
+                if perfil.dias_reservados else ""
+            )
             raise ValidationError(
                 f"Saldo total insuficiente. Dias solicitados: {total_dias_solicitados}, "
-                f"Seu saldo total é: {saldo_total_disponivel} dias."
+                f"Seu saldo total é: {saldo_total_disponivel} dias{reservados}."
             )
 
-        # Regra 5: Conflito de Secretaria
-        secretaria_do_funcionario = perfil.secretaria
-        if secretaria_do_funcionario:
-            ferias_aprovadas_na_secretaria = SolicitacaoFerias.objects.filter(
-                solicitante__perfil__secretaria=secretaria_do_funcionario,
-                status='APROVADA_FINAL' # Só checa férias 100% aprovadas
-            ).exclude(pk=self.instance.pk)
-
-            for ferias_existente in ferias_aprovadas_na_secretaria:
-                if (data_inicio <= ferias_existente.data_fim and data_fim >= ferias_existente.data_inicio):
+        # Regra 5: Capacidade da Secretaria/Lotação
+        # Pico de férias aprovadas simultâneas na janela pedida (uma passada
+        # pelos intervalos ordenados, ver ocupacao.py) contra o limite da
+        # RegraCapacidade ou, sem regra, FERIAS_CAPACIDADE_PADRAO.
+        if perfil.secretaria:
+            estouro = verificar_capacidade(
+                perfil.secretaria, perfil.lotacao, data_inicio, data_fim, excluir_pk=self.instance.pk
+            )
+            if estouro:
+                lotacao, limite, pico, dia, (conflito_inicio, conflito_fim) = estouro
+                unidade = "da sua lotação" if lotacao else "da sua secretaria"
+                if limite == 1:
                     raise ValidationError(
-                        f"Conflito de datas! Alguém da sua secretaria já tem férias marcadas "
-                        f"entre {ferias_existente.data_inicio.strftime('%d/%m/%Y')} e "
-                        f"{ferias_existente.data_fim.strftime('%d/%m/%Y')}."
+                        f"Conflito de datas! Alguém {unidade} já tem férias marcadas "
+                        f"entre {conflito_inicio.strftime('%d/%m/%Y')} e "
+                        f"{conflito_fim.strftime('%d/%m/%Y')}."
                     )
+                raise ValidationError(
+                    f"Limite de férias simultâneas atingido! Em {dia.strftime('%d/%m/%Y')} já há "
+                    f"{pico} pessoas {unidade} de férias (máximo de {limite})."
+                )
         return cleaned_data
 
 # --- FORMULÁRIO DE LOGIN (CUSTOMIZADO) ---
@@ -109,7 +120,7 @@ class UserEditForm(forms.ModelForm):
 class PerfilUsuarioEditForm(forms.ModelForm):
     class Meta:
         model = PerfilUsuario
-        fields = ['foto_perfil', 'data_nascimento', 'matricula', 'cargo', 'secretaria', 'lotacao']
+        fields = ['foto_perfil', 'data_nascimento', 'matricula', 'cargo', 'secretaria', 'lotacao', 'resumo_diario']
         widgets = {
             'data_nascimento': forms.DateInput(attrs={'type': 'date'}),
         }
@@ -123,6 +134,15 @@ class PerfilUsuarioEditForm(forms.ModelForm):
         self.fields['secretaria'].widget.attrs.update({'class': 'input-form'})
         self.fields['lotacao'].widget.attrs.update({'class': 'input-form'})
 
+    def save(self, commit=True):
+        perfil = super().save(commit=False)
+        # Foto nova: gera as miniaturas (navbar e card) já no upload
+        if 'foto_perfil' in self.changed_data:
+            atualizar_miniaturas(perfil, self.cleaned_data['foto_perfil'])
+        if commit:
+            perfil.save()
+        return perfil
+
 # --- FORMULÁRIO DE CADASTRO PÚBLICO ---
 class CadastroForm(forms.ModelForm):
     username = forms.CharField(label="Nome de Usuário (login)", max_length=100)
@@ -188,5 +208,7 @@ class CadastroForm(forms.ModelForm):
         
         if commit:
             perfil.save()
+            # Já deixa os períodos aquisitivos prontos para o onboarding
+            criar_periodos_faltantes(perfil)
         
         return user
\ No newline at end of file
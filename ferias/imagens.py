@@ -0,0 +1,88 @@
+# ferias/imagens.py
+
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+# --- MINIATURAS DA FOTO DE PERFIL ---
+# Tamanhos fixos (já em 2x para telas de alta densidade): o navbar mostra
+# 40px e o card do perfil 200px. Os nomes levam o hash do conteúdo original,
+# então a URL muda sempre que a foto muda e pode ser servida com cache longo.
+TAMANHOS_MINIATURA = {
+    'foto_miniatura': 80,
+    'foto_cartao': 400,
+}
+PASTA_MINIATURAS = 'fotos_perfil/miniaturas/'
+# Suba quando mudar tamanhos/qualidade: gera nomes novos para tudo
+VERSAO_MINIATURAS = 1
+
+if features.check('webp'):
+    FORMATO_MINIATURA, EXTENSAO_MINIATURA, OPCOES_MINIATURA = 'WEBP', 'webp', {'quality': 80, 'method': 6}
+else:
+    FORMATO_MINIATURA, EXTENSAO_MINIATURA, OPCOES_MINIATURA = 'JPEG', 'jpg', {'quality': 85, 'optimize': True}
+
+
+def _hash_conteudo(arquivo):
+    sha = hashlib.sha256(f'v{VERSAO_MINIATURAS}:'.encode())
+    arquivo.seek(0)
+    for pedaco in iter(lambda: arquivo.read(1024 * 1024), b''):
+        sha.update(pedaco)
+    arquivo.seek(0)
+    return sha.hexdigest()[:16]
+
+
+def gerar_miniaturas(arquivo):
+    """
+    Recorta e reduz a foto para cada tamanho. Retorna {campo: (nome, bytes)};
+    nada é gravado aqui. `arquivo` é qualquer objeto de arquivo binário.
+    """
+    prefixo = _hash_conteudo(arquivo)
+    with Image.open(arquivo) as original:
+        # JPEG grande: decodifica já reduzido (potência de 2), bem mais barato
+        lado_maximo = max(TAMANHOS_MINIATURA.values())
+        original.draft('RGB', (lado_maximo, lado_maximo))
+        # Fotos de celular vêm "deitadas" com a rotação só no EXIF
+        imagem = ImageOps.exif_transpose(original)
+        transparente = imagem.mode in ('RGBA', 'LA', 'P') and FORMATO_MINIATURA == 'WEBP'
+        imagem = imagem.convert('RGBA' if transparente else 'RGB')
+
+        miniaturas = {}
+        for campo, lado in TAMANHOS_MINIATURA.items():
+            reduzida = ImageOps.fit(imagem, (lado, lado), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            reduzida.save(buffer, FORMATO_MINIATURA, **OPCOES_MINIATURA)
+            miniaturas[campo] = (f'{PASTA_MINIATURAS}{prefixo}_{lado}.{EXTENSAO_MINIATURA}', buffer.getvalue())
+    return miniaturas
+
+
+def gravar_miniaturas(miniaturas, storage=default_storage):
+    """Grava no storage as miniaturas que ainda não existem. Retorna {campo: nome}."""
+    nomes = {}
+    for campo, (nome, conteudo) in miniaturas.items():
+        # Mesmo hash = mesmo conteúdo: não precisa regravar
+        if not storage.exists(nome):
+            nome = storage.save(nome, ContentFile(conteudo))
+        nomes[campo] = nome
+    return nomes
+
+
+def aplicar_miniaturas(perfil, arquivo):
+    """Gera, grava e aponta no perfil (sem salvar o perfil) as miniaturas da foto."""
+    for campo, nome in gravar_miniaturas(gerar_miniaturas(arquivo)).items():
+        getattr(perfil, campo).name = nome
+
+
+def limpar_miniaturas(perfil):
+    for campo in TAMANHOS_MINIATURA:
+        getattr(perfil, campo).name = None
+
+
+def atualizar_miniaturas(perfil, arquivo):
+    """Foto trocada (formulário ou admin): miniaturas da nova, ou nenhuma se a foto saiu."""
+    if perfil.foto_perfil:
+        aplicar_miniaturas(perfil, arquivo)
+    else:
+        limpar_miniaturas(perfil)
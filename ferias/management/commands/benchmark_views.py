@@ -0,0 +1,94 @@
+import json
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from ferias.benchmark import CENARIOS, comparar_relatorios, medir_views, urls_sem_cenario
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Mede p50/p95 e consultas SQL de cada view de ferias/urls.py com dados do seed_ferias '
+            'em vários tamanhos, num banco de teste descartável. Grava um relatório JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanhos', default='100,1000,5000',
+                            help='Quantidades de usuários, separadas por vírgula. Padrão: 100,1000,5000.')
+        parser.add_argument('--repeticoes', type=int, default=20, help='Requisições medidas por view. Padrão: 20.')
+        parser.add_argument('--views', default='', help='Só estas views (nomes de URL, separados por vírgula).')
+        parser.add_argument('--saida', default='benchmark_views.json', help='Arquivo do relatório JSON.')
+        parser.add_argument('--comparar', help='Relatório anterior para comparar (ex.: de outro commit).')
+
+    def handle(self, *args, **options):
+        try:
+            tamanhos = sorted({int(t) for t in options['tamanhos'].split(',') if t.strip()})
+        except ValueError:
+            raise CommandError('--tamanhos deve ser uma lista de inteiros: 100,1000,5000')
+        nomes = [n.strip() for n in options['views'].split(',') if n.strip()] or None
+        desconhecidas = set(nomes or ()) - set(CENARIOS)
+        if desconhecidas:
+            raise CommandError(f'Views sem cenário: {", ".join(sorted(desconhecidas))}')
+        if not tamanhos or options['repeticoes'] < 1:
+            raise CommandError('Informe ao menos um tamanho e --repeticoes >= 1.')
+
+        relatorio = {
+            'commit': _commit_atual(),
+            'gerado_em': timezone.now().isoformat(),
+            'banco': connection.vendor,
+            'repeticoes': options['repeticoes'],
+            'sem_cenario': urls_sem_cenario(),
+            'tamanhos': {},
+        }
+
+        # Banco de teste descartável: o banco de desenvolvimento não é tocado
+        setup_test_environment()
+        nome_original = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for tamanho in tamanhos:
+                call_command('flush', interactive=False, verbosity=0)
+                cache.clear()
+                inicio = time.perf_counter()
+                call_command('seed_ferias', usuarios=tamanho, stdout=self.stdout)
+                self.stdout.write(f'[{tamanho} usuários] dados gerados em {time.perf_counter() - inicio:.1f}s; medindo...')
+                resultados = medir_views(options['repeticoes'], nomes)
+                relatorio['tamanhos'][str(tamanho)] = resultados
+                for nome, medida in resultados.items():
+                    if 'p50_ms' in medida:
+                        self.stdout.write(
+                            f'  {nome:<24} p50 {medida["p50_ms"]:>8.2f} ms  p95 {medida["p95_ms"]:>8.2f} ms  '
+                            f'{medida["consultas"]:>3} consultas  HTTP {medida["status"]}'
+                        )
+                    else:
+                        self.stdout.write(f'  {nome:<24} ignorada ({medida["ignorado"]})')
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Relatório gravado em {options["saida"]}.'))
+        if relatorio['sem_cenario']:
+            self.stdout.write(self.style.WARNING(f'URLs sem cenário: {", ".join(relatorio["sem_cenario"])}'))
+
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as arquivo:
+                anterior = json.load(arquivo)
+            self.stdout.write(f'\nComparação com {anterior.get("commit") or options["comparar"]}:')
+            for linha in comparar_relatorios(anterior, relatorio):
+                self.stdout.write(linha)
@@ -0,0 +1,34 @@
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from ferias.estaticos import EXTENSOES_COMPRIMIVEIS
+
+
+class Command(BaseCommand):
+    help = 'Gera em STATIC_ROOT os estáticos com hash no nome e as versões .gz/.br, e mostra a economia.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limpar', action='store_true',
+                            help='Apaga o STATIC_ROOT antes (remove hashes antigos).')
+
+    def handle(self, *args, **options):
+        call_command('collectstatic', interactive=False, clear=options['limpar'], verbosity=0)
+        staticfiles_storage.hashed_files, _ = staticfiles_storage.load_manifest()
+
+        raiz = str(settings.STATIC_ROOT)
+        for original, com_hash in sorted(staticfiles_storage.hashed_files.items()):
+            if not com_hash.endswith(EXTENSOES_COMPRIMIVEIS) or original.startswith('admin/'):
+                continue
+            caminho = os.path.join(raiz, com_hash)
+            tamanhos = [f'{os.path.getsize(caminho):>8} B']
+            for extensao in ('.gz', '.br'):
+                if os.path.isfile(caminho + extensao):
+                    tamanhos.append(f'{extensao} {os.path.getsize(caminho + extensao):>7} B')
+            self.stdout.write(f'  {com_hash}: ' + '  '.join(tamanhos))
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(staticfiles_storage.hashed_files)} arquivos com hash em {raiz}.'
+        ))
@@ -0,0 +1,34 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from ferias.notificacoes import enfileirar_emails, enviar_pendentes, mensagens_resumo_gestores
+
+
+class Command(BaseCommand):
+    help = 'Envia a cada gestor em modo resumo um único e-mail com as solicitações pendentes da equipe (agendar 1x por dia).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=24,
+                            help='Janela usada para destacar as solicitações novas. Padrão: 24.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Só mostra quantos resumos seriam enviados.')
+
+    def handle(self, *args, **options):
+        desde = timezone.now() - datetime.timedelta(hours=options['horas'])
+        mensagens = mensagens_resumo_gestores(desde)
+        if options['dry_run']:
+            self.stdout.write(f'{len(mensagens)} resumos seriam enviados.')
+            return
+        if not mensagens:
+            self.stdout.write(self.style.SUCCESS('Nenhum gestor com solicitações pendentes em modo resumo.'))
+            return
+
+        with transaction.atomic():
+            emails = enfileirar_emails(mensagens)
+        # Se o despacho imediato estiver desligado, envia aqui mesmo, numa
+        # conexão só; o que falhar fica na caixa de saída para o process_outbox.
+        enviar_pendentes(limite=len(emails), ids=[email.pk for email in emails])
+        self.stdout.write(self.style.SUCCESS(f'{len(emails)} resumos enfileirados para envio.'))
@@ -0,0 +1,90 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+from ferias.imagens import TAMANHOS_MINIATURA, gerar_miniaturas, gravar_miniaturas
+from ferias.models import PerfilUsuario
+
+
+def processar_foto(perfil_id, nome_foto):
+    """
+    Roda no processo filho: lê a foto do storage, gera e grava as miniaturas.
+    Retorna (perfil_id, {campo: nome}) ou (perfil_id, erro) se a foto não abrir.
+    """
+    try:
+        with default_storage.open(nome_foto, 'rb') as arquivo:
+            return perfil_id, gravar_miniaturas(gerar_miniaturas(arquivo))
+    except Exception as erro:
+        return perfil_id, f'{nome_foto}: {erro}'
+
+
+def _inicializar_worker():
+    # Os filhos só mexem em arquivos; o banco fica com o processo principal
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Gera as miniaturas (WebP) das fotos de perfil já enviadas, em paralelo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processos paralelos para redimensionar. Padrão: 1.')
+        parser.add_argument('--todos', action='store_true',
+                            help='Regera também os perfis que já têm miniatura.')
+        parser.add_argument('--lote', type=int, default=200,
+                            help='Perfis atualizados por bulk_update. Padrão: 200.')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['lote'] < 1:
+            raise CommandError('--workers e --lote precisam ser maiores que zero.')
+
+        perfis = PerfilUsuario.objects.exclude(Q(foto_perfil='') | Q(foto_perfil__isnull=True))
+        if not options['todos']:
+            perfis = perfis.filter(Q(foto_miniatura='') | Q(foto_miniatura__isnull=True))
+        pendentes = list(perfis.values_list('pk', 'foto_perfil'))
+        if not pendentes:
+            self.stdout.write(self.style.SUCCESS('Nenhuma foto sem miniatura.'))
+            return
+
+        inicio = time.perf_counter()
+        if options['workers'] == 1:
+            resultados = (processar_foto(pk, nome) for pk, nome in pendentes)
+            gerados, erros = self._gravar(resultados, options['lote'])
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_inicializar_worker) as executor:
+                futuros = [executor.submit(processar_foto, pk, nome) for pk, nome in pendentes]
+                gerados, erros = self._gravar((futuro.result() for futuro in as_completed(futuros)), options['lote'])
+        duracao = time.perf_counter() - inicio
+
+        for erro in erros:
+            self.stdout.write(self.style.WARNING(f'  ignorada: {erro}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Miniaturas geradas para {gerados} fotos em {duracao:.2f}s ({len(erros)} com erro).'
+        ))
+
+    def _gravar(self, resultados, tamanho_lote):
+        gerados, erros, lote = 0, [], []
+        campos = list(TAMANHOS_MINIATURA)
+        for perfil_id, resultado in resultados:
+            if isinstance(resultado, str):
+                erros.append(resultado)
+                continue
+            perfil = PerfilUsuario(pk=perfil_id)
+            for campo, nome in resultado.items():
+                getattr(perfil, campo).name = nome
+            lote.append(perfil)
+            if len(lote) >= tamanho_lote:
+                PerfilUsuario.objects.bulk_update(lote, campos)
+                gerados += len(lote)
+                lote = []
+        if lote:
+            PerfilUsuario.objects.bulk_update(lote, campos)
+            gerados += len(lote)
+        return gerados, erros
@@ -1,50 +1,116 @@
-import datetime
-from django.core.management.base import BaseCommand
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Max, Min
 from django.utils import timezone
-from dateutil.relativedelta import relativedelta
-from ferias.models import Funcionario, PeriodoAquisitivo
+
+from ferias.models import PerfilUsuario, PeriodoAquisitivo
+from ferias.services import calcular_periodos_faltantes, perfis_com_ultimo_periodo, recalcular_saldos
+
+
+def gerar_para_faixa(id_inicio, id_fim, hoje, chunk_size, dry_run):
+    """
+    Processa os perfis com id em [id_inicio, id_fim]. Os perfis são lidos em
+    streaming (iterator) já anotados com o fim do último período, e os
+    períodos faltantes de cada lote vão num único bulk_create.
+    Retorna (perfis_processados, periodos_gerados).
+    """
+    perfis = perfis_com_ultimo_periodo().filter(pk__gte=id_inicio, pk__lte=id_fim)
+
+    processados = 0
+    gerados = 0
+    lote = []
+
+    def gravar(lote):
+        if lote and not dry_run:
+            with transaction.atomic():
+                PeriodoAquisitivo.objects.bulk_create(lote, batch_size=chunk_size, ignore_conflicts=True)
+                # Atualiza o saldo mantido só dos perfis que ganharam períodos
+                recalcular_saldos(PerfilUsuario.objects.filter(pk__in={p.perfil_id for p in lote}))
+        return len(lote)
+
+    for perfil_id, data_contratacao, ultimo_fim in perfis.iterator(chunk_size=chunk_size):
+        processados += 1
+        lote.extend(calcular_periodos_faltantes(perfil_id, data_contratacao, ultimo_fim, hoje))
+        if processados % chunk_size == 0:
+            gerados += gravar(lote)
+            lote = []
+    gerados += gravar(lote)
+
+    return processados, gerados
+
+
+def _inicializar_worker():
+    # Com 'spawn' o processo filho precisa configurar o Django; com 'fork'
+    # não faz mal. As conexões herdadas nunca devem ser reaproveitadas.
+    django.setup()
+    connections.close_all()
+
 
 class Command(BaseCommand):
     help = 'Verifica e gera novos períodos aquisitivos para funcionários que completaram mais um ano de serviço.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Perfis lidos por lote (e tamanho do bulk_create). Padrão: 2000.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processos paralelos, cada um com uma faixa de ids. Padrão: 1.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Só calcula e conta; não grava nada.')
+
     def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        dry_run = options['dry_run']
+        if chunk_size < 1 or workers < 1:
+            raise CommandError('--chunk-size e --workers precisam ser maiores que zero.')
+
         self.stdout.write(self.style.SUCCESS('Iniciando verificação de períodos aquisitivos...'))
-        
+        if dry_run:
+            self.stdout.write(self.style.WARNING('Modo --dry-run: nenhum período será gravado.'))
+
         hoje = timezone.now().date()
-        funcionarios = Funcionario.objects.all()
-        
-        for funcionario in funcionarios:
-            data_nomeacao = funcionario.data_nomeacao
-            
-            ultimo_periodo = funcionario.periodos_aquisitivos.order_by('-data_inicio').first()
-            
-            if ultimo_periodo:
-                proximo_aniversario = ultimo_periodo.data_inicio + relativedelta(years=1)
-            else:
-                proximo_aniversario = data_nomeacao
-
-            while proximo_aniversario <= hoje:
-                data_inicio_novo_periodo = proximo_aniversario
-                data_fim_novo_periodo = data_inicio_novo_periodo + relativedelta(years=1) - datetime.timedelta(days=1)
-                
-
-                ja_existe = PeriodoAquisitivo.objects.filter(
-                    funcionario=funcionario,
-                    data_inicio=data_inicio_novo_periodo
-                ).exists()
-                
-                if not ja_existe:
-                    PeriodoAquisitivo.objects.create(
-                        funcionario=funcionario,
-                        data_inicio=data_inicio_novo_periodo,
-                        data_fim=data_fim_novo_periodo,
-                        saldo_dias=30.00
-                    )
-                    self.stdout.write(self.style.SUCCESS(
-                        f'Novo período aquisitivo {data_inicio_novo_periodo.year}/{data_fim_novo_periodo.year} '
-                        f'criado para {funcionario.user.username}.'
-                    ))
-                
-                proximo_aniversario += relativedelta(years=1)
-
-        self.stdout.write(self.style.SUCCESS('Verificação concluída.'))
\ No newline at end of file
+        limites = PerfilUsuario.objects.aggregate(menor=Min('pk'), maior=Max('pk'))
+        if limites['menor'] is None:
+            self.stdout.write(self.style.SUCCESS('Nenhum perfil cadastrado.'))
+            return
+
+        inicio = time.perf_counter()
+        if workers == 1:
+            processados, gerados = gerar_para_faixa(
+                limites['menor'], limites['maior'], hoje, chunk_size, dry_run
+            )
+        else:
+            processados, gerados = self._gerar_em_paralelo(limites, workers, hoje, chunk_size, dry_run)
+        duracao = time.perf_counter() - inicio
+
+        por_segundo = processados / duracao if duracao else processados
+        verbo = 'seriam gerados' if dry_run else 'gerados'
+        self.stdout.write(self.style.SUCCESS(
+            f'Verificação concluída: {processados} perfis em {duracao:.2f}s '
+            f'({por_segundo:.0f} perfis/s), {gerados} períodos {verbo}.'
+        ))
+
+    def _gerar_em_paralelo(self, limites, workers, hoje, chunk_size, dry_run):
+        menor, maior = limites['menor'], limites['maior']
+        passo = (maior - menor) // workers + 1
+        faixas = [(i, min(i + passo - 1, maior)) for i in range(menor, maior + 1, passo)]
+
+        # Os filhos abrem suas próprias conexões
+        connections.close_all()
+
+        processados = gerados = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker) as executor:
+            futuros = [
+                executor.submit(gerar_para_faixa, id_inicio, id_fim, hoje, chunk_size, dry_run)
+                for id_inicio, id_fim in faixas
+            ]
+            for futuro in as_completed(futuros):
+                p, g = futuro.result()
+                processados += p
+                gerados += g
+                self.stdout.write(f'  faixa concluída: {p} perfis, {g} períodos')
+        return processados, gerados
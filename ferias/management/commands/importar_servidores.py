@@ -0,0 +1,316 @@
+import contextlib
+import csv
+import datetime
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from ferias.models import PerfilUsuario, PeriodoAquisitivo
+from ferias.services import calcular_periodos_faltantes, incluir_na_hierarquia, recalcular_saldos
+
+COLUNAS_OBRIGATORIAS = ('matricula', 'nome', 'secretaria', 'data_contratacao')
+SEPARADOR_SALDOS = '|'
+MAXIMO_ERROS_LISTADOS = 50
+
+
+class LinhaInvalida(ValueError):
+    pass
+
+
+def _data(valor):
+    """Aceita 2020-03-15 e 15/03/2020."""
+    valor = valor.strip()
+    try:
+        if '/' in valor:
+            return datetime.datetime.strptime(valor, '%d/%m/%Y').date()
+        return datetime.date.fromisoformat(valor)
+    except ValueError:
+        raise LinhaInvalida(f'data_contratacao inválida: "{valor}"')
+
+
+def _texto(linha, coluna, tamanho):
+    valor = (linha.get(coluna) or '').strip()
+    if len(valor) > tamanho:
+        raise LinhaInvalida(f'{coluna} passa de {tamanho} caracteres')
+    return valor
+
+
+def converter_linha(linha):
+    """Valida e normaliza uma linha do CSV. Levanta LinhaInvalida com o motivo."""
+    dados = {
+        'matricula': _texto(linha, 'matricula', 20),
+        'nome': _texto(linha, 'nome', 300),
+        'email': _texto(linha, 'email', 254).lower(),
+        'cargo': _texto(linha, 'cargo', 100),
+        'lotacao': _texto(linha, 'lotacao', 100),
+        'secretaria': _texto(linha, 'secretaria', 100),
+        'matricula_gestor': _texto(linha, 'matricula_gestor', 20),
+    }
+    if dados['matricula_gestor'] == dados['matricula']:
+        dados['matricula_gestor'] = ''
+    for coluna in ('matricula', 'nome', 'secretaria'):
+        if not dados[coluna]:
+            raise LinhaInvalida(f'{coluna} em branco')
+    if dados['email']:
+        try:
+            validate_email(dados['email'])
+        except ValidationError:
+            raise LinhaInvalida(f'e-mail inválido: "{dados["email"]}"')
+    dados['data_contratacao'] = _data(linha.get('data_contratacao') or '')
+
+    # Saldo de abertura: dias livres dos períodos mais recentes, do mais
+    # antigo para o mais novo (ex.: "12|30"). Em branco, o servidor ajusta
+    # os saldos no onboarding, como no cadastro.
+    saldos = (linha.get('saldos') or '').strip()
+    try:
+        dados['saldos'] = [int(dias) for dias in saldos.split(SEPARADOR_SALDOS)] if saldos else None
+    except ValueError:
+        raise LinhaInvalida(f'saldos inválidos: "{saldos}"')
+    if dados['saldos'] and not all(0 <= dias <= 30 for dias in dados['saldos']):
+        raise LinhaInvalida('cada saldo deve estar entre 0 e 30 dias')
+
+    primeiro, _, resto = dados.pop('nome').partition(' ')
+    dados['first_name'], dados['last_name'] = primeiro[:150], resto.strip()[:150]
+    return dados
+
+
+def aplicar_saldos(periodos, saldos):
+    """Os últimos len(saldos) períodos recebem os saldos; os anteriores ficam fechados."""
+    if saldos is None:
+        return
+    if len(saldos) > len(periodos):
+        raise LinhaInvalida(f'{len(saldos)} saldos para {len(periodos)} períodos aquisitivos')
+    abertos = len(periodos) - len(saldos)
+    for periodo, dias in zip(periodos, [0] * abertos + saldos):
+        periodo.dias_disponiveis = dias
+        periodo.status = 'ABERTO' if dias else 'FECHADO'
+
+
+def gravar_lote(lote):
+    """
+    Grava um lote de linhas já validadas com um bulk_create por tabela e
+    devolve os perfis criados. O bulk_create não dispara post_save: nem o
+    perfil automático do criar_perfil_usuario nem a hierarquia (incluída no
+    fim da importação). Conta com o banco devolvendo as chaves (SQLite >= 3.35, Postgres).
+    """
+    senha = make_password(None)  # inutilizável: o acesso vem por "esqueci minha senha"
+    usuarios = User.objects.bulk_create([
+        User(
+            username=dados['matricula'], password=senha, email=dados['email'],
+            first_name=dados['first_name'], last_name=dados['last_name'],
+        )
+        for _, dados in lote
+    ])
+    perfis = PerfilUsuario.objects.bulk_create([
+        PerfilUsuario(
+            user=user, matricula=dados['matricula'], secretaria=dados['secretaria'],
+            lotacao=dados['lotacao'] or None, cargo=dados['cargo'] or None,
+            data_contratacao=dados['data_contratacao'], onboarding_completo=dados['saldos'] is not None,
+            gestor_id=dados['gestor_id'],
+        )
+        for user, (_, dados) in zip(usuarios, lote)
+    ])
+    periodos = []
+    for perfil, (_, dados) in zip(perfis, lote):
+        for periodo in dados['periodos']:
+            periodo.perfil_id = perfil.pk
+        periodos.extend(dados['periodos'])
+    PeriodoAquisitivo.objects.bulk_create(periodos)
+    recalcular_saldos(PerfilUsuario.objects.filter(pk__in=[perfil.pk for perfil in perfis]))
+    return perfis
+
+
+def perfis_em_ciclo(gestores):
+    """
+    Perfis que caem num ciclo seguindo {perfil_id: gestor_id}. Cada perfil
+    tem no máximo um gestor, então basta uma caminhada por perfil ainda não
+    visto: voltar a um perfil da mesma caminhada fecha um ciclo.
+    """
+    caminhada_de, em_ciclo = {}, set()
+    for inicio in gestores:
+        caminho, atual = [], inicio
+        while atual is not None and atual not in caminhada_de:
+            caminhada_de[atual] = inicio
+            caminho.append(atual)
+            atual = gestores.get(atual)
+        if atual is not None and caminhada_de[atual] == inicio:
+            em_ciclo.update(caminho[caminho.index(atual):])
+    return em_ciclo
+
+
+def resolver_gestores(pendentes, ids, gestores):
+    """
+    Segunda passada, só para quem ficou sem gestor na primeira: o gestor
+    vinha mais adiante no arquivo. pendentes: [(linha, perfil_id, matricula_gestor)];
+    ids: {matricula: perfil_id} de tudo o que já foi visto; gestores:
+    {perfil_id: gestor_id} ligados na primeira passada. Quem fecharia um
+    ciclo (ex.: A responde a B e B a A) fica sem gestor. Devolve
+    (perfis ligados, matrículas de gestor não encontradas, [(linha, motivo)]).
+    """
+    ligacoes, nao_encontrados = {}, set()
+    for _, perfil_id, matricula_gestor in pendentes:
+        gestor_id = ids.get(matricula_gestor)
+        if gestor_id is None:
+            nao_encontrados.add(matricula_gestor)
+        else:
+            ligacoes[perfil_id] = gestor_id
+
+    # A primeira passada só liga a quem veio antes (não forma ciclo): todo
+    # ciclo passa por alguma ligação desta passada, e elas ficam de fora
+    em_ciclo = perfis_em_ciclo({**gestores, **ligacoes})
+    erros = [
+        (numero, f'gestor {matricula_gestor} não ligado: fecharia um ciclo na hierarquia')
+        for numero, perfil_id, matricula_gestor in pendentes if perfil_id in em_ciclo
+    ]
+    perfis = [
+        PerfilUsuario(pk=perfil_id, gestor_id=gestor_id)
+        for perfil_id, gestor_id in ligacoes.items() if perfil_id not in em_ciclo
+    ]
+    # Lotes pequenos: o UPDATE ... CASE do bulk_update fica caro com muitos ramos
+    PerfilUsuario.objects.bulk_update(perfis, ['gestor'], batch_size=100)
+    return len(perfis), nao_encontrados, erros
+
+
+class Command(BaseCommand):
+    help = ('Importa servidores de um CSV (matricula, nome, email, cargo, lotacao, secretaria, '
+            'data_contratacao, matricula_gestor, saldos) em lotes com bulk_create, gerando os '
+            'períodos aquisitivos. Matrículas já cadastradas são ignoradas, então dá para rodar de novo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do CSV (UTF-8, com cabeçalho).')
+        parser.add_argument('--delimitador', default=',', help='Separador de colunas. Padrão: ",".')
+        parser.add_argument('--lote', type=int, default=2000, help='Linhas por lote (bulk_create). Padrão: 2000.')
+        parser.add_argument('--dry-run', action='store_true', help='Valida e conta, sem gravar nada.')
+
+    def handle(self, *args, **options):
+        tamanho_lote = options['lote']
+        if tamanho_lote < 1:
+            raise CommandError('--lote precisa ser maior que zero.')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Modo --dry-run: nada será gravado.'))
+
+        inicio = time.perf_counter()
+        try:
+            arquivo = open(options['arquivo'], newline='', encoding='utf-8-sig')
+        except OSError as erro:
+            raise CommandError(f'Não foi possível abrir o CSV: {erro}')
+
+        # No --dry-run tudo roda numa transação desfeita no fim; senão cada
+        # lote é confirmado sozinho e uma nova execução continua de onde parou.
+        with arquivo, (transaction.atomic() if options['dry_run'] else contextlib.nullcontext()):
+            totais = self._importar(csv.DictReader(arquivo, delimiter=options['delimitador']), tamanho_lote)
+            if options['dry_run']:
+                transaction.set_rollback(True)
+        duracao = time.perf_counter() - inicio
+
+        for numero, motivo in totais['erros'][:MAXIMO_ERROS_LISTADOS]:
+            self.stderr.write(f'  linha {numero}: {motivo}')
+        if len(totais['erros']) > MAXIMO_ERROS_LISTADOS:
+            self.stderr.write(f'  ... e mais {len(totais["erros"]) - MAXIMO_ERROS_LISTADOS} linhas com erro.')
+        if totais['gestores_ausentes']:
+            self.stdout.write(self.style.WARNING(
+                f'{len(totais["gestores_ausentes"])} matrículas de gestor não encontradas: '
+                f'{", ".join(sorted(totais["gestores_ausentes"])[:20])}'
+            ))
+
+        por_segundo = totais['importados'] / duracao if duracao else totais['importados']
+        verbo = 'seriam importados' if options['dry_run'] else 'importados'
+        self.stdout.write(self.style.SUCCESS(
+            f'{totais["importados"]} servidores {verbo} em {duracao:.2f}s ({por_segundo:.0f}/s), '
+            f'{totais["periodos"]} períodos, {totais["gestores"]} gestores ligados; '
+            f'{totais["ignorados"]} já cadastrados e {len(totais["erros"])} linhas com erro.'
+        ))
+
+    def _importar(self, leitor, tamanho_lote):
+        faltando = set(COLUNAS_OBRIGATORIAS) - set(leitor.fieldnames or ())
+        if faltando:
+            raise CommandError(f'Colunas obrigatórias ausentes no cabeçalho: {", ".join(sorted(faltando))}')
+
+        hoje = timezone.now().date()
+        totais = {'importados': 0, 'periodos': 0, 'ignorados': 0, 'gestores': 0, 'erros': []}
+        vistos_matricula, vistos_email = set(), set()
+        # Matrícula -> perfil de tudo o que já foi gravado ou consultado; o
+        # gestor que já apareceu entra direto no bulk_create do subordinado
+        ids = {}
+        gestores = {}
+        pendentes = []
+        importados = []
+        lote = []
+
+        def gravar(lote):
+            # Descarta o que já existe no banco (uma consulta por tabela por lote)
+            matriculas = [dados['matricula'] for _, dados in lote]
+            existentes = set(PerfilUsuario.objects.filter(matricula__in=matriculas).values_list('matricula', flat=True))
+            existentes |= set(User.objects.filter(username__in=matriculas).values_list('username', flat=True))
+            # Os e-mails do CSV já vêm em minúsculas; os do banco, não necessariamente
+            emails = set(User.objects.annotate(email_minusculo=Lower('email')).filter(
+                email_minusculo__in=[dados['email'] for _, dados in lote if dados['email']]
+            ).values_list('email_minusculo', flat=True))
+            # Gestores já cadastrados antes desta importação
+            ids.update(PerfilUsuario.objects.filter(
+                matricula__in={dados['matricula_gestor'] for _, dados in lote} - ids.keys() - {''}
+            ).values_list('matricula', 'pk'))
+
+            novos = []
+            for numero, dados in lote:
+                if dados['matricula'] in existentes:
+                    totais['ignorados'] += 1
+                elif dados['email'] in emails:
+                    totais['erros'].append((numero, f'e-mail já cadastrado: {dados["email"]}'))
+                else:
+                    dados['gestor_id'] = ids.get(dados['matricula_gestor'])
+                    novos.append((numero, dados))
+            if not novos:
+                return
+            with transaction.atomic():
+                perfis = gravar_lote(novos)
+            for perfil, (numero, dados) in zip(perfis, novos):
+                ids[perfil.matricula] = perfil.pk
+                importados.append(perfil.pk)
+                totais['periodos'] += len(dados['periodos'])
+                if dados['gestor_id']:
+                    gestores[perfil.pk] = dados['gestor_id']
+                    totais['gestores'] += 1
+                elif dados['matricula_gestor']:
+                    pendentes.append((numero, perfil.pk, dados['matricula_gestor']))
+            totais['importados'] += len(novos)
+            self.stdout.write(f'  {totais["importados"]} importados...')
+
+        for linha in leitor:
+            numero = leitor.line_num
+            try:
+                dados = converter_linha(linha)
+                if dados['matricula'] in vistos_matricula:
+                    raise LinhaInvalida(f'matrícula repetida no arquivo: {dados["matricula"]}')
+                if dados['email'] and dados['email'] in vistos_email:
+                    raise LinhaInvalida(f'e-mail repetido no arquivo: {dados["email"]}')
+                # Períodos desde a contratação, já com o saldo de abertura
+                dados['periodos'] = calcular_periodos_faltantes(None, dados['data_contratacao'], hoje=hoje)
+                aplicar_saldos(dados['periodos'], dados['saldos'])
+            except LinhaInvalida as erro:
+                totais['erros'].append((numero, str(erro)))
+                continue
+            vistos_matricula.add(dados['matricula'])
+            if dados['email']:
+                vistos_email.add(dados['email'])
+            lote.append((numero, dados))
+            if len(lote) >= tamanho_lote:
+                gravar(lote)
+                lote = []
+        gravar(lote)
+
+        # Segunda passada: gestores que vinham depois no arquivo e, de uma vez,
+        # as linhas dos importados na tabela de fechamento da hierarquia
+        with transaction.atomic():
+            ligados, totais['gestores_ausentes'], ciclos = resolver_gestores(pendentes, ids, gestores)
+            totais['gestores'] += ligados
+            totais['erros'].extend(ciclos)
+            incluir_na_hierarquia(importados)
+        return totais
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ferias.notificacoes import enviar_pendentes
+
+
+class Command(BaseCommand):
+    help = 'Envia os e-mails pendentes da caixa de saída, em lotes, por uma conexão SMTP reaproveitada.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=100,
+                            help='E-mails por lote (por conexão SMTP). Padrão: 100.')
+        parser.add_argument('--max-tentativas', type=int, default=None,
+                            help='Tentativas antes de marcar como FALHOU. Padrão: FERIAS_EMAIL_MAX_TENTATIVAS.')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Não termina: verifica a fila de novo a cada --intervalo segundos.')
+        parser.add_argument('--intervalo', type=float, default=10,
+                            help='Segundos entre verificações no modo --continuo. Padrão: 10.')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote precisa ser maior que zero.')
+
+        while True:
+            enviados_total = falhas_total = 0
+            while True:
+                enviados, falhas = enviar_pendentes(options['lote'], max_tentativas=options['max_tentativas'])
+                enviados_total += enviados
+                falhas_total += falhas
+                # Lote incompleto: a fila (do que já venceu) acabou
+                if enviados + falhas < options['lote']:
+                    break
+
+            if enviados_total or falhas_total or not options['continuo']:
+                estilo = self.style.WARNING if falhas_total else self.style.SUCCESS
+                self.stdout.write(estilo(f'{enviados_total} e-mails enviados, {falhas_total} falhas (reagendadas).'))
+            if not options['continuo']:
+                return
+            time.sleep(options['intervalo'])
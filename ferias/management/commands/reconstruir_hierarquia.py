@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ferias.services import reconstruir_hierarquia
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói do zero a tabela de fechamento da hierarquia de gestores (HierarquiaPerfil).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Linhas por bulk_create. Padrão: 5000.')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        total = reconstruir_hierarquia(chunk_size=options['chunk_size'])
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'Hierarquia reconstruída: {total} linhas em {duracao:.2f}s.'
+        ))
@@ -0,0 +1,179 @@
+import datetime
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from ferias.cache import invalidar_eventos
+from ferias.models import DescontoFerias, PerfilUsuario, PeriodoAquisitivo, SolicitacaoFerias
+from ferias.services import calcular_periodos_faltantes, reconstruir_hierarquia, recalcular_saldos
+
+NOMES = ('Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Fábio', 'Gabriela', 'Heitor', 'Isabela', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sabrina', 'Tiago', 'Vanessa', 'Wagner')
+SOBRENOMES = ('Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira',
+              'Lima', 'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes')
+CARGOS = ('Analista', 'Assistente', 'Técnico', 'Coordenador', 'Auditor', 'Agente')
+
+# Picos de janeiro e julho (peso por mês)
+PESOS_MES = (18, 6, 5, 5, 5, 6, 18, 7, 5, 5, 6, 14)
+DURACOES = (10, 15, 20, 30)
+# Situação das solicitações geradas: aprovada, pendente, rejeitada
+PESOS_STATUS = (('APROVADA_FINAL', 70), ('PENDENTE_GESTOR', 15), ('REJEITADA', 15))
+TAMANHO_LOTE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Gera dados sintéticos (usuários, hierarquia, períodos, solicitações e descontos) '
+            'com bulk_create, para testes de carga e benchmarks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=1000, help='Quantos usuários criar. Padrão: 1000.')
+        parser.add_argument('--secretarias', type=int, default=5, help='Quantas secretarias. Padrão: 5.')
+        parser.add_argument('--equipe', type=int, default=8,
+                            help='Subordinados diretos por gestor (define a profundidade da árvore). Padrão: 8.')
+        parser.add_argument('--anos', type=int, default=8, help='Tempo máximo de casa, em anos. Padrão: 8.')
+        parser.add_argument('--prefixo', default='seed', help='Prefixo dos usernames. Padrão: seed.')
+        parser.add_argument('--semente', type=int, default=42, help='Semente do gerador (reprodutível). Padrão: 42.')
+        parser.add_argument('--limpar', action='store_true', help='Apaga antes os usuários com o mesmo prefixo.')
+
+    def handle(self, *args, **options):
+        if options['usuarios'] < 1 or options['secretarias'] < 1 or options['equipe'] < 1 or options['anos'] < 2:
+            raise CommandError('--usuarios, --secretarias e --equipe precisam ser > 0 e --anos >= 2.')
+        prefixo = options['prefixo']
+        if options['limpar']:
+            apagados, _ = User.objects.filter(username__startswith=prefixo).delete()
+            self.stdout.write(f'{apagados} registros antigos apagados.')
+        elif User.objects.filter(username__startswith=prefixo).exists():
+            raise CommandError(f'Já existem usuários "{prefixo}*". Use --limpar ou outro --prefixo.')
+
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            totais = semear(random.Random(options['semente']), options)
+        transaction.on_commit(invalidar_eventos)
+        duracao = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{totais["usuarios"]} usuários em {options["secretarias"]} secretarias, '
+            f'{totais["periodos"]} períodos, {totais["solicitacoes"]} solicitações e '
+            f'{totais["descontos"]} descontos gerados em {duracao:.2f}s.'
+        ))
+
+
+def semear(aleatorio, options):
+    """
+    Gera tudo em memória e grava com bulk_create, tabela por tabela. Conta
+    com o banco devolvendo as chaves no bulk_create (SQLite >= 3.35, Postgres).
+    """
+    hoje = timezone.now().date()
+    prefixo = options['prefixo']
+    n = options['usuarios']
+
+    # 1. Usuários (senha inutilizável: ninguém faz login com eles)
+    usuarios = User.objects.bulk_create([
+        User(
+            username=f'{prefixo}{i:06d}', password='!',
+            first_name=aleatorio.choice(NOMES), last_name=aleatorio.choice(SOBRENOMES),
+            email=f'{prefixo}{i:06d}@exemplo.gov.br',
+        )
+        for i in range(n)
+    ], batch_size=TAMANHO_LOTE)
+
+    # 2. Perfis, distribuídos pelas secretarias
+    secretarias = [f'SEC{j + 1:02d}' for j in range(options['secretarias'])]
+    perfis = PerfilUsuario.objects.bulk_create([
+        PerfilUsuario(
+            user=user, matricula=f'{prefixo}-{i:06d}', secretaria=secretarias[i % len(secretarias)],
+            lotacao=f'Lotação {i % 20 + 1}', cargo=aleatorio.choice(CARGOS), onboarding_completo=True,
+            data_contratacao=hoje - datetime.timedelta(days=aleatorio.randint(400, 365 * options['anos'])),
+        )
+        for i, user in enumerate(usuarios)
+    ], batch_size=TAMANHO_LOTE)
+
+    # 3. Hierarquia: em cada secretaria, uma árvore em que o perfil k responde
+    #    ao perfil (k - 1) // equipe (o primeiro é o secretário)
+    equipe = options['equipe']
+    por_secretaria = {}
+    for perfil in perfis:
+        por_secretaria.setdefault(perfil.secretaria, []).append(perfil)
+    for membros in por_secretaria.values():
+        for k, perfil in enumerate(membros[1:], start=1):
+            perfil.gestor_id = membros[(k - 1) // equipe].pk
+            # Uma parte dos gestores prefere o resumo diário
+            membros[(k - 1) // equipe].resumo_diario = (k - 1) // equipe % 4 == 0
+    PerfilUsuario.objects.bulk_update(perfis, ['gestor', 'resumo_diario'], batch_size=TAMANHO_LOTE)
+    reconstruir_hierarquia()
+
+    # 4. Períodos aquisitivos vencidos até hoje
+    periodos_por_perfil = {
+        perfil.pk: calcular_periodos_faltantes(perfil.pk, perfil.data_contratacao, hoje=hoje)
+        for perfil in perfis
+    }
+
+    # 5. Solicitações: as aprovadas consomem dos períodos mais antigos, as
+    #    pendentes só reservam (como em solicitar_ferias), as rejeitadas não descontam
+    user_do_perfil = {perfil.pk: perfil.user_id for perfil in perfis}
+    agora = timezone.now()
+    solicitacoes, partes_por_solicitacao = [], []
+    status_possiveis = [status for status, _ in PESOS_STATUS]
+    pesos_status = [peso for _, peso in PESOS_STATUS]
+    for perfil, user in zip(perfis, usuarios):
+        periodos = periodos_por_perfil[perfil.pk]
+        # Saldo livre de cada período (descontando também as reservas pendentes)
+        livre = [periodo.dias_disponiveis for periodo in periodos]
+        for _ in range(aleatorio.choices((0, 1, 2, 3), weights=(15, 40, 30, 15))[0]):
+            dias = aleatorio.choice(DURACOES)
+            status = aleatorio.choices(status_possiveis, weights=pesos_status)[0]
+            # Aprovadas no último ano e meio; pendentes/rejeitadas nos próximos meses
+            ano = hoje.year + (aleatorio.choice((-1, 0)) if status == 'APROVADA_FINAL' else aleatorio.choice((0, 1)))
+            mes = aleatorio.choices(range(1, 13), weights=PESOS_MES)[0]
+            data_inicio = datetime.date(ano, mes, aleatorio.randint(1, 28))
+
+            partes = []
+            if status != 'REJEITADA':
+                restante = dias
+                for indice, periodo in enumerate(periodos):
+                    usados = min(livre[indice], restante)
+                    if usados:
+                        partes.append((indice, usados))
+                        restante -= usados
+                    if not restante:
+                        break
+                if restante:
+                    continue  # sem saldo: a solicitação não teria passado no formulário
+                for indice, usados in partes:
+                    livre[indice] -= usados
+                    if status == 'APROVADA_FINAL':
+                        periodos[indice].dias_disponiveis -= usados
+                        if not periodos[indice].dias_disponiveis:
+                            periodos[indice].status = 'FECHADO'
+                partes = [(periodos[indice], usados) for indice, usados in partes]
+
+            solicitacao = SolicitacaoFerias(
+                solicitante=user, secretaria=perfil.secretaria, status=status,
+                data_inicio=data_inicio, data_fim=data_inicio + datetime.timedelta(days=dias - 1),
+            )
+            if status != 'PENDENTE_GESTOR':
+                solicitacao.aprovador_gestor_id = user_do_perfil.get(perfil.gestor_id)
+                solicitacao.data_aprovacao_gestor = agora
+            solicitacoes.append(solicitacao)
+            partes_por_solicitacao.append((solicitacao, partes))
+
+    todos_periodos = [periodo for periodos in periodos_por_perfil.values() for periodo in periodos]
+    PeriodoAquisitivo.objects.bulk_create(todos_periodos, batch_size=TAMANHO_LOTE)
+    SolicitacaoFerias.objects.bulk_create(solicitacoes, batch_size=TAMANHO_LOTE)
+    descontos = DescontoFerias.objects.bulk_create([
+        DescontoFerias(solicitacao=solicitacao, periodo_aquisitivo=periodo, dias_descontados=usados)
+        for solicitacao, partes in partes_por_solicitacao
+        for periodo, usados in partes
+    ], batch_size=TAMANHO_LOTE)
+
+    # 6. Saldo mantido e período a vencer de todos os perfis gerados
+    recalcular_saldos(PerfilUsuario.objects.filter(user__username__startswith=prefixo))
+
+    return {
+        'usuarios': len(usuarios), 'periodos': len(todos_periodos),
+        'solicitacoes': len(solicitacoes), 'descontos': len(descontos),
+    }
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+
+from ferias.models import PerfilUsuario
+from ferias.services import expressoes_saldo, recalcular_saldos
+
+
+class Command(BaseCommand):
+    help = 'Confere o saldo mantido em PerfilUsuario contra os períodos e descontos (e opcionalmente reconstrói).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconstruir', action='store_true',
+                            help='Recalcula o saldo de todos os perfis num único UPDATE.')
+        parser.add_argument('--limite', type=int, default=20,
+                            help='Quantas divergências listar. Padrão: 20.')
+
+    def handle(self, *args, **options):
+        if options['reconstruir']:
+            with transaction.atomic():
+                atualizados = recalcular_saldos(PerfilUsuario.objects.all())
+            self.stdout.write(self.style.SUCCESS(f'Saldo reconstruído para {atualizados} perfis.'))
+            return
+
+        esperado = expressoes_saldo()
+        divergentes = PerfilUsuario.objects.annotate(
+            esperado_saldo_total=esperado['saldo_total'],
+            esperado_dias_reservados=esperado['dias_reservados'],
+            # 0 no lugar de NULL para comparar "sem período a vencer" dos dois lados
+            atual_periodo=Coalesce('periodo_a_vencer', Value(0)),
+            esperado_periodo=Coalesce(esperado['periodo_a_vencer'], Value(0)),
+        ).filter(
+            ~Q(saldo_total=F('esperado_saldo_total'))
+            | ~Q(dias_reservados=F('esperado_dias_reservados'))
+            | ~Q(atual_periodo=F('esperado_periodo'))
+        ).values_list(
+            'pk', 'user__username', 'saldo_total', 'esperado_saldo_total',
+            'dias_reservados', 'esperado_dias_reservados',
+        ).order_by('pk')
+
+        total = divergentes.count()
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Todos os saldos conferem.'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'{total} perfis com saldo divergente:'))
+        for pk, username, saldo, saldo_esperado, reservados, reservados_esperado in divergentes[:options['limite']]:
+            self.stdout.write(
+                f'  perfil {pk} ({username}): saldo {saldo} (esperado {saldo_esperado}), '
+                f'reservados {reservados} (esperado {reservados_esperado})'
+            )
+        self.stdout.write('Rode com --reconstruir para corrigir.')
@@ -0,0 +1,132 @@
+# ferias/metricas.py
+
+import threading
+import time
+from collections import Counter
+
+from .cache import estatisticas_fragmentos
+
+# --- MÉTRICAS DO PROCESSO (formato texto do Prometheus) ---
+# Histogramas por view, acumulados em memória desde a subida do processo.
+# Com vários workers cada um tem os seus; o Prometheus soma na consulta.
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histograma:
+    def __init__(self, nome, ajuda, buckets):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.buckets = buckets
+        self._series = {}
+        self._trava = threading.Lock()
+
+    def observar(self, view, valor):
+        with self._trava:
+            serie = self._series.get(view)
+            if serie is None:
+                serie = self._series[view] = {'buckets': [0] * len(self.buckets), 'soma': 0.0, 'total': 0}
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie['buckets'][i] += 1
+            serie['soma'] += valor
+            serie['total'] += 1
+
+    def exportar(self):
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} histogram']
+        with self._trava:
+            series = {view: dict(serie, buckets=list(serie['buckets'])) for view, serie in self._series.items()}
+        for view, serie in sorted(series.items()):
+            rotulo = _rotulo(view)
+            for limite, quantidade in zip(self.buckets, serie['buckets']):
+                linhas.append(f'{self.nome}_bucket{{view="{rotulo}",le="{limite}"}} {quantidade}')
+            linhas.append(f'{self.nome}_bucket{{view="{rotulo}",le="+Inf"}} {serie["total"]}')
+            linhas.append(f'{self.nome}_sum{{view="{rotulo}"}} {serie["soma"]:.6f}')
+            linhas.append(f'{self.nome}_count{{view="{rotulo}"}} {serie["total"]}')
+        return linhas
+
+
+class Contador:
+    def __init__(self, nome, ajuda):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._valores = Counter()
+        self._trava = threading.Lock()
+
+    def somar(self, view, valor=1):
+        with self._trava:
+            self._valores[view] += valor
+
+    def exportar(self):
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} counter']
+        with self._trava:
+            valores = sorted(self._valores.items())
+        linhas.extend(f'{self.nome}{{view="{_rotulo(view)}"}} {valor}' for view, valor in valores)
+        return linhas
+
+
+def _rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+DURACAO_REQUISICAO = Histograma(
+    'ferias_requisicao_segundos', 'Duração da requisição por view.', BUCKETS_SEGUNDOS)
+CONSULTAS_SQL = Histograma(
+    'ferias_sql_consultas', 'Consultas SQL por requisição, por view.', BUCKETS_CONSULTAS)
+TEMPO_SQL = Histograma(
+    'ferias_sql_segundos', 'Tempo gasto em SQL por requisição, por view.', BUCKETS_SEGUNDOS)
+CONSULTAS_DUPLICADAS = Contador(
+    'ferias_sql_duplicadas_total', 'Consultas repetidas (mesmo SQL) dentro de uma requisição, por view.')
+
+
+class ColetorSQL:
+    """
+    execute_wrapper de uma requisição: conta consultas, soma o tempo e
+    agrupa pelo texto do SQL (ainda com %s no lugar dos parâmetros, então
+    o mesmo SELECT com ids diferentes cai no mesmo grupo — o padrão N+1).
+    """
+    def __init__(self):
+        self.consultas = 0
+        self.tempo = 0.0
+        self.por_sql = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo += time.perf_counter() - inicio
+            self.consultas += 1
+            self.por_sql[sql] += 1
+
+    @property
+    def duplicadas(self):
+        return sum(vezes - 1 for vezes in self.por_sql.values() if vezes > 1)
+
+    def repetidas(self, limiar):
+        """[(sql, vezes)] das consultas repetidas pelo menos `limiar` vezes."""
+        return [(sql, vezes) for sql, vezes in self.por_sql.most_common() if vezes >= limiar]
+
+
+def registrar_requisicao(view, duracao, coletor):
+    DURACAO_REQUISICAO.observar(view, duracao)
+    CONSULTAS_SQL.observar(view, coletor.consultas)
+    TEMPO_SQL.observar(view, coletor.tempo)
+    if coletor.duplicadas:
+        CONSULTAS_DUPLICADAS.somar(view, coletor.duplicadas)
+
+
+def exportar_prometheus():
+    linhas = []
+    for metrica in (DURACAO_REQUISICAO, CONSULTAS_SQL, TEMPO_SQL, CONSULTAS_DUPLICADAS):
+        linhas.extend(metrica.exportar())
+    # Contadores do cache de fragmentos (ver ferias/cache.py)
+    fragmentos = estatisticas_fragmentos()
+    for tipo in ('acertos', 'falhas'):
+        nome = f'ferias_fragmento_cache_{tipo}_total'
+        linhas += [f'# HELP {nome} {tipo.capitalize()} do cache de fragmentos.', f'# TYPE {nome} counter']
+        linhas.extend(
+            f'{nome}{{fragmento="{fragmento}"}} {valores[tipo]}'
+            for fragmento, valores in fragmentos.items()
+        )
+    return '\n'.join(linhas) + '\n'
@@ -1,19 +1,69 @@
 # ferias/middleware.py
 
+import logging
+import mimetypes
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.db import connections
+from django.http import FileResponse
 from django.shortcuts import redirect
 from django.urls import reverse
-from django.utils import timezone
-from dateutil.relativedelta import relativedelta
-from .models import PeriodoAquisitivo, PerfilUsuario
-import datetime
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from . import db_router
+from .estaticos import variante_para
+from .metricas import ColetorSQL, registrar_requisicao
+from .models import PerfilUsuario
+from .services import criar_periodos_faltantes
+
+logger = logging.getLogger(__name__)
+
+# Chave da sessão que guarda se o usuário já concluiu o onboarding.
+# É gravada no login (ver signals.py) e ao final do onboarding_view,
+# para que usuários já configurados não custem nenhuma consulta aqui.
+SESSAO_ONBOARDING = 'onboarding_completo'
+
+
+def _prefixo_url(url):
+    """Normaliza STATIC_URL/MEDIA_URL para um prefixo de caminho ('/static/')."""
+    if not url or '://' in url or url.startswith('//'):
+        return None
+    return '/' + url.lstrip('/')
+
 
 class OnboardingMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
+        # Resolvidos uma única vez, na subida do servidor
+        self.allowed_paths = frozenset([
+            reverse('ferias:onboarding'),
+            reverse('logout'),
+        ])
+        # Caminhos que nunca precisam da checagem (arquivos estáticos, mídia, admin)
+        self.prefixos_ignorados = tuple(
+            prefixo for prefixo in (
+                _prefixo_url(settings.STATIC_URL),
+                _prefixo_url(settings.MEDIA_URL),
+                reverse('admin:index'),
+            ) if prefixo
+        )
+
     def __call__(self, request):
         # --- LÓGICA DE EXECUÇÃO ---
         # Este código roda em TODA requisição
+
+        # 0. Atalhos sem SQL: caminhos ignorados e onboarding já concluído (sessão)
+        if request.path.startswith(self.prefixos_ignorados):
+            return self.get_response(request)
+        if request.session.get(SESSAO_ONBOARDING):
+            return self.get_response(request)
         
         # 1. Verifica se o usuário está logado
         if request.user.is_authenticated:
@@ -33,55 +83,149 @@ class OnboardingMiddleware:
                 
                 # 5. LIBERAÇÃO: Permite o acesso se o usuário JÁ ESTIVER
                 # tentando acessar a página de onboarding ou de logout
-                allowed_paths = [
-                    reverse('ferias:onboarding'),
-                    reverse('logout')
-                ]
-                if request.path in allowed_paths:
+                if request.path in self.allowed_paths:
                     return self.get_response(request)
                 
                 # 6. BLOQUEIO: Força o redirecionamento.
                 
                 # ANTES DE REDIRECIONAR, vamos calcular e criar
                 # os períodos aquisitivos que faltam (sua regra de negócio)
-                self.criar_periodos_faltantes(perfil)
+                criar_periodos_faltantes(perfil)
                 
                 return redirect('ferias:onboarding')
 
+            # Onboarding concluído (ex: sessão anterior ao login com a flag):
+            # guarda na sessão para as próximas requisições não consultarem o perfil
+            request.session[SESSAO_ONBOARDING] = True
+
         # Se não estiver logado, ou se o onboarding estiver completo,
         # apenas continua o fluxo normal.
         return self.get_response(request)
 
-    def criar_periodos_faltantes(self, perfil):
-        """
-        Calcula e cria os períodos aquisitivos que faltam
-        desde a data de contratação.
-        """
-        hoje = timezone.now().date()
-        data_contratacao = perfil.data_contratacao
-        
-        ultimo_periodo = perfil.periodos_aquisitivos.order_by('-data_inicio_aquisitivo').first()
-        
-        if ultimo_periodo:
-            proximo_inicio = ultimo_periodo.data_fim_aquisitivo + datetime.timedelta(days=1)
-        else:
-            # Se nunca teve, o primeiro "aniversário" é a própria data de contratação
-            proximo_inicio = data_contratacao
-        
-        # Loop que cria os períodos faltantes
-        # O período só é "ganho" quando se completa 1 ano
-        while proximo_inicio + relativedelta(years=1) <= hoje:
-            data_fim = proximo_inicio + relativedelta(years=1) - datetime.timedelta(days=1)
-            
-            PeriodoAquisitivo.objects.get_or_create(
-                perfil=perfil,
-                data_inicio_aquisitivo=proximo_inicio,
-                defaults={
-                    'data_fim_aquisitivo': data_fim,
-                    'dias_direito': 30,
-                    'dias_disponiveis': 30, # Começa com 30 (usuário vai ajustar)
-                    'status': 'ABERTO'
-                }
-            )
-            # Prepara para o próximo ano
-            proximo_inicio = proximo_inicio + relativedelta(years=1)
\ No newline at end of file
+
+# --- RÉPLICA DE LEITURA ---
+# Cookie que "pina" o usuário no banco principal logo depois de uma escrita,
+# para ele não ler da réplica (atrasada) o que acabou de gravar.
+COOKIE_PRIMARIO = 'ferias_primario'
+
+
+class ReplicaLeituraMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pinagem = getattr(settings, 'FERIAS_REPLICA_PINAGEM_SEGUNDOS', 10)
+
+    def __call__(self, request):
+        request.leitura_na_replica = False
+        try:
+            response = self.get_response(request)
+        finally:
+            # Liga a réplica só durante a view (e a renderização das respostas
+            # preguiçosas, que o handler faz antes de voltar para cá): o que as
+            # outras middlewares gravam depois (ex.: a sessão) não conta como
+            # escrita do usuário
+            token = getattr(request, '_token_replica', None)
+            if token is not None:
+                db_router.encerrar_requisicao(token)
+                del request._token_replica
+        estado = getattr(request, '_estado_replica', None)
+        escreveu = request.method not in ('GET', 'HEAD', 'OPTIONS') or (estado and estado.escreveu)
+        if escreveu and db_router.replica_configurada():
+            response.set_cookie(COOKIE_PRIMARIO, '1', max_age=self.pinagem, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        marcada = getattr(view_func, 'leitura_na_replica', False) or (
+            request.resolver_match.url_name or ''
+        ).endswith('_changelist')
+        if not marcada or COOKIE_PRIMARIO in request.COOKIES or not db_router.replica_disponivel():
+            return None
+
+        # Só marca o estado; quem chama a view continua sendo o handler do Django
+        estado, request._token_replica = db_router.iniciar_requisicao(usar_replica=True)
+        request._estado_replica = estado
+        request.leitura_na_replica = True
+        return None
+
+
+# --- ESTÁTICOS PRÉ-COMPRIMIDOS ---
+class EstaticosPrecomprimidosMiddleware:
+    """
+    Serve STATIC_ROOT (gerado pelo compilar_estaticos) escolhendo a variante
+    .br/.gz pelo Accept-Encoding. Nomes com hash vão como "immutable"; os
+    nomes originais sempre revalidam. No runserver com DEBUG quem serve é
+    o próprio staticfiles, antes desta middleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixo = _prefixo_url(settings.STATIC_URL)
+        self.raiz = settings.STATIC_ROOT and os.path.realpath(settings.STATIC_ROOT)
+        if not self.prefixo or not self.raiz:
+            raise MiddlewareNotUsed
+        # Lido uma vez na subida: o manifesto só muda com um novo deploy
+        self.imutaveis = frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefixo):
+            return self.get_response(request)
+        nome = request.path[len(self.prefixo):]
+        try:
+            caminho = safe_join(self.raiz, nome)
+        except SuspiciousFileOperation:
+            return self.get_response(request)
+        if not os.path.isfile(caminho):
+            return self.get_response(request)
+
+        arquivo, codificacao = variante_para(caminho, request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        info = os.stat(arquivo)
+        etag = f'"{info.st_mtime_ns:x}-{info.st_size:x}{"-" + codificacao if codificacao else ""}"'
+        resposta = get_conditional_response(request, etag=etag, last_modified=int(info.st_mtime))
+        if resposta is None:
+            resposta = FileResponse(open(arquivo, 'rb'))
+            resposta['Content-Type'] = mimetypes.guess_type(nome)[0] or 'application/octet-stream'
+            if codificacao:
+                resposta['Content-Encoding'] = codificacao
+        resposta['ETag'] = etag
+        resposta['Last-Modified'] = http_date(info.st_mtime)
+        resposta['Cache-Control'] = (
+            'public, max-age=31536000, immutable' if nome in self.imutaveis else 'public, max-age=0, must-revalidate'
+        )
+        patch_vary_headers(resposta, ('Accept-Encoding',))
+        return resposta
+
+
+# --- INSTRUMENTAÇÃO DE SQL POR REQUISIÇÃO ---
+class InstrumentacaoSQLMiddleware:
+    """
+    Envolve as conexões com um execute_wrapper durante a requisição: conta
+    consultas, tempo de SQL e consultas repetidas, devolve tudo no cabeçalho
+    Server-Timing e acumula os histogramas por view (endpoint /metrics).
+    Uma mesma consulta repetida FERIAS_SQL_LIMIAR_DUPLICADAS vezes ou mais
+    vai para o log como possível N+1.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limiar = getattr(settings, 'FERIAS_SQL_LIMIAR_DUPLICADAS', 5)
+
+    def __call__(self, request):
+        coletor = ColetorSQL()
+        inicio = time.perf_counter()
+        with ExitStack() as pilha:
+            for alias in connections:
+                pilha.enter_context(connections[alias].execute_wrapper(coletor))
+            response = self.get_response(request)
+        duracao = time.perf_counter() - inicio
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'sem_rota'
+        registrar_requisicao(view, duracao, coletor)
+
+        response['Server-Timing'] = (
+            f'sql;dur={coletor.tempo * 1000:.1f};desc="{coletor.consultas} consultas", '
+            f'dup;desc="{coletor.duplicadas} repetidas", '
+            f'total;dur={duracao * 1000:.1f}'
+        )
+        for sql, vezes in coletor.repetidas(self.limiar):
+            logger.warning('Possível N+1 em %s: %d x %s', view, vezes, sql[:300])
+        return response
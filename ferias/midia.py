@@ -0,0 +1,149 @@
+# ferias/midia.py
+
+import mimetypes
+import os
+import stat
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.contrib.auth.views import redirect_to_login
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from .imagens import PASTA_MINIATURAS
+
+# --- SERVIDOR DE MÍDIA ---
+# Serve MEDIA_ROOT em produção com ETag/Last-Modified (304), Range (206) e,
+# se configurado, entrega o envio ao servidor web:
+#   FERIAS_MIDIA_X_ACCEL = '/_midia_protegida/'  -> X-Accel-Redirect (nginx, location internal)
+#   FERIAS_MIDIA_SENDFILE = True                 -> X-Sendfile (Apache/lighttpd)
+# Miniaturas têm nome pelo hash do conteúdo: são públicas e "immutable".
+# O resto (fotos originais) exige login e sempre revalida.
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+CACHE_PRIVADO = 'private, no-cache'
+TAMANHO_BLOCO = 64 * 1024
+
+
+@lru_cache(maxsize=4096)
+def resolver_midia(raiz, caminho):
+    """
+    Verificação de acesso, feita uma vez por arquivo (e lembrada): caminho
+    seguro dentro do MEDIA_ROOT (sem '..' nem symlink para fora) e política
+    de acesso. Retorna (caminho_absoluto, caminho_relativo, publico) ou None.
+    A política olha o caminho já resolvido: "miniaturas/../foto.jpg" é a foto
+    original, não uma miniatura.
+    """
+    raiz = os.path.realpath(raiz)
+    try:
+        absoluto = os.path.realpath(safe_join(raiz, caminho))
+    except SuspiciousFileOperation:
+        return None
+    if not absoluto.startswith(raiz + os.sep):
+        return None
+    relativo = os.path.relpath(absoluto, raiz).replace(os.sep, '/')
+    publico = relativo.startswith(PASTA_MINIATURAS)
+    return absoluto, relativo, publico
+
+
+def _tipo(caminho):
+    return mimetypes.guess_type(caminho)[0] or 'application/octet-stream'
+
+
+def _etag(info):
+    return f'"{info.st_mtime_ns:x}-{info.st_size:x}"'
+
+
+def _intervalo(request, tamanho, etag, modificado):
+    """
+    Lê um único intervalo 'bytes=inicio-fim' do cabeçalho Range.
+    Retorna (inicio, fim), None (responder o arquivo todo) ou False (416).
+    """
+    cabecalho = request.META.get('HTTP_RANGE', '')
+    if not cabecalho.startswith('bytes=') or ',' in cabecalho:
+        return None  # sem Range ou vários intervalos: manda tudo (RFC 9110 permite)
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != int(modificado):
+        return None  # o arquivo mudou desde a primeira parte: recomeça
+    inicio, _, fim = cabecalho[len('bytes='):].strip().partition('-')
+    try:
+        if not inicio:
+            # Sufixo: os últimos N bytes
+            inicio, fim = max(tamanho - int(fim), 0), tamanho - 1
+        else:
+            inicio, fim = int(inicio), int(fim) if fim else tamanho - 1
+    except ValueError:
+        return None
+    if inicio > fim or inicio >= tamanho:
+        return False
+    return inicio, min(fim, tamanho - 1)
+
+
+def _ler_intervalo(caminho, inicio, fim):
+    with open(caminho, 'rb') as arquivo:
+        arquivo.seek(inicio)
+        restante = fim - inicio + 1
+        while restante > 0:
+            bloco = arquivo.read(min(TAMANHO_BLOCO, restante))
+            if not bloco:
+                break
+            restante -= len(bloco)
+            yield bloco
+
+
+def servir_midia(request, caminho):
+    resolvido = resolver_midia(str(settings.MEDIA_ROOT), caminho)
+    if resolvido is None:
+        raise Http404('Arquivo não encontrado.')
+    absoluto, caminho, publico = resolvido
+    if not publico and not request.user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+
+    try:
+        info = os.stat(absoluto)
+    except OSError:
+        raise Http404('Arquivo não encontrado.')
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404('Arquivo não encontrado.')
+
+    etag = _etag(info)
+    resposta = get_conditional_response(request, etag=etag, last_modified=int(info.st_mtime))
+    if resposta is None:
+        resposta = _resposta_arquivo(request, caminho, absoluto, info, etag)
+    resposta['ETag'] = etag
+    resposta['Last-Modified'] = http_date(info.st_mtime)
+    resposta['Cache-Control'] = CACHE_IMUTAVEL if publico else CACHE_PRIVADO
+    return resposta
+
+
+def _resposta_arquivo(request, caminho, absoluto, info, etag):
+    x_accel = getattr(settings, 'FERIAS_MIDIA_X_ACCEL', None)
+    if x_accel or getattr(settings, 'FERIAS_MIDIA_SENDFILE', False):
+        # O servidor web envia o arquivo (e trata Range sozinho)
+        resposta = HttpResponse(content_type=_tipo(caminho))
+        if x_accel:
+            resposta['X-Accel-Redirect'] = x_accel.rstrip('/') + '/' + caminho
+        else:
+            resposta['X-Sendfile'] = absoluto
+        return resposta
+
+    intervalo = _intervalo(request, info.st_size, etag, info.st_mtime)
+    if intervalo is False:
+        resposta = HttpResponse(status=416)
+        resposta['Content-Range'] = f'bytes */{info.st_size}'
+        return resposta
+    if intervalo is None:
+        # Arquivo inteiro: o FileResponse usa o wsgi.file_wrapper (sendfile) quando houver
+        resposta = FileResponse(open(absoluto, 'rb'))
+    else:
+        inicio, fim = intervalo
+        resposta = StreamingHttpResponse(
+            _ler_intervalo(absoluto, inicio, fim), status=206,
+            content_type=_tipo(caminho),
+        )
+        resposta['Content-Range'] = f'bytes {inicio}-{fim}/{info.st_size}'
+        resposta['Content-Length'] = str(fim - inicio + 1)
+    resposta['Accept-Ranges'] = 'bytes'
+    return resposta
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ferias', '0003_remove_solicitacaoferias_aprovador_rh_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='solicitacaoferias',
+            index=models.Index(fields=['status', 'data_inicio', 'data_fim'], name='solicitacao_status_datas_idx'),
+        ),
+    ]
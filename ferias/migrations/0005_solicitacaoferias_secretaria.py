@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:09
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def preencher_secretaria(apps, schema_editor):
+    SolicitacaoFerias = apps.get_model('ferias', 'SolicitacaoFerias')
+    PerfilUsuario = apps.get_model('ferias', 'PerfilUsuario')
+    SolicitacaoFerias.objects.update(secretaria=Subquery(
+        PerfilUsuario.objects.filter(user_id=OuterRef('solicitante_id')).values('secretaria')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ferias', '0004_solicitacaoferias_status_datas_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solicitacaoferias',
+            name='secretaria',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(preencher_secretaria, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='solicitacaoferias',
+            index=models.Index(fields=['secretaria', 'status', 'data_fim', 'data_inicio'], name='solicitacao_conflito_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ferias', '0005_solicitacaoferias_secretaria'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='periodoaquisitivo',
+            constraint=models.UniqueConstraint(fields=('perfil', 'data_inicio_aquisitivo'), name='periodo_unico_por_perfil'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def preencher_saldos(apps, schema_editor):
+    PerfilUsuario = apps.get_model('ferias', 'PerfilUsuario')
+    PeriodoAquisitivo = apps.get_model('ferias', 'PeriodoAquisitivo')
+    DescontoFerias = apps.get_model('ferias', 'DescontoFerias')
+
+    periodos = PeriodoAquisitivo.objects.filter(perfil=OuterRef('pk'))
+    reservas = DescontoFerias.objects.filter(
+        periodo_aquisitivo__perfil=OuterRef('pk'), solicitacao__status='PENDENTE_GESTOR'
+    )
+    PerfilUsuario.objects.update(
+        saldo_total=Coalesce(Subquery(
+            periodos.values('perfil').annotate(total=Sum('dias_disponiveis')).values('total')
+        ), Value(0)),
+        dias_reservados=Coalesce(Subquery(
+            reservas.values('periodo_aquisitivo__perfil').annotate(total=Sum('dias_descontados')).values('total')
+        ), Value(0)),
+        periodo_a_vencer=Subquery(
+            periodos.filter(dias_disponiveis__gt=0).order_by('data_inicio_aquisitivo').values('pk')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ferias', '0006_periodo_unico_por_perfil'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='dias_reservados',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='periodo_a_vencer',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='ferias.periodoaquisitivo'),
+        ),
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='saldo_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(preencher_saldos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def construir_hierarquia(apps, schema_editor):
+    PerfilUsuario = apps.get_model('ferias', 'PerfilUsuario')
+    HierarquiaPerfil = apps.get_model('ferias', 'HierarquiaPerfil')
+    gestores = dict(PerfilUsuario.objects.values_list('pk', 'gestor_id'))
+    linhas = []
+    for perfil_id in gestores:
+        atual, profundidade, vistos = perfil_id, 0, set()
+        while atual is not None and atual not in vistos:
+            linhas.append(HierarquiaPerfil(ancestral_id=atual, descendente_id=perfil_id, profundidade=profundidade))
+            vistos.add(atual)
+            atual = gestores.get(atual)
+            profundidade += 1
+    HierarquiaPerfil.objects.bulk_create(linhas, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ferias', '0007_perfilusuario_saldo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HierarquiaPerfil',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profundidade', models.PositiveSmallIntegerField()),
+                ('ancestral', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ferias.perfilusuario')),
+                ('descendente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ferias.perfilusuario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendente', 'ancestral'], name='hierarquia_descendente_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestral', 'descendente'), name='hierarquia_par_unico')],
+            },
+        ),
+        migrations.RunPython(construir_hierarquia, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ferias', '0009_emailsaida'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='resumo_diario',
+            field=models.BooleanField(default=False, help_text='Um único e-mail por dia com as solicitações pendentes da equipe.', verbose_name='Receber resumo diário'),
+        ),
+    ]
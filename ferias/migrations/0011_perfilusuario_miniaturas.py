@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ferias', '0010_perfilusuario_resumo_diario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='foto_cartao',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='fotos_perfil/miniaturas/'),
+        ),
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='foto_miniatura',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='fotos_perfil/miniaturas/'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ferias', '0011_perfilusuario_miniaturas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegraCapacidade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('secretaria', models.CharField(max_length=100)),
+                ('lotacao', models.CharField(blank=True, help_text='Em branco: a regra vale para a secretaria inteira.', max_length=100)),
+                ('max_pessoas', models.PositiveIntegerField(blank=True, null=True, verbose_name='Máximo de pessoas')),
+                ('max_percentual', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='Máximo (% do quadro)')),
+            ],
+            options={
+                'verbose_name': 'regra de capacidade',
+                'verbose_name_plural': 'regras de capacidade',
+                'unique_together': {('secretaria', 'lotacao')},
+            },
+        ),
+    ]
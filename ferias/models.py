@@ -1,4 +1,5 @@
 # ferias/models.py
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -13,12 +14,67 @@ class PerfilUsuario(models.Model):
     data_contratacao = models.DateField(default=timezone.now)
     gestor = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='equipe')
     foto_perfil = models.ImageField(upload_to='fotos_perfil/', null=True, blank=True)
+    # Miniaturas da foto (ferias/imagens.py), geradas no upload com nome pelo
+    # hash do conteúdo; backfill com o comando gerar_miniaturas_fotos.
+    foto_miniatura = models.ImageField(upload_to='fotos_perfil/miniaturas/', null=True, blank=True, editable=False)
+    foto_cartao = models.ImageField(upload_to='fotos_perfil/miniaturas/', null=True, blank=True, editable=False)
     data_nascimento = models.DateField(null=True, blank=True)
     onboarding_completo = models.BooleanField(default=False)
+    # Gestor: um resumo diário (comando enviar_resumo_gestores) em vez de um
+    # e-mail por solicitação nova da equipe.
+    resumo_diario = models.BooleanField(
+        'Receber resumo diário', default=False,
+        help_text='Um único e-mail por dia com as solicitações pendentes da equipe.'
+    )
+
+    # Saldo mantido (desnormalizado). Atualizado com F() nas views que mexem
+    # no saldo e recalculado em lote por services.recalcular_saldos
+    # (comando verificar_saldos --reconstruir para conferir/corrigir).
+    saldo_total = models.IntegerField(default=0, editable=False)
+    dias_reservados = models.IntegerField(default=0, editable=False)
+    periodo_a_vencer = models.ForeignKey(
+        'PeriodoAquisitivo', null=True, blank=True, editable=False,
+        on_delete=models.SET_NULL, related_name='+'
+    )
+
+    CAMPOS_DE_SALDO = ('saldo_total', 'dias_reservados', 'periodo_a_vencer')
 
     def __str__(self):
         return self.user.get_full_name() or self.user.username
 
+    def save(self, *args, **kwargs):
+        # Os campos de saldo só mudam por UPDATE com F() (services.py). Um
+        # save() completo do perfil (formulários, admin) regravaria os valores
+        # lidos antes e desfaria reservas feitas nesse meio tempo.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.CAMPOS_DE_SALDO
+            ]
+        # Ciclo na hierarquia é barrado antes de gravar (o signal só mantém
+        # a tabela de fechamento e não tem como desfazer a gravação)
+        campos = kwargs.get('update_fields')
+        if not self._state.adding and (campos is None or 'gestor' in campos):
+            self.validar_gestor()
+        super().save(*args, **kwargs)
+
+    def validar_gestor(self):
+        """O gestor não pode ser o próprio perfil nem alguém abaixo dele."""
+        if self.gestor_id and self.pk:
+            if self.gestor_id == self.pk or HierarquiaPerfil.objects.filter(
+                ancestral_id=self.pk, descendente_id=self.gestor_id
+            ).exists():
+                raise ValidationError({'gestor': 'O gestor não pode ser o próprio perfil nem alguém da sua equipe.'})
+
+    def clean(self):
+        super().clean()
+        self.validar_gestor()
+
+    @property
+    def saldo_livre(self):
+        """Saldo que ainda pode ser pedido (descontando as solicitações pendentes)."""
+        return self.saldo_total - self.dias_reservados
+
     @property
     def idade(self):
         if self.data_nascimento:
@@ -26,6 +82,30 @@ class PerfilUsuario(models.Model):
             return relativedelta(hoje, self.data_nascimento).years
         return None
 
+class HierarquiaPerfil(models.Model):
+    """
+    Tabela de fechamento (closure table) da hierarquia PerfilUsuario.gestor.
+    Uma linha para cada par (ancestral, descendente), inclusive o próprio
+    perfil com profundidade 0. Toda a subárvore de um gestor sai de um join
+    indexado, sem percorrer a árvore nível a nível.
+    Mantida pelos signals de PerfilUsuario; reconstrua com o comando
+    reconstruir_hierarquia depois de alterações em massa.
+    """
+    ancestral = models.ForeignKey(PerfilUsuario, on_delete=models.CASCADE, related_name='+')
+    descendente = models.ForeignKey(PerfilUsuario, on_delete=models.CASCADE, related_name='+')
+    profundidade = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestral', 'descendente'], name='hierarquia_par_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['descendente', 'ancestral'], name='hierarquia_descendente_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestral_id} -> {self.descendente_id} ({self.profundidade})"
+
 class PeriodoAquisitivo(models.Model):
     STATUS_CHOICES = (
         ('ABERTO', 'Aberto'),
@@ -39,6 +119,12 @@ class PeriodoAquisitivo(models.Model):
     dias_disponiveis = models.IntegerField(default=30)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ABERTO')
 
+    class Meta:
+        constraints = [
+            # Garante que a geração em lote (bulk_create com ignore_conflicts) seja idempotente
+            models.UniqueConstraint(fields=['perfil', 'data_inicio_aquisitivo'], name='periodo_unico_por_perfil'),
+        ]
+
     def __str__(self):
         return f"{self.perfil.user.username} ({self.data_inicio_aquisitivo.year}) - Saldo: {self.dias_disponiveis}"
 
@@ -56,12 +142,32 @@ class SolicitacaoFerias(models.Model):
     aprovador_gestor = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='ferias_aprovadas_gestor')
     data_aprovacao_gestor = models.DateTimeField(null=True, blank=True)
     motivo_rejeicao = models.TextField(blank=True, null=True)
+    # Cópia de solicitante.perfil.secretaria no momento do pedido.
+    # Permite checar conflito na secretaria por índice, sem join com o perfil.
+    secretaria = models.CharField(max_length=100, null=True, blank=True, editable=False)
     periodos_utilizados = models.ManyToManyField(
         PeriodoAquisitivo,
         through='DescontoFerias',
         related_name='solicitacoes_descontadas'
     )
     
+    class Meta:
+        indexes = [
+            # Atende a consulta de sobreposição do calendário:
+            # status = X AND data_inicio < fim AND data_fim >= inicio
+            models.Index(fields=['status', 'data_inicio', 'data_fim'], name='solicitacao_status_datas_idx'),
+            # Atende a Regra 5 (conflito na secretaria). Ordenar por data_fim faz
+            # "data_fim >= inicio" ler só as férias recentes/futuras, não o histórico todo.
+            models.Index(fields=['secretaria', 'status', 'data_fim', 'data_inicio'], name='solicitacao_conflito_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.secretaria is None and self.solicitante_id:
+            self.secretaria = PerfilUsuario.objects.filter(
+                user_id=self.solicitante_id
+            ).values_list('secretaria', flat=True).first()
+        super().save(*args, **kwargs)
+
     @property
     def total_dias(self):
         # TODO: Implementar lógica de dias úteis
@@ -76,4 +182,74 @@ class DescontoFerias(models.Model):
     dias_descontados = models.IntegerField()
 
     class Meta:
-        unique_together = ('solicitacao', 'periodo_aquisitivo')
\ No newline at end of file
+        unique_together = ('solicitacao', 'periodo_aquisitivo')
+
+class RegraCapacidade(models.Model):
+    """
+    Quantas pessoas de uma secretaria (ou de uma lotação dela) podem estar
+    de férias no mesmo dia: um número fixo, uma porcentagem do quadro ou
+    os dois (vale o menor). Sem regra para a secretaria, vale
+    FERIAS_CAPACIDADE_PADRAO.
+    """
+    secretaria = models.CharField(max_length=100)
+    lotacao = models.CharField(
+        max_length=100, blank=True,
+        help_text='Em branco: a regra vale para a secretaria inteira.'
+    )
+    max_pessoas = models.PositiveIntegerField('Máximo de pessoas', null=True, blank=True)
+    max_percentual = models.DecimalField(
+        'Máximo (% do quadro)', max_digits=5, decimal_places=2, null=True, blank=True
+    )
+
+    class Meta:
+        unique_together = ('secretaria', 'lotacao')
+        verbose_name = 'regra de capacidade'
+        verbose_name_plural = 'regras de capacidade'
+
+    def clean(self):
+        super().clean()
+        if self.max_pessoas is None and self.max_percentual is None:
+            raise ValidationError('Informe o máximo de pessoas, a porcentagem do quadro ou os dois.')
+
+    def limite(self, pessoas):
+        """Máximo de ausentes simultâneos para um quadro de `pessoas` (nunca menos que 1)."""
+        limites = []
+        if self.max_pessoas is not None:
+            limites.append(self.max_pessoas)
+        if self.max_percentual is not None:
+            limites.append(int(pessoas * self.max_percentual / 100))
+        return max(min(limites), 1)
+
+    def __str__(self):
+        unidade = f"{self.secretaria} / {self.lotacao}" if self.lotacao else self.secretaria
+        return f"{unidade}: máx. {self.max_pessoas or '-'} pessoas, {self.max_percentual or '-'}%"
+
+class EmailSaida(models.Model):
+    """
+    Caixa de saída (outbox) transacional: os signals gravam aqui, na mesma
+    transação da mudança, e o envio acontece depois do commit ou pelo
+    comando process_outbox, com novas tentativas e backoff.
+    """
+    STATUS_CHOICES = (
+        ('PENDENTE', 'Pendente'),
+        ('ENVIADO', 'Enviado'),
+        ('FALHOU', 'Falhou'),
+    )
+    assunto = models.CharField(max_length=255)
+    mensagem = models.TextField()
+    remetente = models.CharField(max_length=255)
+    destinatarios = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDENTE')
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    proxima_tentativa = models.DateTimeField(default=timezone.now)
+    ultimo_erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'proxima_tentativa'], name='email_saida_fila_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.assunto} -> {', '.join(self.destinatarios)} ({self.status})"
@@ -0,0 +1,174 @@
+# ferias/notificacoes.py
+
+import datetime
+import logging
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import EmailSaida, SolicitacaoFerias
+
+logger = logging.getLogger(__name__)
+
+# Montagem das mensagens de e-mail. Cada função devolve a tupla
+# (assunto, mensagem, remetente, destinatarios) usada por send_mail/send_mass_mail.
+
+def mensagem_nova_solicitacao(solicitacao, gestor_user):
+    subject = f'Nova Solicitação de Férias: {solicitacao.solicitante.get_full_name()}'
+    message = f"""
+    Olá {gestor_user.get_full_name()},
+
+    Uma nova solicitação de férias foi feita por {solicitacao.solicitante.get_full_name()}.
+    Período: {solicitacao.data_inicio.strftime('%d/%m/%Y')} a {solicitacao.data_fim.strftime('%d/%m/%Y')}
+    
+    Por favor, acesse o painel de gestão para analisar.
+    """
+    return subject, message, settings.DEFAULT_FROM_EMAIL, [gestor_user.email]
+
+
+def mensagem_atualizacao(solicitacao):
+    subject = f'Atualização da sua Solicitação de Férias'
+    message = f"""
+    Olá {solicitacao.solicitante.get_full_name()},
+    
+    Sua solicitação de férias para o período de {solicitacao.data_inicio.strftime('%d/%m/%Y')} a {solicitacao.data_fim.strftime('%d/%m/%Y')} foi {solicitacao.get_status_display()}.
+    
+    Status: {solicitacao.get_status_display().upper()}
+    """
+    return subject, message, settings.DEFAULT_FROM_EMAIL, [solicitacao.solicitante.email]
+
+
+
+# --- RESUMO DIÁRIO PARA GESTORES ---
+def solicitacoes_para_resumo():
+    """
+    Solicitações pendentes de todos os gestores em modo resumo, numa única
+    consulta, já ordenadas por gestor (para agrupar com groupby).
+    """
+    return SolicitacaoFerias.objects.filter(
+        status='PENDENTE_GESTOR',
+        solicitante__perfil__gestor__resumo_diario=True,
+    ).exclude(
+        solicitante__perfil__gestor__user__email=''
+    ).select_related(
+        'solicitante__perfil__gestor__user'
+    ).order_by('solicitante__perfil__gestor_id', 'data_inicio', 'pk')
+
+
+def mensagens_resumo_gestores(desde):
+    """Uma mensagem por gestor, renderizada do template de resumo."""
+    mensagens = []
+    agrupadas = groupby(solicitacoes_para_resumo(), key=lambda s: s.solicitante.perfil.gestor)
+    for gestor, solicitacoes in agrupadas:
+        solicitacoes = list(solicitacoes)
+        novas = sum(1 for s in solicitacoes if s.data_solicitacao >= desde)
+        mensagem = render_to_string('ferias/emails/resumo_gestor.txt', {
+            'gestor_user': gestor.user, 'solicitacoes': solicitacoes, 'novas': novas,
+        })
+        assunto = f'Resumo de férias: {len(solicitacoes)} solicitações aguardando sua análise'
+        mensagens.append((assunto, mensagem, settings.DEFAULT_FROM_EMAIL, [gestor.user.email]))
+    return mensagens
+
+
+# --- CAIXA DE SAÍDA (OUTBOX) ---
+# Enquanto um worker envia um lote, os e-mails ficam "arrendados" por este
+# tempo; se ele morrer no meio, outro worker os pega de volta depois.
+PRAZO_ARRENDAMENTO = datetime.timedelta(minutes=5)
+
+
+def enfileirar_emails(mensagens):
+    """
+    Grava as mensagens [(assunto, mensagem, remetente, destinatarios), ...]
+    na caixa de saída, dentro da transação de quem chamou. O envio fica para
+    o comando process_outbox; com FERIAS_EMAIL_DESPACHO_IMEDIATO ligado, o
+    lote já é enviado depois do commit (na mesma thread, ou seja, a
+    requisição espera o SMTP) e só o que falhar sobra para o comando.
+    """
+    emails = EmailSaida.objects.bulk_create([
+        EmailSaida(assunto=assunto, mensagem=mensagem, remetente=remetente, destinatarios=list(destinatarios))
+        for assunto, mensagem, remetente, destinatarios in mensagens
+    ])
+    if emails and getattr(settings, 'FERIAS_EMAIL_DESPACHO_IMEDIATO', False):
+        ids = [email.pk for email in emails]
+        transaction.on_commit(lambda: _despachar_apos_commit(ids))
+    return emails
+
+
+def _despachar_apos_commit(ids):
+    # Já fora da transação: um erro de SMTP não desfaz mais nada, só fica
+    # registrado no e-mail para o process_outbox tentar de novo.
+    try:
+        enviar_pendentes(limite=len(ids), ids=ids)
+    except Exception:
+        logger.exception('Falha no despacho imediato da caixa de saída; o process_outbox tenta de novo.')
+
+
+def _agendar_nova_tentativa(email, erro, agora, max_tentativas, backoff):
+    email.ultimo_erro = str(erro)[:2000]
+    if email.tentativas >= max_tentativas:
+        email.status = 'FALHOU'
+    else:
+        # Backoff exponencial: backoff, 2x, 4x, ...
+        email.proxima_tentativa = agora + datetime.timedelta(seconds=backoff * 2 ** (email.tentativas - 1))
+    email.save(update_fields=['ultimo_erro', 'status', 'proxima_tentativa'])
+
+
+def enviar_pendentes(limite=100, ids=None, max_tentativas=None, backoff=None):
+    """
+    Envia um lote da caixa de saída por uma única conexão SMTP reaproveitada.
+    Retorna (enviados, falhas).
+    """
+    max_tentativas = max_tentativas or getattr(settings, 'FERIAS_EMAIL_MAX_TENTATIVAS', 5)
+    backoff = backoff or getattr(settings, 'FERIAS_EMAIL_BACKOFF_SEGUNDOS', 60)
+    agora = timezone.now()
+
+    # skip_locked deixa dois workers pegarem lotes diferentes no Postgres/MySQL.
+    # No SQLite é ignorado (a escrita trava o arquivo inteiro): lá, rode um
+    # process_outbox por vez; o arrendamento abaixo evita reenvio mesmo assim.
+    with transaction.atomic():
+        fila = EmailSaida.objects.select_for_update(skip_locked=True).filter(
+            status='PENDENTE', proxima_tentativa__lte=agora
+        )
+        if ids is not None:
+            fila = fila.filter(pk__in=ids)
+        lote = list(fila.order_by('pk')[:limite])
+        EmailSaida.objects.filter(pk__in=[email.pk for email in lote]).update(
+            proxima_tentativa=agora + PRAZO_ARRENDAMENTO, tentativas=F('tentativas') + 1
+        )
+    if not lote:
+        return 0, 0
+    for email in lote:
+        email.tentativas += 1
+
+    enviados, falhas = [], 0
+    conexao = get_connection()
+    try:
+        conexao.open()
+    except Exception as erro:
+        logger.warning('Servidor de e-mail indisponível: %s', erro)
+        for email in lote:
+            _agendar_nova_tentativa(email, erro, agora, max_tentativas, backoff)
+        return 0, len(lote)
+
+    try:
+        for email in lote:
+            try:
+                EmailMessage(
+                    email.assunto, email.mensagem, email.remetente, email.destinatarios,
+                    connection=conexao,
+                ).send()
+                enviados.append(email.pk)
+            except Exception as erro:
+                logger.warning('Falha ao enviar e-mail %s: %s', email.pk, erro)
+                _agendar_nova_tentativa(email, erro, agora, max_tentativas, backoff)
+                falhas += 1
+    finally:
+        conexao.close()
+
+    EmailSaida.objects.filter(pk__in=enviados).update(status='ENVIADO', enviado_em=timezone.now())
+    return len(enviados), falhas
@@ -0,0 +1,213 @@
+# ferias/ocupacao.py
+
+import datetime
+import heapq
+from itertools import accumulate
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+
+from .models import PerfilUsuario, RegraCapacidade, SolicitacaoFerias
+
+try:
+    import numpy
+except ImportError:  # opcional: sem o pacote, a soma acumulada é feita em Python
+    numpy = None
+
+# --- OCUPAÇÃO DIÁRIA (QUANTAS PESSOAS DE FÉRIAS EM CADA DIA) ---
+# Os intervalos aprovados que tocam a janela vêm numa consulta só. Cada um
+# soma +1 no dia em que começa e -1 no dia seguinte ao fim (vetor de
+# diferenças); a soma acumulada dá o total de ausentes em cada dia.
+JANELA_MAXIMA_OCUPACAO = 400  # dias
+
+
+def intervalos_aprovados(inicio, fim, secretaria=None, lotacao=None):
+    """
+    (data_inicio, data_fim) das férias aprovadas que se sobrepõem a
+    [inicio, fim), filtradas por secretaria e/ou lotação do solicitante.
+    """
+    aprovadas = SolicitacaoFerias.objects.filter(
+        status='APROVADA_FINAL', data_inicio__lt=fim, data_fim__gte=inicio,
+    )
+    if secretaria:
+        aprovadas = aprovadas.filter(secretaria=secretaria)
+    if lotacao:
+        aprovadas = aprovadas.filter(solicitante__perfil__lotacao=lotacao)
+    return aprovadas.values_list('data_inicio', 'data_fim')
+
+
+def ocupacao_diaria(intervalos, inicio, fim):
+    """Lista com o número de intervalos que cobrem cada dia de [inicio, fim)."""
+    dias = (fim - inicio).days
+    if dias <= 0:
+        return []
+    entradas, saidas = [], []
+    for data_inicio, data_fim in intervalos:
+        # Recorta na janela; data_fim é inclusiva, a saída é no dia seguinte
+        entradas.append(max((data_inicio - inicio).days, 0))
+        saidas.append(min((data_fim - inicio).days + 1, dias))
+
+    if not entradas:
+        return [0] * dias
+
+    if numpy is not None:
+        diferencas = (numpy.bincount(entradas, minlength=dias + 1)
+                      - numpy.bincount(saidas, minlength=dias + 1))
+        return numpy.cumsum(diferencas[:dias]).tolist()
+
+    diferencas = [0] * (dias + 1)
+    for entrada in entradas:
+        diferencas[entrada] += 1
+    for saida in saidas:
+        diferencas[saida] -= 1
+    return list(accumulate(diferencas[:dias]))
+
+
+def pessoas_na_unidade(secretaria=None, lotacao=None):
+    """Quantos perfis existem na secretaria/lotação (a base da porcentagem)."""
+    perfis = PerfilUsuario.objects.all()
+    if secretaria:
+        perfis = perfis.filter(secretaria=secretaria)
+    if lotacao:
+        perfis = perfis.filter(lotacao=lotacao)
+    return perfis.count()
+
+
+def mapa_de_ocupacao(inicio, fim, secretaria=None, lotacao=None):
+    """Dicionário pronto para o JSON do mapa de calor do calendário."""
+    ausentes = ocupacao_diaria(intervalos_aprovados(inicio, fim, secretaria, lotacao), inicio, fim)
+    return {
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'secretaria': secretaria,
+        'lotacao': lotacao,
+        'pessoas': pessoas_na_unidade(secretaria, lotacao),
+        'maximo': max(ausentes, default=0),
+        'dias': [
+            {'data': (inicio + datetime.timedelta(days=i)).isoformat(), 'ausentes': quantidade}
+            for i, quantidade in enumerate(ausentes)
+        ],
+    }
+
+
+# --- CAPACIDADE: PICO DE AUSÊNCIAS SIMULTÂNEAS (REGRA 5) ---
+# Para saber se mais uma pessoa cabe na janela pedida basta o pico de férias
+# simultâneas dentro dela, e não a contagem de cada dia: os intervalos vêm
+# ordenados por data_inicio e um heap guarda o fim dos que ainda estão abertos.
+def pico_de_ausencias(intervalos, inicio, limite=None):
+    """
+    Maior número de intervalos simultâneos a partir de `inicio`, numa só
+    passada pelos intervalos ordenados por data_inicio. Devolve
+    (pico, dia do pico, intervalo que fechou o pico); com `limite`, para
+    assim que o pico chega nele.
+    """
+    abertos = []
+    pico, dia, intervalo_pico = 0, None, None
+    for data_inicio, data_fim in intervalos:
+        entrada = max(data_inicio, inicio)
+        while abertos and abertos[0] < entrada:
+            heapq.heappop(abertos)
+        heapq.heappush(abertos, data_fim)
+        if len(abertos) > pico:
+            pico, dia, intervalo_pico = len(abertos), entrada, (data_inicio, data_fim)
+            if limite is not None and pico >= limite:
+                break
+    return pico, dia, intervalo_pico
+
+
+def limites_de_capacidade(secretaria, lotacao=None):
+    """
+    [(lotacao, limite)] que valem para quem é da secretaria/lotação: a regra
+    da secretaria inteira (lotacao None) e a da lotação, se existirem. Sem
+    nenhuma regra, FERIAS_CAPACIDADE_PADRAO para a secretaria inteira.
+    """
+    limites = []
+    for regra in RegraCapacidade.objects.filter(secretaria=secretaria, lotacao__in={'', lotacao or ''}):
+        escopo = regra.lotacao or None
+        pessoas = pessoas_na_unidade(secretaria, escopo) if regra.max_percentual is not None else 0
+        limites.append((escopo, regra.limite(pessoas)))
+    if not limites:
+        padrao = getattr(settings, 'FERIAS_CAPACIDADE_PADRAO', 1)
+        if padrao:
+            limites.append((None, padrao))
+    return limites
+
+
+def verificar_capacidade(secretaria, lotacao, inicio, fim, excluir_pk=None):
+    """
+    Confere se mais uma pessoa cabe em [inicio, fim] (datas inclusivas).
+    Devolve None ou o primeiro limite estourado:
+    (lotacao, limite, pico, dia, intervalo que fechou o pico).
+    """
+    for escopo, limite in limites_de_capacidade(secretaria, lotacao):
+        intervalos = intervalos_aprovados(inicio, fim + datetime.timedelta(days=1), secretaria, escopo)
+        if excluir_pk:
+            intervalos = intervalos.exclude(pk=excluir_pk)
+        # Ordena em Python: um ORDER BY data_inicio levaria o SQLite ao índice
+        # (status, data_inicio, ...), que percorre o histórico inteiro, em vez
+        # do solicitacao_conflito_idx, que só lê as férias que tocam a janela.
+        pico, dia, intervalo = pico_de_ausencias(sorted(intervalos), inicio, limite)
+        if pico >= limite:
+            return escopo, limite, pico, dia, intervalo
+    return None
+
+
+# --- SUGESTÃO DE JANELAS LIVRES ---
+# Em vez de testar cada data candidata com o formulário (e as consultas dele),
+# monta-se uma vez a ocupação do horizonte inteiro e procura-se, numa
+# passada pelos dias, as sequências sem nenhum dia lotado.
+DURACAO_MINIMA = 10  # Regra 2 do SolicitacaoFeriasForm
+
+
+def dias_lotados(secretaria, lotacao, inicio, fim):
+    """[bool] por dia de [inicio, fim): True onde mais uma pessoa estouraria algum limite."""
+    lotados = [False] * max((fim - inicio).days, 0)
+    if not secretaria:
+        return lotados
+    for escopo, limite in limites_de_capacidade(secretaria, lotacao):
+        ausentes = ocupacao_diaria(intervalos_aprovados(inicio, fim, secretaria, escopo), inicio, fim)
+        lotados = [lotado or quantidade >= limite for lotado, quantidade in zip(lotados, ausentes)]
+    return lotados
+
+
+def janelas_livres(lotados, inicio, dias, quantidade):
+    """
+    As primeiras `quantidade` janelas de `dias` dias seguidos sem dia
+    lotado, uma depois da outra (sem sobreposição), como [(inicio, fim)].
+    """
+    janelas = []
+    seguidos = 0
+    for i, lotado in enumerate(lotados):
+        seguidos = 0 if lotado else seguidos + 1
+        if seguidos == dias:
+            comeco = inicio + datetime.timedelta(days=i - dias + 1)
+            janelas.append((comeco, comeco + datetime.timedelta(days=dias - 1)))
+            if len(janelas) == quantidade:
+                break
+            seguidos = 0
+    return janelas
+
+
+def sugerir_janelas(perfil, dias, inicio, horizonte, quantidade):
+    """
+    Janelas de `dias` dias que passariam nas Regras 2 a 5 do
+    SolicitacaoFeriasForm, começando entre `inicio` e `inicio + horizonte`.
+    Devolve ([(inicio, fim)], motivo); o motivo explica uma lista vazia
+    que não depende da ocupação (saldo ou tempo de casa).
+    """
+    if dias < DURACAO_MINIMA:
+        return [], f'O período mínimo para solicitação de férias é de {DURACAO_MINIMA} dias.'
+    if perfil.saldo_livre < dias:
+        return [], f'Saldo insuficiente: você tem {perfil.saldo_livre} dias livres.'
+
+    # Regra 3: 1 ano de casa
+    um_ano_de_casa = perfil.data_contratacao + relativedelta(years=1)
+    comeco = max(inicio, um_ano_de_casa)
+    fim = inicio + datetime.timedelta(days=horizonte)
+    if comeco > fim:
+        return [], f"Você só pode solicitar férias após {um_ano_de_casa.strftime('%d/%m/%Y')}."
+
+    # A última janela pode começar em `fim` e terminar dias - 1 depois
+    limite = fim + datetime.timedelta(days=dias)
+    lotados = dias_lotados(perfil.secretaria, perfil.lotacao, comeco, limite)
+    return janelas_livres(lotados, comeco, dias, quantidade), None
@@ -0,0 +1,489 @@
+# ferias/services.py
+
+import datetime
+
+from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import invalidar_eventos
+from .models import HierarquiaPerfil, PerfilUsuario, PeriodoAquisitivo, SolicitacaoFerias, DescontoFerias
+from .notificacoes import enfileirar_emails, mensagem_atualizacao
+
+
+def _somar_anos(data, anos):
+    """Como data + relativedelta(years=anos) (29/02 vira 28/02), bem mais barato em lote."""
+    try:
+        return data.replace(year=data.year + anos)
+    except ValueError:
+        return data.replace(year=data.year + anos, day=28)
+
+
+def calcular_periodos_faltantes(perfil_id, data_contratacao, ultimo_fim=None, hoje=None):
+    """
+    Calcula, em memória, os períodos aquisitivos que faltam para o perfil.
+    O período só é "ganho" quando se completa 1 ano.
+
+    ultimo_fim: data_fim_aquisitivo do último período já existente (ou None,
+    e então a série começa na data de contratação).
+    """
+    hoje = hoje or timezone.now().date()
+    if ultimo_fim:
+        base = ultimo_fim + datetime.timedelta(days=1)
+    else:
+        # Se nunca teve, o primeiro "aniversário" é a própria data de contratação
+        base = data_contratacao
+
+    periodos = []
+    anos = 0
+    # Sempre soma a partir da base para não "escorregar" em 29/02
+    while _somar_anos(base, anos + 1) <= hoje:
+        inicio = _somar_anos(base, anos)
+        fim = _somar_anos(base, anos + 1) - datetime.timedelta(days=1)
+        periodos.append(PeriodoAquisitivo(
+            perfil_id=perfil_id,
+            data_inicio_aquisitivo=inicio,
+            data_fim_aquisitivo=fim,
+            dias_direito=30,
+            dias_disponiveis=30, # Começa com 30 (usuário vai ajustar)
+            status='ABERTO',
+        ))
+        anos += 1
+    return periodos
+
+
+def criar_periodos_faltantes(perfil, hoje=None):
+    """
+    Cria de uma vez (um único INSERT) os períodos aquisitivos que faltam
+    desde a data de contratação. É idempotente: a constraint única em
+    (perfil, data_inicio_aquisitivo) descarta o que já existir.
+    Retorna a lista de períodos calculados.
+    """
+    ultimo_fim = perfil.periodos_aquisitivos.order_by(
+        '-data_inicio_aquisitivo'
+    ).values_list('data_fim_aquisitivo', flat=True).first()
+
+    periodos = calcular_periodos_faltantes(perfil.pk, perfil.data_contratacao, ultimo_fim, hoje)
+    if periodos:
+        PeriodoAquisitivo.objects.bulk_create(periodos, ignore_conflicts=True)
+        recalcular_saldos(PerfilUsuario.objects.filter(pk=perfil.pk))
+    return periodos
+
+
+def perfis_com_ultimo_periodo():
+    """
+    Perfis anotados com o fim do último período aquisitivo, numa única
+    consulta (subquery correlacionada), como tuplas (id, data_contratacao, ultimo_fim).
+    """
+    ultimo_fim = PeriodoAquisitivo.objects.filter(
+        perfil=OuterRef('pk')
+    ).order_by('-data_inicio_aquisitivo').values('data_fim_aquisitivo')[:1]
+    return PerfilUsuario.objects.annotate(
+        ultimo_fim=Subquery(ultimo_fim)
+    ).order_by('pk').values_list('pk', 'data_contratacao', 'ultimo_fim')
+
+
+# --- SALDO MANTIDO NO PERFIL ---
+def subquery_periodo_a_vencer():
+    """Período mais antigo que ainda tem saldo (o próximo a vencer)."""
+    return Subquery(
+        PeriodoAquisitivo.objects.filter(
+            perfil=OuterRef('pk'), dias_disponiveis__gt=0
+        ).order_by('data_inicio_aquisitivo').values('pk')[:1]
+    )
+
+
+def expressoes_saldo():
+    """
+    Expressões que recalculam, a partir dos períodos e descontos, os campos
+    de saldo de PerfilUsuario. Servem tanto para UPDATE quanto para annotate.
+    """
+    saldo = PeriodoAquisitivo.objects.filter(perfil=OuterRef('pk')).values('perfil').annotate(
+        total=Sum('dias_disponiveis')
+    ).values('total')
+    reservado = DescontoFerias.objects.filter(
+        periodo_aquisitivo__perfil=OuterRef('pk'), solicitacao__status='PENDENTE_GESTOR'
+    ).values('periodo_aquisitivo__perfil').annotate(total=Sum('dias_descontados')).values('total')
+    return {
+        'saldo_total': Coalesce(Subquery(saldo), Value(0)),
+        'dias_reservados': Coalesce(Subquery(reservado), Value(0)),
+        'periodo_a_vencer': subquery_periodo_a_vencer(),
+    }
+
+
+def recalcular_saldos(perfis):
+    """Recalcula o saldo de um queryset de perfis num único UPDATE."""
+    return perfis.update(**expressoes_saldo())
+
+
+def reservar_dias(perfil_id, dias):
+    """Nova solicitação pendente: os dias ficam reservados."""
+    PerfilUsuario.objects.filter(pk=perfil_id).update(dias_reservados=F('dias_reservados') + dias)
+
+
+def reservar_periodos(solicitacao, perfil):
+    """
+    Reparte os dias de uma solicitação nova pelos períodos, do mais antigo
+    ao mais novo (cascata), e reserva o total no perfil. Cada período só
+    oferece o que sobra depois das reservas de outras solicitações
+    pendentes; do contrário a aprovação de uma delas faria a outra falhar
+    por "saldo insuficiente" com o saldo total disponível.
+
+    Trava o perfil para que dois pedidos simultâneos da mesma pessoa não
+    reservem os mesmos dias. Levanta IntegrityError se o saldo livre não
+    cobrir o pedido (quem chama desfaz a transação).
+    """
+    PerfilUsuario.objects.select_for_update().filter(pk=perfil.pk).values_list('pk').first()
+    reservados = dict(DescontoFerias.objects.filter(
+        periodo_aquisitivo__perfil=perfil, solicitacao__status='PENDENTE_GESTOR',
+    ).exclude(solicitacao=solicitacao).values('periodo_aquisitivo').annotate(
+        total=Sum('dias_descontados')
+    ).values_list('periodo_aquisitivo', 'total'))
+    periodos = PeriodoAquisitivo.objects.filter(
+        perfil=perfil, dias_disponiveis__gt=0
+    ).order_by('data_inicio_aquisitivo').values_list('pk', 'dias_disponiveis')
+
+    restante = solicitacao.total_dias
+    descontos = []
+    for periodo_id, disponiveis in periodos:
+        livres = disponiveis - reservados.get(periodo_id, 0)
+        if livres <= 0:
+            continue
+        dias = min(livres, restante)
+        descontos.append(DescontoFerias(
+            solicitacao=solicitacao, periodo_aquisitivo_id=periodo_id, dias_descontados=dias
+        ))
+        restante -= dias
+        if not restante:
+            break
+    if restante:
+        raise IntegrityError("Saldo livre insuficiente para a solicitação.")
+
+    DescontoFerias.objects.bulk_create(descontos)
+    reservar_dias(perfil.pk, solicitacao.total_dias)
+    return descontos
+
+
+def liberar_reserva(perfil_id, dias):
+    """Solicitação pendente rejeitada: devolve a reserva."""
+    PerfilUsuario.objects.filter(pk=perfil_id).update(dias_reservados=F('dias_reservados') - dias)
+
+
+def consumir_reserva(perfil_id, dias):
+    """
+    Solicitação aprovada: a reserva vira desconto no saldo. Deve rodar depois
+    de atualizar os períodos, na mesma transação, para o período a vencer sair certo.
+    """
+    PerfilUsuario.objects.filter(pk=perfil_id).update(
+        saldo_total=F('saldo_total') - dias,
+        dias_reservados=F('dias_reservados') - dias,
+        periodo_a_vencer=subquery_periodo_a_vencer(),
+    )
+
+
+# --- APROVAÇÃO ---
+def descontar_periodos(descontos):
+    """
+    Aplica os descontos [(periodo_id, dias), ...] no saldo dos períodos.
+
+    Os períodos são travados numa única consulta (select_for_update, em ordem
+    de pk para evitar deadlock) e cada desconto vira um UPDATE condicional
+    "dias_disponiveis >= dias". Se algum UPDATE não afetar linha nenhuma, o
+    saldo acabou no meio do caminho: levanta IntegrityError (e a transação
+    de quem chamou deve ser desfeita).
+    """
+    ids = sorted({periodo_id for periodo_id, _ in descontos})
+    list(PeriodoAquisitivo.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk', flat=True))
+
+    for periodo_id, dias in descontos:
+        atualizados = PeriodoAquisitivo.objects.filter(
+            pk=periodo_id, dias_disponiveis__gte=dias
+        ).update(
+            dias_disponiveis=F('dias_disponiveis') - dias,
+            # No UPDATE o CASE enxerga o valor antigo: zerou, fecha o período
+            status=Case(When(dias_disponiveis=dias, then=Value('FECHADO')), default=F('status')),
+        )
+        if not atualizados:
+            raise IntegrityError("Falha na aprovação. Saldo insuficiente detectado.")
+
+
+def efetivar_aprovacao(solicitacao, aprovador):
+    """
+    Aprova uma solicitação pendente: desconta os períodos, consome a reserva
+    do perfil e grava o novo status, tudo ou nada. Levanta IntegrityError
+    se faltar saldo. Quem chama deve ter travado a solicitação
+    (select_for_update) e conferido que ela ainda está pendente.
+    """
+    descontos = list(DescontoFerias.objects.filter(solicitacao=solicitacao).values_list(
+        'periodo_aquisitivo_id', 'periodo_aquisitivo__perfil_id', 'dias_descontados'
+    ))
+    with transaction.atomic():
+        descontar_periodos([(periodo_id, dias) for periodo_id, _, dias in descontos])
+        if descontos:
+            consumir_reserva(descontos[0][1], sum(dias for _, _, dias in descontos))
+
+        solicitacao.status = 'APROVADA_FINAL'
+        solicitacao.aprovador_gestor = aprovador
+        solicitacao.data_aprovacao_gestor = timezone.now()
+        solicitacao.save()
+
+
+# --- AÇÕES EM LOTE (PAINEL DO GESTOR) ---
+RESULTADOS_LOTE = {
+    'aprovada': 'Aprovada',
+    'rejeitada': 'Rejeitada',
+    'saldo_insuficiente': 'Saldo insuficiente',
+    'nao_pendente': 'Não está mais pendente',
+}
+
+
+def _somar_por(pares):
+    totais = {}
+    for chave, dias in pares:
+        totais[chave] = totais.get(chave, 0) + dias
+    return totais
+
+
+def _case_por_pk(totais, campo, sinal=-1):
+    """CASE pk WHEN ... THEN campo -/+ n, para atualizar várias linhas num UPDATE só."""
+    return Case(
+        *[When(pk=pk, then=F(campo) + sinal * dias) for pk, dias in totais.items()],
+        default=F(campo),
+    )
+
+
+def _registrar_analise(processadas, novo_status, aprovador, **campos):
+    """Grava o status das solicitações analisadas e enfileira os e-mails de aviso."""
+    if not processadas:
+        return
+    agora = timezone.now()
+    SolicitacaoFerias.objects.filter(pk__in=[s.pk for s in processadas]).update(
+        status=novo_status, aprovador_gestor=aprovador, data_aprovacao_gestor=agora, **campos
+    )
+    # update() não dispara os signals: invalida o calendário e avisa por e-mail aqui
+    if novo_status == 'APROVADA_FINAL':
+        transaction.on_commit(invalidar_eventos)
+    mensagens = []
+    for solicitacao in processadas:
+        solicitacao.status = novo_status
+        if solicitacao.solicitante.email:
+            mensagens.append(mensagem_atualizacao(solicitacao))
+    if mensagens:
+        enfileirar_emails(mensagens)
+
+
+def rejeitar_pendentes(selecionadas, aprovador, motivo=''):
+    """
+    Rejeita as solicitações de `selecionadas` (queryset) que ainda estão
+    pendentes, com as linhas travadas, e devolve os dias reservados por
+    elas. As que já foram analisadas ficam como estão: uma aprovação
+    concorrente não tem a reserva consumida e liberada ao mesmo tempo.
+    Retorna a lista das rejeitadas. Chame dentro de uma transação.
+    """
+    pendentes = list(
+        selecionadas.select_for_update().filter(status='PENDENTE_GESTOR')
+        .select_related('solicitante').order_by('data_inicio', 'pk')
+    )
+    por_perfil = _somar_por(DescontoFerias.objects.filter(
+        solicitacao__in=[s.pk for s in pendentes]
+    ).values_list('periodo_aquisitivo__perfil_id', 'dias_descontados'))
+    if por_perfil:
+        PerfilUsuario.objects.filter(pk__in=por_perfil).update(
+            dias_reservados=_case_por_pk(por_perfil, 'dias_reservados'),
+        )
+    _registrar_analise(pendentes, 'REJEITADA', aprovador, motivo_rejeicao=motivo)
+    return pendentes
+
+
+MAIOR_PK = 2 ** 63 - 1  # bigint; acima disso o banco nem aceita o parâmetro
+
+
+def _ler_ids(ids):
+    """Converte os ids do POST em int, levantando ValueError para os que não podem ser uma pk."""
+    convertidos = {int(pk) for pk in ids}
+    if not all(1 <= pk <= MAIOR_PK for pk in convertidos):
+        raise ValueError('Id de solicitação fora do intervalo.')
+    return convertidos
+
+
+def processar_lote(perfil_gestor, aprovador, ids, acao, motivo=''):
+    """
+    Aprova ou rejeita várias solicitações numa única transação.
+
+    A permissão é checada uma vez para o conjunto: todos os solicitantes
+    precisam ser da equipe de perfil_gestor, senão PermissionDenied e nada
+    muda. Os descontos são somados por período e aplicados com um UPDATE
+    (CASE) por tabela; pedidos que não cabem no saldo ficam pendentes.
+    Os e-mails vão juntos para a caixa de saída (um bulk_create).
+    Retorna {pk: resultado} com as chaves de RESULTADOS_LOTE.
+    """
+    if acao not in ('aprovar', 'rejeitar'):
+        raise ValueError(f'Ação desconhecida: {acao}')
+    ids = _ler_ids(ids)
+
+    with transaction.atomic():
+        selecionadas = SolicitacaoFerias.objects.filter(pk__in=ids)
+        if selecionadas.exclude(solicitante__perfil__gestor=perfil_gestor).exists():
+            raise PermissionDenied('Há solicitações de fora da sua equipe.')
+        resultado = {pk: 'nao_pendente' for pk in ids}
+
+        if acao == 'rejeitar':
+            for solicitacao in rejeitar_pendentes(selecionadas, aprovador, motivo):
+                resultado[solicitacao.pk] = 'rejeitada'
+            return resultado
+
+        pendentes = list(
+            selecionadas.select_for_update().filter(status='PENDENTE_GESTOR')
+            .select_related('solicitante').order_by('data_inicio', 'pk')
+        )
+        descontos = {}
+        for solicitacao_id, periodo_id, perfil_id, dias in DescontoFerias.objects.filter(
+            solicitacao__in=[s.pk for s in pendentes]
+        ).values_list('solicitacao_id', 'periodo_aquisitivo_id', 'periodo_aquisitivo__perfil_id', 'dias_descontados'):
+            descontos.setdefault(solicitacao_id, []).append((periodo_id, perfil_id, dias))
+
+        periodos_ids = sorted({p for itens in descontos.values() for p, _, _ in itens})
+        saldo = dict(
+            PeriodoAquisitivo.objects.select_for_update().filter(pk__in=periodos_ids)
+            .order_by('pk').values_list('pk', 'dias_disponiveis')
+        )
+        processadas = []
+        for solicitacao in pendentes:
+            itens = descontos.get(solicitacao.pk, [])
+            if all(saldo[p] >= dias for p, _, dias in itens):
+                for p, _, dias in itens:
+                    saldo[p] -= dias
+                processadas.append(solicitacao)
+                resultado[solicitacao.pk] = 'aprovada'
+            else:
+                resultado[solicitacao.pk] = 'saldo_insuficiente'
+
+        itens = [item for s in processadas for item in descontos.get(s.pk, [])]
+        por_periodo = _somar_por((p, dias) for p, _, dias in itens)
+        por_perfil = _somar_por((perfil, dias) for _, perfil, dias in itens)
+        if por_periodo:
+            PeriodoAquisitivo.objects.filter(pk__in=por_periodo).update(
+                dias_disponiveis=_case_por_pk(por_periodo, 'dias_disponiveis'),
+                status=Case(
+                    *[When(pk=p, then=Value('FECHADO')) for p in por_periodo if saldo[p] == 0],
+                    default=F('status'),
+                ),
+            )
+            PerfilUsuario.objects.filter(pk__in=por_perfil).update(
+                saldo_total=_case_por_pk(por_perfil, 'saldo_total'),
+                dias_reservados=_case_por_pk(por_perfil, 'dias_reservados'),
+                periodo_a_vencer=subquery_periodo_a_vencer(),
+            )
+        _registrar_analise(processadas, 'APROVADA_FINAL', aprovador)
+
+    return resultado
+
+
+# --- HIERARQUIA (CLOSURE TABLE) ---
+def calcular_fechamento(gestores, perfis=None):
+    """
+    gestores: {perfil_id: gestor_id}. Gera as tuplas (ancestral, descendente,
+    profundidade) da tabela de fechamento, subindo a cadeia de cada perfil
+    (ou só dos `perfis` informados). Um ciclo (dado inválido) é cortado no
+    primeiro perfil repetido.
+    """
+    for perfil_id in gestores if perfis is None else perfis:
+        atual, profundidade, vistos = perfil_id, 0, set()
+        while atual is not None and atual not in vistos:
+            yield atual, perfil_id, profundidade
+            vistos.add(atual)
+            atual = gestores.get(atual)
+            profundidade += 1
+
+
+def reconstruir_hierarquia(chunk_size=5000):
+    """Apaga e reconstrói a tabela de fechamento inteira em lotes. Retorna o total de linhas."""
+    gestores = dict(PerfilUsuario.objects.values_list('pk', 'gestor_id'))
+    total = 0
+    with transaction.atomic():
+        HierarquiaPerfil.objects.all().delete()
+        lote = []
+        for ancestral, descendente, profundidade in calcular_fechamento(gestores):
+            lote.append(HierarquiaPerfil(ancestral_id=ancestral, descendente_id=descendente, profundidade=profundidade))
+            if len(lote) >= chunk_size:
+                HierarquiaPerfil.objects.bulk_create(lote)
+                total += len(lote)
+                lote = []
+        HierarquiaPerfil.objects.bulk_create(lote)
+        total += len(lote)
+    return total
+
+
+def incluir_na_hierarquia(perfis, chunk_size=5000):
+    """
+    Acrescenta à tabela de fechamento as linhas de perfis recém-criados em
+    lote (sem signal), sem refazer a tabela inteira. Vale quando ninguém
+    de fora do lote responde a eles. Retorna o total de linhas.
+    """
+    gestores = dict(PerfilUsuario.objects.values_list('pk', 'gestor_id'))
+    total = 0
+    lote = []
+    for ancestral, descendente, profundidade in calcular_fechamento(gestores, perfis):
+        lote.append(HierarquiaPerfil(ancestral_id=ancestral, descendente_id=descendente, profundidade=profundidade))
+        if len(lote) >= chunk_size:
+            HierarquiaPerfil.objects.bulk_create(lote, ignore_conflicts=True)
+            total += len(lote)
+            lote = []
+    HierarquiaPerfil.objects.bulk_create(lote, ignore_conflicts=True)
+    return total + len(lote)
+
+
+def mover_na_hierarquia(perfil_id, novo_gestor_id):
+    """
+    Atualiza a tabela de fechamento quando o gestor de um perfil muda (ou
+    quando o perfil é criado): desliga a subárvore dos ancestrais antigos e
+    a religa, inteira, sob os ancestrais do novo gestor.
+    """
+    with transaction.atomic():
+        subarvore = list(HierarquiaPerfil.objects.filter(ancestral_id=perfil_id).values_list(
+            'descendente_id', 'profundidade'
+        ))
+        if not subarvore:
+            HierarquiaPerfil.objects.create(ancestral_id=perfil_id, descendente_id=perfil_id, profundidade=0)
+            subarvore = [(perfil_id, 0)]
+        if novo_gestor_id in {descendente for descendente, _ in subarvore}:
+            raise ValueError('O gestor escolhido está abaixo deste perfil na hierarquia.')
+
+        ids_subarvore = HierarquiaPerfil.objects.filter(ancestral_id=perfil_id).values('descendente_id')
+        HierarquiaPerfil.objects.filter(
+            descendente_id__in=ids_subarvore
+        ).exclude(ancestral_id__in=ids_subarvore).delete()
+
+        if novo_gestor_id is None:
+            return
+        ancestrais = list(HierarquiaPerfil.objects.filter(descendente_id=novo_gestor_id).values_list(
+            'ancestral_id', 'profundidade'
+        )) or [(novo_gestor_id, 0)]
+        HierarquiaPerfil.objects.bulk_create([
+            HierarquiaPerfil(
+                ancestral_id=ancestral, descendente_id=descendente,
+                profundidade=acima + abaixo + 1,
+            )
+            for ancestral, acima in ancestrais
+            for descendente, abaixo in subarvore
+        ], ignore_conflicts=True)
+
+
+def desligar_equipe(perfil_id):
+    """
+    Antes de excluir um perfil: tira da tabela de fechamento as linhas que
+    ligam quem está abaixo dele a ele e aos ancestrais dele. A equipe vira
+    raiz (o SET_NULL do gestor faz o mesmo nos perfis, sem signals).
+    """
+    abaixo = HierarquiaPerfil.objects.filter(ancestral_id=perfil_id, profundidade__gt=0).values('descendente_id')
+    HierarquiaPerfil.objects.filter(descendente_id__in=abaixo).exclude(ancestral_id__in=abaixo).delete()
+
+
+def subarvore(perfil, incluir_proprio=False):
+    """Ids dos perfis abaixo de 'perfil' (todos os níveis), para usar como subquery."""
+    linhas = HierarquiaPerfil.objects.filter(ancestral=perfil)
+    if not incluir_proprio:
+        linhas = linhas.filter(profundidade__gt=0)
+    return linhas.values('descendente_id')
@@ -0,0 +1,31 @@
+# ferias/sessoes.py
+
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+# --- SESSÃO DESLIZANTE QUE EVITA ESCRITAS ---
+# Com SESSION_SAVE_EVERY_REQUEST cada página (e cada fetch do calendário)
+# regravava a sessão, um UPDATE em django_session que no SQLite entra na
+# fila do lock de escrita. Esta engine (cache + banco como fallback) só
+# grava quando os dados mudaram ou quando a última gravação tem mais de
+# FERIAS_SESSAO_LIMIAR_SEGUNDOS. A expiração continua deslizante: no pior
+# caso a sessão ociosa dura SESSION_COOKIE_AGE menos o limiar.
+CHAVE_SALVO_EM = '_ferias_salvo_em'
+
+
+class SessionStore(CachedDBStore):
+    def _precisa_gravar(self):
+        if self.modified or self.session_key is None:
+            return True
+        salvo_em = self._session.get(CHAVE_SALVO_EM)
+        limiar = getattr(settings, 'FERIAS_SESSAO_LIMIAR_SEGUNDOS', 60)
+        return salvo_em is None or time.time() - salvo_em >= limiar
+
+    def save(self, must_create=False):
+        if not must_create and not self._precisa_gravar():
+            return
+        # Direto no dicionário: não deve marcar a sessão como modificada
+        self._session[CHAVE_SALVO_EM] = time.time()
+        super().save(must_create=must_create)
@@ -1,11 +1,19 @@
 # ferias/signals.py
 
-from django.db.models.signals import post_save
+import logging
+
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import PerfilUsuario, SolicitacaoFerias
-from django.core.mail import send_mail
-from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from .models import DescontoFerias, PerfilUsuario, PeriodoAquisitivo, SolicitacaoFerias
+from django.db import transaction
+from .cache import invalidar_eventos, invalidar_fragmentos
+from .middleware import SESSAO_ONBOARDING
+from .notificacoes import enfileirar_emails, mensagem_nova_solicitacao, mensagem_atualizacao
+from .services import desligar_equipe, mover_na_hierarquia
+
+logger = logging.getLogger(__name__)
 
 # Cria um PerfilUsuario automaticamente toda vez que um User é criado.
 @receiver(post_save, sender=User)
@@ -13,45 +21,108 @@ def criar_perfil_usuario(sender, instance, created, **kwargs):
     if created:
         PerfilUsuario.objects.create(user=instance)
 
-# Envia e-mails de notificação
+# Mantém a tabela de fechamento da hierarquia (HierarquiaPerfil) quando o gestor muda
+@receiver(pre_save, sender=PerfilUsuario)
+def lembrar_gestor_anterior(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and 'gestor' not in update_fields:
+        return
+    instance._gestor_anterior_id = PerfilUsuario.objects.filter(
+        pk=instance.pk
+    ).values_list('gestor_id', flat=True).first()
+
+def _mover_na_hierarquia(instance):
+    # O ciclo já é barrado em PerfilUsuario.save(); se ainda assim passar
+    # (corrida entre duas gravações), não derruba quem salvou o perfil.
+    try:
+        mover_na_hierarquia(instance.pk, instance.gestor_id)
+    except ValueError:
+        logger.error('Ciclo na hierarquia ao mover o perfil %s; rode reconstruir_hierarquia.', instance.pk)
+
+@receiver(post_save, sender=PerfilUsuario)
+def atualizar_hierarquia(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        _mover_na_hierarquia(instance)
+    elif hasattr(instance, '_gestor_anterior_id'):
+        if instance._gestor_anterior_id != instance.gestor_id:
+            _mover_na_hierarquia(instance)
+        del instance._gestor_anterior_id
+
+# Excluir um gestor anula o gestor da equipe (SET_NULL, sem signals): antes
+# disso, a subárvore dele sai da tabela de fechamento dos ancestrais.
+@receiver(pre_delete, sender=PerfilUsuario)
+def desligar_equipe_ao_excluir(sender, instance, **kwargs):
+    desligar_equipe(instance.pk)
+
+# Guarda na sessão, uma vez por login, se o onboarding já foi concluído.
+# Assim o OnboardingMiddleware não precisa buscar o perfil a cada requisição.
+@receiver(user_logged_in)
+def guardar_onboarding_na_sessao(sender, request, user, **kwargs):
+    if request is None:
+        return
+    completo = user.is_staff or PerfilUsuario.objects.filter(
+        user=user, onboarding_completo=True
+    ).exists()
+    request.session[SESSAO_ONBOARDING] = completo
+
+# Invalida o feed do calendário quando uma solicitação muda de status.
+# Só as aprovadas aparecem no calendário, então uma criação ainda pendente não conta.
+@receiver(post_save, sender=SolicitacaoFerias)
+def invalidar_calendario_ao_salvar(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not {'status', 'data_inicio', 'data_fim'} & set(update_fields):
+        return
+    if created and instance.status != 'APROVADA_FINAL':
+        return
+    # Só depois do commit: antes disso outra requisição ainda leria os dados antigos
+    transaction.on_commit(invalidar_eventos)
+
+@receiver(post_delete, sender=SolicitacaoFerias)
+def invalidar_calendario_ao_excluir(sender, instance, **kwargs):
+    if instance.status == 'APROVADA_FINAL':
+        transaction.on_commit(invalidar_eventos)
+
+# Invalida os fragmentos de dashboard/perfil do dono da solicitação, desconto ou período.
+# (Aprovações em lote usam UPDATE sem signals, mas mexem no saldo do perfil,
+# que também entra na chave dos fragmentos.)
+def _invalidar_fragmentos_apos_commit(user_id):
+    if user_id:
+        transaction.on_commit(lambda: invalidar_fragmentos(user_id))
+
+@receiver([post_save, post_delete], sender=SolicitacaoFerias)
+def invalidar_fragmentos_solicitacao(sender, instance, **kwargs):
+    _invalidar_fragmentos_apos_commit(instance.solicitante_id)
+
+@receiver([post_save, post_delete], sender=DescontoFerias)
+def invalidar_fragmentos_desconto(sender, instance, **kwargs):
+    _invalidar_fragmentos_apos_commit(
+        SolicitacaoFerias.objects.filter(pk=instance.solicitacao_id).values_list('solicitante_id', flat=True).first()
+    )
+
+@receiver([post_save, post_delete], sender=PeriodoAquisitivo)
+def invalidar_fragmentos_periodo(sender, instance, **kwargs):
+    _invalidar_fragmentos_apos_commit(
+        PerfilUsuario.objects.filter(pk=instance.perfil_id).values_list('user_id', flat=True).first()
+    )
+
+# Envia e-mails de notificação (pela caixa de saída: nada de SMTP dentro da transação)
 @receiver(post_save, sender=SolicitacaoFerias)
 def enviar_notificacao_por_email(sender, instance, created, **kwargs):
     solicitacao = instance
     
     # E-mail para o gestor quando uma nova solicitação é criada
     if created and solicitacao.status == 'PENDENTE_GESTOR':
-        try:
-            gestor_perfil = solicitacao.solicitante.perfil.gestor
-            if gestor_perfil and gestor_perfil.user.email:
-                gestor_user = gestor_perfil.user
-                subject = f'Nova Solicitação de Férias: {solicitacao.solicitante.get_full_name()}'
-                message = f"""
-                Olá {gestor_user.get_full_name()},
-
-                Uma nova solicitação de férias foi feita por {solicitacao.solicitante.get_full_name()}.
-                Período: {solicitacao.data_inicio.strftime('%d/%m/%Y')} a {solicitacao.data_fim.strftime('%d/%m/%Y')}
-                
-                Por favor, acesse o painel de gestão para analisar.
-                """
-                send_mail(
-                    subject, message, settings.DEFAULT_FROM_EMAIL,
-                    [gestor_user.email], fail_silently=False
-                )
-        except PerfilUsuario.DoesNotExist:
-            pass # Não falha se o perfil/gestor não existir
+        # Gestor + user numa consulta só (em vez de solicitante.perfil.gestor.user)
+        gestor_perfil = PerfilUsuario.objects.select_related('user').filter(
+            equipe__user_id=solicitacao.solicitante_id
+        ).first()
+        # Gestores em modo resumo recebem tudo junto (comando enviar_resumo_gestores)
+        if gestor_perfil and gestor_perfil.user.email and not gestor_perfil.resumo_diario:
+            enfileirar_emails([mensagem_nova_solicitacao(solicitacao, gestor_perfil.user)])
 
     # E-mail para o funcionário quando o status muda (aprovado/rejeitado)
     if not created and solicitacao.solicitante.email:
         if instance.status == 'APROVADA_FINAL' or instance.status == 'REJEITADA':
-            subject = f'Atualização da sua Solicitação de Férias'
-            message = f"""
-            Olá {solicitacao.solicitante.get_full_name()},
-            
-            Sua solicitação de férias para o período de {solicitacao.data_inicio.strftime('%d/%m/%Y')} a {solicitacao.data_fim.strftime('%d/%m/%Y')} foi {solicitacao.get_status_display()}.
-            
-            Status: {solicitacao.get_status_display().upper()}
-            """
-            send_mail(
-                subject, message, settings.DEFAULT_FROM_EMAIL,
-                [solicitacao.solicitante.email], fail_silently=False
-            )
\ No newline at end of file
+            enfileirar_emails([mensagem_atualizacao(solicitacao)])
@@ -1,5 +1,42 @@
 document.addEventListener('DOMContentLoaded', function() {
   var calendarioEl = document.getElementById('calendario');
+  // Filtros opcionais por secretaria/lotação (?secretaria=...&lotacao=... na URL da página)
+  var parametrosExtras = {};
+  if (calendarioEl.dataset.secretaria) {
+    parametrosExtras.secretaria = calendarioEl.dataset.secretaria;
+  }
+  if (calendarioEl.dataset.lotacao) {
+    parametrosExtras.lotacao = calendarioEl.dataset.lotacao;
+  }
+
+  // Mapa de calor: um evento de fundo por dia, com a cor proporcional às
+  // ausências (em relação ao total de pessoas da unidade, ou ao pico da janela)
+  function carregarOcupacao(info, sucesso, falha) {
+    var parametros = new URLSearchParams(parametrosExtras);
+    parametros.set('start', info.startStr.substring(0, 10));
+    parametros.set('end', info.endStr.substring(0, 10));
+    fetch(calendarioEl.dataset.urlOcupacao + '?' + parametros.toString(), {credentials: 'same-origin'})
+      .then(function(resposta) {
+        if (!resposta.ok) { throw new Error('HTTP ' + resposta.status); }
+        return resposta.json();
+      })
+      .then(function(mapa) {
+        var base = Math.max(mapa.pessoas || mapa.maximo, 1);
+        sucesso(mapa.dias.filter(function(dia) { return dia.ausentes; }).map(function(dia) {
+          var intensidade = Math.min(dia.ausentes / base, 1);
+          return {
+            start: dia.data,
+            allDay: true,
+            display: 'background',
+            title: dia.ausentes + (dia.ausentes === 1 ? ' ausente' : ' ausentes'),
+            backgroundColor: 'rgba(255, 69, 0, ' + (0.15 + 0.75 * intensidade).toFixed(2) + ')'
+          };
+        }));
+      })
+      .catch(falha);
+  }
+
+  var mapa = calendarioEl.dataset.modo === 'mapa';
   
   var calendario = new FullCalendar.Calendar(calendarioEl, {
     initialView: 'dayGridMonth',
@@ -8,14 +45,17 @@ document.addEventListener('DOMContentLoaded', function() {
     headerToolbar: {
       left: 'prev,next today',
       center: 'title',
-      right: 'dayGridMonth,timeGridWeek,listWeek'
+      right: mapa ? 'dayGridMonth' : 'dayGridMonth,timeGridWeek,listWeek'
     },
     
     fixedWeekCount: false, 
     height: 'auto',        
-    events: '/api/eventos/',
+    events: mapa ? carregarOcupacao : {
+      url: calendarioEl.dataset.urlEventos,
+      extraParams: parametrosExtras
+    },
     timeZone: 'local'
   });
   
   calendario.render();
-});
\ No newline at end of file
+});
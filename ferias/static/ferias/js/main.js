@@ -58,4 +58,19 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
-});
\ No newline at end of file
+});
+
+
+document.addEventListener('DOMContentLoaded', function() {
+
+    // Painel do gestor: marca/desmarca todas as solicitações para a ação em lote
+    const selecionarTodas = document.querySelector('.js-selecionar-todas');
+
+    if (selecionarTodas) {
+        selecionarTodas.addEventListener('change', function() {
+            document.querySelectorAll('input[name="solicitacoes"]').forEach(caixa => {
+                caixa.checked = selecionarTodas.checked;
+            });
+        });
+    }
+});
@@ -0,0 +1,51 @@
+document.addEventListener('DOMContentLoaded', function() {
+  var sugestoesEl = document.getElementById('sugestoes');
+  if (!sugestoesEl) { return; }
+
+  var botao = document.getElementById('sugestoes-botao');
+  var aviso = document.getElementById('sugestoes-aviso');
+  var lista = document.getElementById('sugestoes-lista');
+
+  function formatar(dataIso) {
+    var partes = dataIso.split('-');
+    return partes[2] + '/' + partes[1] + '/' + partes[0];
+  }
+
+  function mostrarAviso(texto) {
+    aviso.textContent = texto;
+    aviso.hidden = !texto;
+  }
+
+  // Busca as próximas janelas livres e, no clique, preenche o formulário
+  botao.addEventListener('click', function() {
+    var dias = document.getElementById('sugestoes-dias').value;
+    mostrarAviso('');
+    lista.innerHTML = '';
+    fetch(sugestoesEl.dataset.url + '?dias=' + encodeURIComponent(dias), {credentials: 'same-origin'})
+      .then(function(resposta) { return resposta.json(); })
+      .then(function(dados) {
+        if (dados.erro || dados.motivo) {
+          mostrarAviso(dados.erro || dados.motivo);
+          return;
+        }
+        if (!dados.janelas.length) {
+          mostrarAviso('Nenhuma janela livre nos próximos ' + dados.horizonte + ' dias.');
+          return;
+        }
+        dados.janelas.forEach(function(janela) {
+          var item = document.createElement('li');
+          var opcao = document.createElement('button');
+          opcao.type = 'button';
+          opcao.className = 'botao-secundario';
+          opcao.textContent = formatar(janela.data_inicio) + ' a ' + formatar(janela.data_fim);
+          opcao.addEventListener('click', function() {
+            document.getElementById('id_data_inicio').value = janela.data_inicio;
+            document.getElementById('id_data_fim').value = janela.data_fim;
+          });
+          item.appendChild(opcao);
+          lista.appendChild(item);
+        });
+      })
+      .catch(function() { mostrarAviso('Não foi possível buscar sugestões agora.'); });
+  });
+});
@@ -0,0 +1,42 @@
+# ferias/templatetags/ferias_cache.py
+
+from django import template
+from django.core.cache import cache
+
+from ..cache import TEMPO_FRAGMENTOS, chave_fragmento, registrar_fragmento
+
+register = template.Library()
+
+
+class FragmentoCacheNode(template.Node):
+    def __init__(self, nodelist, nome, partes):
+        self.nodelist = nodelist
+        self.nome = nome
+        self.partes = partes
+
+    def render(self, context):
+        nome = self.nome.resolve(context)
+        chave = chave_fragmento(nome, [parte.resolve(context) for parte in self.partes])
+        html = cache.get(chave)
+        registrar_fragmento(nome, acerto=html is not None)
+        if html is None:
+            html = self.nodelist.render(context)
+            cache.set(chave, html, TEMPO_FRAGMENTOS)
+        return html
+
+
+@register.tag
+def fragmento_cache(parser, token):
+    """
+    Como o {% cache %} do Django, mas contando acertos/falhas por fragmento:
+
+        {% fragmento_cache 'nome' user.pk versao_fragmentos ... %} ... {% endfragmento_cache %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' precisa do nome do fragmento.")
+    nodelist = parser.parse(('endfragmento_cache',))
+    parser.delete_first_token()
+    return FragmentoCacheNode(
+        nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(bit) for bit in bits[2:]]
+    )
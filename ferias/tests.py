@@ -1,3 +1,1675 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import shutil
+import sqlite3
+import tempfile
+import os
+import threading
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import F
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from .benchmark import CENARIOS, medir_views, urls_sem_cenario
+from .cache import estatisticas_fragmentos
+from . import db_router
+from .db_router import RoteadorReplica, leitura_na_replica
+from .forms import SolicitacaoFeriasForm
+from .middleware import COOKIE_PRIMARIO, InstrumentacaoSQLMiddleware, ReplicaLeituraMiddleware
+from .midia import resolver_midia
+from .models import (
+    DescontoFerias, EmailSaida, HierarquiaPerfil, PerfilUsuario, PeriodoAquisitivo, RegraCapacidade,
+    SolicitacaoFerias,
+)
+from .notificacoes import mensagens_resumo_gestores
+from . import ocupacao
+from .services import (
+    calcular_periodos_faltantes, criar_periodos_faltantes, efetivar_aprovacao, mover_na_hierarquia,
+    recalcular_saldos,
+)
+
+
+def criar_usuario(username, secretaria='SEMAD', gestor=None, **campos_perfil):
+    """Cria um User já com o perfil pronto (onboarding completo)."""
+    user = User.objects.create_user(
+        username=username, password='senha-teste-123',
+        first_name=username.capitalize(), email=f'{username}@exemplo.gov.br',
+    )
+    campos = {
+        'secretaria': secretaria,
+        'gestor': gestor,
+        'data_contratacao': datetime.date(2015, 1, 1),
+        'onboarding_completo': True,
+    }
+    campos.update(campos_perfil)
+    PerfilUsuario.objects.filter(user=user).update(**campos)
+    user.refresh_from_db()
+    if gestor:
+        mover_na_hierarquia(user.perfil.pk, gestor.pk)
+    return user
+
+# Benchmarks são lentos: rode com FERIAS_BENCHMARK=1 python manage.py test ferias
+BENCHMARK = bool(os.environ.get('FERIAS_BENCHMARK'))
+
+
+def dar_saldo(user, dias=60):
+    perfil = user.perfil
+    PeriodoAquisitivo.objects.create(
+        perfil=perfil, data_inicio_aquisitivo=datetime.date(2015, 1, 1),
+        data_fim_aquisitivo=datetime.date(2015, 12, 31),
+        dias_direito=dias, dias_disponiveis=dias,
+    )
+    recalcular_saldos(PerfilUsuario.objects.filter(pk=perfil.pk))
+    user.refresh_from_db()
+    perfil.refresh_from_db()
+
+
+def aprovar_em_massa(usuarios, quantidade, inicio=datetime.date(2000, 1, 3), duracao=10):
+    """Cria 'quantidade' férias aprovadas em sequência, sem sobreposição."""
+    SolicitacaoFerias.objects.bulk_create([
+        SolicitacaoFerias(
+            solicitante=usuarios[i % len(usuarios)], status='APROVADA_FINAL',
+            secretaria=usuarios[i % len(usuarios)].perfil.secretaria,
+            data_inicio=inicio + datetime.timedelta(days=i // 4),
+            data_fim=inicio + datetime.timedelta(days=i // 4 + duracao - 1),
+        )
+        for i in range(quantidade)
+    ], batch_size=5000)
+
+
+class ApiEventosFeriasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = criar_usuario('ana')
+        for i, username in enumerate(['bruno', 'carla', 'davi']):
+            colega = criar_usuario(username)
+            SolicitacaoFerias.objects.create(
+                solicitante=colega, status='APROVADA_FINAL',
+                data_inicio=datetime.date(2025, 1 + i * 3, 5),
+                data_fim=datetime.date(2025, 1 + i * 3, 20),
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_filtra_pela_janela_do_calendario(self):
+        url = reverse('ferias:api_eventos')
+        resposta = self.client.get(url, {
+            'start': '2025-03-30T00:00:00-03:00',
+            'end': '2025-05-11T00:00:00-03:00',
+        })
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json(), [
+            {'title': 'Carla', 'start': '2025-04-05', 'end': '2025-04-21'},
+        ])
+
+    def test_consulta_unica_independente_do_volume(self):
+        url = reverse('ferias:api_eventos')
+        with CaptureQueriesContext(connection) as ctx:
+            resposta = self.client.get(url, {'start': '2025-01-01', 'end': '2026-01-01'})
+        self.assertEqual(len(resposta.json()), 3)
+        consultas_eventos = [q for q in ctx.captured_queries if 'ferias_solicitacaoferias' in q['sql']]
+        self.assertEqual(len(consultas_eventos), 1)
+
+    def test_parametros_invalidos(self):
+        resposta = self.client.get(reverse('ferias:api_eventos'), {'start': 'ontem'})
+        self.assertEqual(resposta.status_code, 400)
+
+
+class ApiEventosCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = criar_usuario('ana')
+        cls.colega = criar_usuario('bruno', secretaria='SEMED')
+        cls.solicitacao = SolicitacaoFerias.objects.create(
+            solicitante=cls.colega, status='PENDENTE_GESTOR',
+            data_inicio=datetime.date(2025, 3, 5), data_fim=datetime.date(2025, 3, 20),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse('ferias:api_eventos')
+        self.janela = {'start': '2025-03-01', 'end': '2025-04-01'}
+
+    def test_etag_devolve_304_sem_consultar_solicitacoes(self):
+        primeira = self.client.get(self.url, self.janela)
+        self.assertTrue(primeira.has_header('ETag'))
+        self.assertTrue(primeira.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            segunda = self.client.get(self.url, self.janela, HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(segunda.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if 'ferias_solicitacaoferias' in q['sql']])
+
+    def test_mudanca_de_status_invalida_o_cache(self):
+        primeira = self.client.get(self.url, self.janela)
+        self.assertEqual(primeira.json(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.solicitacao.status = 'APROVADA_FINAL'
+            self.solicitacao.save()
+
+        segunda = self.client.get(self.url, self.janela, HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(segunda.status_code, 200)
+        self.assertEqual(len(segunda.json()), 1)
+
+    def test_filtro_por_secretaria(self):
+        self.solicitacao.status = 'APROVADA_FINAL'
+        self.solicitacao.save()
+        resposta = self.client.get(self.url, {**self.janela, 'secretaria': 'SEMAD'})
+        self.assertEqual(resposta.json(), [])
+        resposta = self.client.get(self.url, {**self.janela, 'secretaria': 'SEMED'})
+        self.assertEqual(len(resposta.json()), 1)
+
+    def test_filtro_por_lotacao_entra_no_cache_e_no_etag(self):
+        PerfilUsuario.objects.filter(user=self.colega).update(lotacao='Protocolo')
+        self.solicitacao.status = 'APROVADA_FINAL'
+        self.solicitacao.save()
+        protocolo = self.client.get(self.url, {**self.janela, 'lotacao': 'Protocolo'})
+        self.assertEqual(len(protocolo.json()), 1)
+        outra = self.client.get(self.url, {**self.janela, 'lotacao': 'Arquivo'}, HTTP_IF_NONE_MATCH=protocolo['ETag'])
+        self.assertEqual((outra.status_code, outra.json()), (200, []))
+
+
+class ConflitoSecretariaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = criar_usuario('ana')
+        dar_saldo(cls.user)
+        colega = criar_usuario('bruno')
+        SolicitacaoFerias.objects.create(
+            solicitante=colega, status='APROVADA_FINAL',
+            data_inicio=datetime.date(2030, 7, 1), data_fim=datetime.date(2030, 7, 15),
+        )
+
+    def validar(self, inicio, fim):
+        return SolicitacaoFeriasForm({'data_inicio': inicio, 'data_fim': fim}, user=self.user)
+
+    def test_secretaria_copiada_do_perfil(self):
+        self.assertEqual(SolicitacaoFerias.objects.get().secretaria, 'SEMAD')
+
+    def test_sobreposicao_bloqueia(self):
+        form = self.validar('2030-07-10', '2030-07-25')
+        self.assertFalse(form.is_valid())
+        self.assertIn('01/07/2030 e 15/07/2030', form.non_field_errors()[0])
+
+    def test_sem_sobreposicao_passa(self):
+        self.assertTrue(self.validar('2030-07-16', '2030-07-30').is_valid())
+
+    def test_outra_secretaria_nao_conflita(self):
+        PerfilUsuario.objects.filter(user=self.user).update(secretaria='SEMED')
+        self.user.refresh_from_db()
+        self.assertTrue(self.validar('2030-07-10', '2030-07-25').is_valid())
+
+
+@unittest.skipUnless(BENCHMARK, 'benchmark: defina FERIAS_BENCHMARK=1')
+class ConflitoSecretariaBenchmark(TestCase):
+    """A latência da validação deve ficar estável com 1k, 10k e 100k férias aprovadas."""
+
+    def test_latencia_estavel_com_historico(self):
+        user = criar_usuario('ana')
+        dar_saldo(user)
+        colegas = [criar_usuario(f'colega{i}') for i in range(50)]
+        form_data = {'data_inicio': '2099-01-10', 'data_fim': '2099-01-25'}
+
+        medias = {}
+        criadas = 0
+        for tamanho in (1_000, 10_000, 100_000):
+            aprovar_em_massa(colegas, tamanho - criadas,
+                             inicio=datetime.date(1990, 1, 1) + datetime.timedelta(days=criadas // 4))
+            criadas = tamanho
+            amostras = []
+            for _ in range(50):
+                t0 = time.perf_counter()
+                self.assertTrue(SolicitacaoFeriasForm(form_data, user=user).is_valid())
+                amostras.append(time.perf_counter() - t0)
+            amostras.sort()
+            medias[tamanho] = amostras[len(amostras) // 2]
+            print(f'\n[benchmark conflito] {tamanho:>7} aprovadas: p50 {medias[tamanho] * 1000:.3f} ms')
+
+        self.assertLess(medias[100_000], medias[1_000] * 3)
+
+
+class OnboardingMiddlewareTests(TestCase):
+    def test_usuario_configurado_nao_consulta_perfil(self):
+        self.client.force_login(criar_usuario('ana'))
+        with CaptureQueriesContext(connection) as ctx:
+            resposta = self.client.get(reverse('ferias:api_eventos'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'ferias_perfilusuario' in q['sql']])
+
+    def test_onboarding_pendente_redireciona_e_libera_ao_concluir(self):
+        user = criar_usuario('bia', onboarding_completo=False, data_contratacao=datetime.date(2022, 3, 1))
+        self.client.force_login(user)
+
+        resposta = self.client.get(reverse('ferias:dashboard'))
+        self.assertRedirects(resposta, reverse('ferias:onboarding'))
+        self.assertFalse(self.client.session['onboarding_completo'])
+
+        periodos = PeriodoAquisitivo.objects.filter(perfil=user.perfil)
+        self.assertTrue(periodos.exists())
+        self.client.post(reverse('ferias:onboarding'), {
+            f'periodo_saldo_{p.pk}': 30 for p in periodos
+        })
+        self.assertTrue(self.client.session['onboarding_completo'])
+        self.assertEqual(self.client.get(reverse('ferias:dashboard')).status_code, 200)
+
+
+class CriarPeriodosFaltantesTests(TestCase):
+    def test_gera_serie_completa_em_um_insert_e_e_idempotente(self):
+        user = criar_usuario('ana', data_contratacao=datetime.date(1994, 2, 28))
+        perfil = user.perfil
+        hoje = datetime.date(2025, 3, 1)
+
+        with self.assertNumQueries(3):  # último período + INSERT em lote + saldo
+            criar_periodos_faltantes(perfil, hoje=hoje)
+        periodos = list(perfil.periodos_aquisitivos.order_by('data_inicio_aquisitivo'))
+        self.assertEqual(len(periodos), 31)
+        self.assertEqual(periodos[0].data_inicio_aquisitivo, datetime.date(1994, 2, 28))
+        self.assertEqual(periodos[-1].data_fim_aquisitivo, datetime.date(2025, 2, 27))
+
+        self.assertEqual(criar_periodos_faltantes(perfil, hoje=hoje), [])
+        self.assertEqual(perfil.periodos_aquisitivos.count(), 31)
+
+
+class GerarPeriodosAquisitivosCommandTests(TestCase):
+    def setUp(self):
+        self.antigo = criar_usuario('ana', data_contratacao=datetime.date(1995, 6, 1))
+        self.novo = criar_usuario('bia', data_contratacao=datetime.date(2023, 6, 1))
+        criar_periodos_faltantes(self.novo.perfil, hoje=datetime.date(2024, 7, 1))
+
+    def test_gera_em_lotes_e_respeita_dry_run(self):
+        saida = io.StringIO()
+        call_command('gerar_periodos_aquisitivos', '--dry-run', '--chunk-size=1', stdout=saida)
+        self.assertIn('perfis/s', saida.getvalue())
+        self.assertFalse(PeriodoAquisitivo.objects.filter(perfil=self.antigo.perfil).exists())
+
+        call_command('gerar_periodos_aquisitivos', '--chunk-size=1', stdout=io.StringIO())
+        hoje = timezone.now().date()
+        anos_antigo = len(calcular_periodos_faltantes(None, datetime.date(1995, 6, 1), hoje=hoje))
+        self.assertEqual(self.antigo.perfil.periodos_aquisitivos.count(), anos_antigo)
+        # Continua a série existente sem duplicar o primeiro período
+        self.assertEqual(
+            self.novo.perfil.periodos_aquisitivos.filter(data_inicio_aquisitivo=datetime.date(2023, 6, 1)).count(), 1
+        )
+
+        call_command('gerar_periodos_aquisitivos', stdout=io.StringIO())
+        self.assertEqual(self.antigo.perfil.periodos_aquisitivos.count(), anos_antigo)
+
+
+class SaldoMantidoTests(TestCase):
+    def setUp(self):
+        self.gestor = criar_usuario('gestor')
+        self.user = criar_usuario('ana', gestor=self.gestor.perfil)
+        dar_saldo(self.user, dias=40)
+        self.client.force_login(self.user)
+
+    def perfil(self):
+        return PerfilUsuario.objects.get(user=self.user)
+
+    def solicitar(self, inicio, fim):
+        return self.client.post(reverse('ferias:solicitar_ferias'), {'data_inicio': inicio, 'data_fim': fim})
+
+    def test_reserva_aprovacao_e_rejeicao(self):
+        self.solicitar('2030-01-01', '2030-01-20')
+        self.assertEqual((self.perfil().saldo_total, self.perfil().dias_reservados), (40, 20))
+
+        # A reserva pendente conta: não dá para pedir mais 30 dias
+        resposta = self.solicitar('2030-03-01', '2030-03-30')
+        self.assertContains(resposta, 'Seu saldo total é: 20 dias')
+
+        self.solicitar('2030-05-01', '2030-05-10')
+        primeira, segunda = SolicitacaoFerias.objects.order_by('data_inicio')
+
+        self.client.force_login(self.gestor)
+        self.client.post(reverse('ferias:aprovar_solicitacao', args=[primeira.pk]))
+        self.client.post(reverse('ferias:rejeitar_solicitacao', args=[segunda.pk]), {'motivo_rejeicao': 'x'})
+
+        perfil = self.perfil()
+        self.assertEqual((perfil.saldo_total, perfil.dias_reservados, perfil.saldo_livre), (20, 0, 20))
+        self.assertEqual(perfil.periodo_a_vencer.dias_disponiveis, 20)
+
+        saida = io.StringIO()
+        call_command('verificar_saldos', stdout=saida)
+        self.assertIn('Todos os saldos conferem', saida.getvalue())
+
+    def test_rejeitar_analisada_nao_mexe_na_reserva(self):
+        self.solicitar('2030-01-01', '2030-01-10')
+        self.solicitar('2030-03-01', '2030-03-10')
+        self.solicitar('2030-05-01', '2030-05-10')
+        aprovada, rejeitada, _ = SolicitacaoFerias.objects.order_by('data_inicio')
+        self.client.force_login(self.gestor)
+        self.client.post(reverse('ferias:aprovar_solicitacao', args=[aprovada.pk]))
+        self.client.post(reverse('ferias:rejeitar_solicitacao', args=[rejeitada.pk]), {'motivo_rejeicao': 'x'})
+        self.assertEqual((self.perfil().saldo_total, self.perfil().dias_reservados), (30, 10))
+
+        for solicitacao in (aprovada, rejeitada):
+            self.client.post(reverse('ferias:rejeitar_solicitacao', args=[solicitacao.pk]), {'motivo_rejeicao': 'y'})
+        self.assertEqual((self.perfil().saldo_total, self.perfil().dias_reservados), (30, 10))
+        self.assertEqual(SolicitacaoFerias.objects.get(pk=aprovada.pk).status, 'APROVADA_FINAL')
+        self.assertEqual(SolicitacaoFerias.objects.get(pk=rejeitada.pk).motivo_rejeicao, 'x')
+
+    def test_cascata_desconta_reservas_pendentes(self):
+        # P1 = 30 e P2 = 30: A pede 20 (P1), B pede 30 e só cabem 10 em P1
+        user = criar_usuario('bia', gestor=self.gestor.perfil)
+        for ano in (2015, 2016):
+            PeriodoAquisitivo.objects.create(
+                perfil=user.perfil, data_inicio_aquisitivo=datetime.date(ano, 1, 1),
+                data_fim_aquisitivo=datetime.date(ano, 12, 31), dias_direito=30, dias_disponiveis=30,
+            )
+        recalcular_saldos(PerfilUsuario.objects.filter(user=user))
+        self.client.force_login(user)
+        self.solicitar('2030-01-01', '2030-01-20')
+        self.solicitar('2030-03-01', '2030-03-30')
+        a, b = SolicitacaoFerias.objects.filter(solicitante=user).order_by('data_inicio')
+        self.assertEqual(
+            sorted(DescontoFerias.objects.filter(solicitacao=b).values_list('periodo_aquisitivo__data_inicio_aquisitivo__year', 'dias_descontados')),
+            [(2015, 10), (2016, 20)],
+        )
+
+        self.client.force_login(self.gestor)
+        for solicitacao in (a, b):
+            self.client.post(reverse('ferias:aprovar_solicitacao', args=[solicitacao.pk]))
+        self.assertEqual(
+            SolicitacaoFerias.objects.filter(solicitante=user, status='APROVADA_FINAL').count(), 2
+        )
+        perfil = PerfilUsuario.objects.get(user=user)
+        self.assertEqual((perfil.saldo_total, perfil.dias_reservados), (10, 0))
+
+    def test_save_completo_nao_sobrescreve_o_saldo(self):
+        desatualizado = self.perfil()
+        self.solicitar('2030-01-01', '2030-01-20')
+        desatualizado.cargo = 'Analista'
+        desatualizado.save()
+        perfil = self.perfil()
+        self.assertEqual((perfil.cargo, perfil.dias_reservados), ('Analista', 20))
+
+    def test_admin_recalcula_ao_apagar_ou_mudar_status(self):
+        self.solicitar('2030-01-01', '2030-01-20')
+        self.solicitar('2030-03-01', '2030-03-10')
+        primeira, segunda = SolicitacaoFerias.objects.order_by('data_inicio')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@exemplo.gov.br', 'x'))
+
+        self.client.post(reverse('admin:ferias_solicitacaoferias_delete', args=[primeira.pk]), {'post': 'yes'})
+        self.assertEqual(self.perfil().dias_reservados, 10)
+
+        self.client.post(reverse('admin:ferias_solicitacaoferias_change', args=[segunda.pk]), {
+            'solicitante': self.user.pk, 'data_inicio': '2030-03-01', 'data_fim': '2030-03-10',
+            'status': 'REJEITADA', 'motivo_rejeicao': 'x',
+        })
+        self.assertEqual(SolicitacaoFerias.objects.get(pk=segunda.pk).status, 'REJEITADA')
+        self.assertEqual(self.perfil().dias_reservados, 0)
+
+    def test_verificar_e_reconstruir(self):
+        PerfilUsuario.objects.filter(user=self.user).update(saldo_total=999)
+        saida = io.StringIO()
+        call_command('verificar_saldos', stdout=saida)
+        self.assertIn('1 perfis com saldo divergente', saida.getvalue())
+
+        call_command('verificar_saldos', '--reconstruir', stdout=io.StringIO())
+        self.assertEqual(self.perfil().saldo_total, 40)
+
+
+class AprovacaoTests(TestCase):
+    def setUp(self):
+        self.gestor = criar_usuario('gestor')
+        self.user = criar_usuario('ana', gestor=self.gestor.perfil)
+        dar_saldo(self.user, dias=30)
+        self.periodo = PeriodoAquisitivo.objects.get(perfil__user=self.user)
+        self.client.force_login(self.gestor)
+
+    def pendente(self, dias):
+        solicitacao = SolicitacaoFerias.objects.create(
+            solicitante=self.user, data_inicio=datetime.date(2030, 1, 1),
+            data_fim=datetime.date(2030, 1, dias),
+        )
+        DescontoFerias.objects.create(solicitacao=solicitacao, periodo_aquisitivo=self.periodo, dias_descontados=dias)
+        return solicitacao
+
+    def test_saldo_insuficiente_desfaz_tudo(self):
+        primeira, segunda = self.pendente(20), self.pendente(20)
+        self.client.post(reverse('ferias:aprovar_solicitacao', args=[primeira.pk]))
+        self.client.post(reverse('ferias:aprovar_solicitacao', args=[segunda.pk]))
+
+        self.periodo.refresh_from_db()
+        segunda.refresh_from_db()
+        self.assertEqual(self.periodo.dias_disponiveis, 10)
+        self.assertEqual(segunda.status, 'PENDENTE_GESTOR')
+
+    def test_aprovacao_repetida_nao_desconta_de_novo(self):
+        solicitacao = self.pendente(30)
+        url = reverse('ferias:aprovar_solicitacao', args=[solicitacao.pk])
+        self.client.post(url)
+        self.client.post(url)
+        self.periodo.refresh_from_db()
+        self.assertEqual((self.periodo.dias_disponiveis, self.periodo.status), (0, 'FECHADO'))
+
+
+@unittest.skipUnless(BENCHMARK, 'benchmark: defina FERIAS_BENCHMARK=1')
+class AprovacaoConcorrenteStressTest(TransactionTestCase):
+    """
+    Várias threads aprovando ao mesmo tempo contra SQLite em modo WAL.
+    Precisa de banco em arquivo: FERIAS_TEST_DB=/tmp/ferias_teste.sqlite3
+    """
+    THREADS = 8
+    SOLICITACOES = 200
+
+    def setUp(self):
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            self.skipTest('defina FERIAS_TEST_DB para rodar em SQLite com arquivo')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def test_sem_gasto_duplo(self):
+        gestor = criar_usuario('gestor')
+        user = criar_usuario('ana', gestor=gestor.perfil)
+        dar_saldo(user, dias=300)
+        periodo = PeriodoAquisitivo.objects.get(perfil__user=user)
+        # 200 pedidos de 10 dias disputando 300 dias: só 30 podem passar
+        for _ in range(self.SOLICITACOES):
+            solicitacao = SolicitacaoFerias.objects.create(
+                solicitante=user, data_inicio=datetime.date(2030, 1, 1), data_fim=datetime.date(2030, 1, 10),
+            )
+            DescontoFerias.objects.create(solicitacao=solicitacao, periodo_aquisitivo=periodo, dias_descontados=10)
+        ids = list(SolicitacaoFerias.objects.values_list('pk', flat=True))
+
+        aprovadas, recusadas, erros = [], [], []
+        trava = threading.Lock()
+
+        def trabalhar(fatia):
+            try:
+                for pk in fatia:
+                    # Cada id é disputado por duas threads (a fatia se repete)
+                    try:
+                        with transaction.atomic():
+                            solicitacao = SolicitacaoFerias.objects.select_for_update().get(pk=pk)
+                            if solicitacao.status != 'PENDENTE_GESTOR':
+                                continue
+                            efetivar_aprovacao(solicitacao, gestor)
+                        with trava:
+                            aprovadas.append(pk)
+                    except IntegrityError:
+                        with trava:
+                            recusadas.append(pk)
+            except Exception as erro:  # pragma: no cover - só para relatar no teste
+                erros.append(erro)
+            finally:
+                connection.close()
+
+        fatias = [ids[i::self.THREADS // 2] for i in range(self.THREADS // 2)] * 2
+        threads = [threading.Thread(target=trabalhar, args=(fatia,)) for fatia in fatias]
+        inicio = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        duracao = time.perf_counter() - inicio
+
+        self.assertEqual(erros, [])
+        periodo.refresh_from_db()
+        perfil = PerfilUsuario.objects.get(user=user)
+        self.assertEqual(len(aprovadas), 30)
+        self.assertEqual(len(set(aprovadas)), 30)
+        self.assertEqual(periodo.dias_disponiveis, 0)
+        self.assertEqual(perfil.saldo_total, 0)
+        self.assertEqual(SolicitacaoFerias.objects.filter(status='APROVADA_FINAL').count(), 30)
+        tentativas = len(aprovadas) + len(recusadas)
+        print(f'\n[stress aprovação] {self.THREADS} threads, {tentativas} tentativas em {duracao:.2f}s '
+              f'({tentativas / duracao:.0f} aprovações/s tentadas, {len(aprovadas)} aprovadas)')
+
+
+class AcaoEmLoteTests(TestCase):
+    def setUp(self):
+        self.gestor = criar_usuario('gestor')
+        self.equipe = [criar_usuario(f'membro{i}', gestor=self.gestor.perfil) for i in range(3)]
+        self.solicitacoes = []
+        for user in self.equipe:
+            dar_saldo(user, dias=15)
+            periodo = PeriodoAquisitivo.objects.get(perfil__user=user)
+            for _ in range(2):  # dois pedidos de 10 dias: só o primeiro cabe no saldo
+                solicitacao = SolicitacaoFerias.objects.create(
+                    solicitante=user, data_inicio=datetime.date(2030, 1, 1), data_fim=datetime.date(2030, 1, 10),
+                )
+                DescontoFerias.objects.create(solicitacao=solicitacao, periodo_aquisitivo=periodo, dias_descontados=10)
+                self.solicitacoes.append(solicitacao)
+        recalcular_saldos(PerfilUsuario.objects.all())
+        self.client.force_login(self.gestor)
+        self.url = reverse('ferias:acao_em_lote')
+
+    @override_settings(FERIAS_EMAIL_DESPACHO_IMEDIATO=True)
+    def test_aprovar_em_lote_com_resumo_por_item(self):
+        mail.outbox = []
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(
+                self.url, {'acao': 'aprovar', 'solicitacoes': [s.pk for s in self.solicitacoes]},
+                HTTP_ACCEPT='application/json',
+            )
+        resultado = {item['id']: item['resultado'] for item in resposta.json()['resultado']}
+        self.assertEqual(sorted(resultado.values()).count('aprovada'), 3)
+        self.assertEqual(sorted(resultado.values()).count('saldo_insuficiente'), 3)
+
+        for user in self.equipe:
+            perfil = PerfilUsuario.objects.get(user=user)
+            self.assertEqual((perfil.saldo_total, perfil.dias_reservados), (5, 10))
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_rejeitar_em_lote_libera_reserva(self):
+        self.client.post(self.url, {
+            'acao': 'rejeitar', 'motivo_rejeicao': 'Período crítico',
+            'solicitacoes': [s.pk for s in self.solicitacoes],
+        })
+        self.assertEqual(SolicitacaoFerias.objects.filter(status='REJEITADA').count(), 6)
+        self.assertFalse(PerfilUsuario.objects.filter(dias_reservados__gt=0).exists())
+
+    def test_ids_invalidos_dao_400(self):
+        for ids in (['99999999999999999999999'], ['0'], ['-1'], ['abc']):
+            resposta = self.client.post(
+                self.url, {'acao': 'aprovar', 'solicitacoes': ids}, HTTP_ACCEPT='application/json',
+            )
+            self.assertEqual(resposta.status_code, 400, ids)
+        self.assertFalse(SolicitacaoFerias.objects.exclude(status='PENDENTE_GESTOR').exists())
+
+    def test_fora_da_equipe_nega_o_lote_inteiro(self):
+        estranho = criar_usuario('estranho')
+        alheia = SolicitacaoFerias.objects.create(
+            solicitante=estranho, data_inicio=datetime.date(2030, 1, 1), data_fim=datetime.date(2030, 1, 10),
+        )
+        resposta = self.client.post(
+            self.url, {'acao': 'aprovar', 'solicitacoes': [self.solicitacoes[0].pk, alheia.pk]},
+            HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(resposta.status_code, 403)
+        self.assertFalse(SolicitacaoFerias.objects.exclude(status='PENDENTE_GESTOR').exists())
+
+
+class DashboardGestorTests(TestCase):
+    def setUp(self):
+        self.gestor = criar_usuario('gestor')
+        self.client.force_login(self.gestor)
+        self.url = reverse('ferias:dashboard_gestor')
+        self.total = 0
+
+    def contratar(self, quantidade):
+        for _ in range(quantidade):
+            self.total += 1
+            user = criar_usuario(f'membro{self.total}', gestor=self.gestor.perfil)
+            dar_saldo(user)
+            periodo = PeriodoAquisitivo.objects.get(perfil__user=user)
+            solicitacao = SolicitacaoFerias.objects.create(
+                solicitante=user, data_inicio=datetime.date(2030, 1, 1) + datetime.timedelta(days=self.total),
+                data_fim=datetime.date(2030, 1, 20) + datetime.timedelta(days=self.total),
+            )
+            DescontoFerias.objects.create(solicitacao=solicitacao, periodo_aquisitivo=periodo, dias_descontados=20)
+
+    def contar_consultas(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            resposta = self.client.get(self.url, params)
+        self.assertEqual(resposta.status_code, 200)
+        return len(ctx.captured_queries), resposta
+
+    def test_numero_de_consultas_nao_cresce_com_a_equipe(self):
+        self.contratar(2)
+        pequena, _ = self.contar_consultas()
+        self.contratar(28)
+        grande, resposta = self.contar_consultas()
+        self.assertEqual(pequena, grande)
+        self.assertLessEqual(grande, 10)
+        self.assertEqual(len(resposta.context['solicitacoes_pendentes']), 25)
+
+    def test_paginacao_por_cursor(self):
+        self.contratar(30)
+        _, primeira = self.contar_consultas()
+        cursor = primeira.context['proximo_cursor']
+        self.assertIsNotNone(cursor)
+        _, segunda = self.contar_consultas(apos=cursor)
+        self.assertIsNone(segunda.context['proximo_cursor'])
+
+        vistos = [s.pk for s in primeira.context['solicitacoes_pendentes']]
+        vistos += [s.pk for s in segunda.context['solicitacoes_pendentes']]
+        esperado = list(SolicitacaoFerias.objects.order_by('data_inicio', 'pk').values_list('pk', flat=True))
+        self.assertEqual(vistos, esperado)
+
+
+class HierarquiaTests(TestCase):
+    def definir_gestor(self, user, gestor):
+        perfil = PerfilUsuario.objects.get(user=user)
+        perfil.gestor = PerfilUsuario.objects.get(user=gestor) if gestor else None
+        perfil.save()
+
+    def pares(self):
+        return set(HierarquiaPerfil.objects.values_list(
+            'ancestral__user__username', 'descendente__user__username', 'profundidade'
+        ))
+
+    def setUp(self):
+        # secretario > diretor > coordenador > servidor
+        self.secretario = criar_usuario('secretario')
+        self.diretor = criar_usuario('diretor')
+        self.coordenador = criar_usuario('coordenador')
+        self.servidor = criar_usuario('servidor')
+        self.definir_gestor(self.diretor, self.secretario)
+        self.definir_gestor(self.coordenador, self.diretor)
+        self.definir_gestor(self.servidor, self.coordenador)
+
+    def test_mantida_ao_mudar_gestor_e_igual_a_reconstrucao(self):
+        self.assertIn(('secretario', 'servidor', 3), self.pares())
+
+        # Coordenador (com o servidor junto) passa a responder direto ao secretário
+        self.definir_gestor(self.coordenador, self.secretario)
+        pares = self.pares()
+        self.assertIn(('secretario', 'servidor', 2), pares)
+        self.assertNotIn(('diretor', 'servidor', 2), pares)
+
+        call_command('reconstruir_hierarquia', stdout=io.StringIO())
+        self.assertEqual(self.pares(), pares)
+
+    def test_ciclo_rejeitado_na_validacao(self):
+        perfil = PerfilUsuario.objects.get(user=self.secretario)
+        perfil.gestor = PerfilUsuario.objects.get(user=self.servidor)
+        with self.assertRaises(ValidationError):
+            perfil.full_clean()
+
+    def test_ciclo_barrado_no_save_sem_mexer_na_tabela(self):
+        pares = self.pares()
+        with self.assertRaises(ValidationError):
+            self.definir_gestor(self.secretario, self.servidor)
+        self.assertIsNone(PerfilUsuario.objects.get(user=self.secretario).gestor_id)
+        self.assertEqual(self.pares(), pares)
+
+    def test_excluir_gestor_desliga_a_equipe(self):
+        # O coordenador (com o servidor) vira raiz: nada mais o liga ao secretário
+        self.diretor.delete()
+        self.assertIsNone(PerfilUsuario.objects.get(user=self.coordenador).gestor_id)
+        pares = self.pares()
+        self.assertEqual(pares, {
+            ('secretario', 'secretario', 0), ('coordenador', 'coordenador', 0),
+            ('coordenador', 'servidor', 1), ('servidor', 'servidor', 0),
+        })
+
+        call_command('reconstruir_hierarquia', stdout=io.StringIO())
+        self.assertEqual(self.pares(), pares)
+
+    def test_painel_e_api_da_subarvore(self):
+        SolicitacaoFerias.objects.create(
+            solicitante=self.servidor, data_inicio=datetime.date(2030, 1, 1), data_fim=datetime.date(2030, 1, 10),
+        )
+        SolicitacaoFerias.objects.create(
+            solicitante=self.diretor, status='APROVADA_FINAL',
+            data_inicio=datetime.date(2030, 1, 5), data_fim=datetime.date(2030, 1, 20),
+        )
+        self.client.force_login(self.secretario)
+
+        direta = self.client.get(reverse('ferias:dashboard_gestor'))
+        self.assertEqual(len(direta.context['solicitacoes_pendentes']), 0)
+        toda = self.client.get(reverse('ferias:dashboard_gestor'), {'escopo': 'subarvore'})
+        self.assertEqual(len(toda.context['solicitacoes_pendentes']), 1)
+
+        dados = self.client.get(reverse('ferias:api_equipe'), {'start': '2030-01-01', 'end': '2030-02-01'}).json()
+        self.assertEqual([p['nome'] for p in dados['pendentes']], ['Servidor'])
+        self.assertEqual([(a['nome'], a['direto']) for a in dados['ausencias']], [('Diretor', True)])
+
+    def test_api_da_equipe_rejeita_janela_invalida(self):
+        self.client.force_login(self.secretario)
+        url = reverse('ferias:api_equipe')
+        self.assertEqual(self.client.get(url, {'start': '9999-12-31'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '2030-01-01', 'end': '2032-01-01'}).status_code, 400)
+
+
+class BackendQueFalha(LocmemEmailBackend):
+    """Backend de teste: o servidor "aceita" a conexão mas recusa as mensagens."""
+    def send_messages(self, messages):
+        raise ConnectionError('SMTP fora do ar')
+
+
+class CaixaSaidaEmailTests(TestCase):
+    def setUp(self):
+        self.gestor = criar_usuario('gestor')
+        self.funcionario = criar_usuario('funcionario', gestor=self.gestor.perfil)
+        mail.outbox = []
+
+    def criar_solicitacao(self):
+        return SolicitacaoFerias.objects.create(
+            solicitante=self.funcionario, data_inicio=datetime.date(2030, 1, 1), data_fim=datetime.date(2030, 1, 10),
+        )
+
+    def test_por_padrao_a_requisicao_nao_envia(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.criar_solicitacao()
+        self.assertEqual(EmailSaida.objects.get().status, 'PENDENTE')
+        self.assertEqual(len(mail.outbox), 0)
+
+    @override_settings(FERIAS_EMAIL_DESPACHO_IMEDIATO=True)
+    def test_solicitacao_grava_na_caixa_e_envia_apos_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.criar_solicitacao()
+            # Dentro da transação: só a linha da caixa de saída, nada de SMTP
+            email = EmailSaida.objects.get()
+            self.assertEqual(email.destinatarios, [self.gestor.email])
+            self.assertEqual(len(mail.outbox), 0)
+
+        for callback in callbacks:
+            callback()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.tentativas), ('ENVIADO', 1))
+        self.assertEqual(mail.outbox[0].to, [self.gestor.email])
+
+    @override_settings(FERIAS_EMAIL_DESPACHO_IMEDIATO=False)
+    def test_process_outbox_envia_em_lotes(self):
+        for _ in range(5):
+            self.criar_solicitacao()
+        self.assertEqual(EmailSaida.objects.filter(status='PENDENTE').count(), 5)
+
+        saida = io.StringIO()
+        call_command('process_outbox', lote=2, stdout=saida)
+        self.assertIn('5 e-mails enviados', saida.getvalue())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertFalse(EmailSaida.objects.exclude(status='ENVIADO').exists())
+
+    @override_settings(FERIAS_EMAIL_DESPACHO_IMEDIATO=False, EMAIL_BACKEND='ferias.tests.BackendQueFalha')
+    def test_falha_de_smtp_reagenda_com_backoff_e_desiste(self):
+        solicitacao = self.criar_solicitacao()
+        self.assertTrue(SolicitacaoFerias.objects.filter(pk=solicitacao.pk).exists())
+
+        with self.assertLogs('ferias.notificacoes', 'WARNING'):
+            call_command('process_outbox', max_tentativas=2, stdout=io.StringIO())
+        email = EmailSaida.objects.get()
+        self.assertEqual((email.status, email.tentativas), ('PENDENTE', 1))
+        self.assertIn('SMTP fora do ar', email.ultimo_erro)
+        self.assertGreater(email.proxima_tentativa, timezone.now())
+
+        # Ainda não venceu: o worker não pega de novo
+        call_command('process_outbox', max_tentativas=2, stdout=io.StringIO())
+        self.assertEqual(EmailSaida.objects.get().tentativas, 1)
+
+        EmailSaida.objects.update(proxima_tentativa=timezone.now())
+        with self.assertLogs('ferias.notificacoes', 'WARNING'):
+            call_command('process_outbox', max_tentativas=2, stdout=io.StringIO())
+        self.assertEqual(EmailSaida.objects.get().status, 'FALHOU')
+
+
+class ResumoDiarioGestorTests(TestCase):
+    def setUp(self):
+        self.gestores = [criar_usuario(f'gestor{i}', resumo_diario=True) for i in range(2)]
+        self.avulso = criar_usuario('avulso')
+        for i, gestor in enumerate(self.gestores + [self.avulso]):
+            for j in range(3):
+                user = criar_usuario(f'membro{i}_{j}', gestor=gestor.perfil)
+                SolicitacaoFerias.objects.create(
+                    solicitante=user, data_inicio=datetime.date(2030, 1, 1), data_fim=datetime.date(2030, 1, 10),
+                )
+
+    def test_gestor_em_modo_resumo_nao_recebe_email_por_solicitacao(self):
+        destinatarios = [email.destinatarios for email in EmailSaida.objects.all()]
+        self.assertEqual(destinatarios, [[self.avulso.email]] * 3)
+
+    def test_resumo_agrupa_por_gestor_numa_consulta(self):
+        with self.assertNumQueries(1):
+            mensagens = mensagens_resumo_gestores(timezone.now() - datetime.timedelta(days=1))
+        self.assertEqual(sorted(m[3][0] for m in mensagens), sorted(g.email for g in self.gestores))
+        assunto, corpo, _, _ = mensagens[0]
+        self.assertIn('3 solicitações', assunto)
+        self.assertEqual(corpo.count('01/01/2030 a 10/01/2030'), 3)
+
+    @override_settings(FERIAS_EMAIL_DESPACHO_IMEDIATO=False)
+    def test_comando_envia_um_email_por_gestor(self):
+        mail.outbox = []
+        call_command('enviar_resumo_gestores', stdout=io.StringIO())
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(g.email for g in self.gestores))
+
+
+@mock.patch('ferias.db_router.replica_configurada', return_value=True)
+@mock.patch('ferias.db_router.replica_disponivel', return_value=True)
+class ReplicaLeituraTests(SimpleTestCase):
+    def setUp(self):
+        self.fabrica = RequestFactory()
+        self.roteador = RoteadorReplica()
+        self.middleware = ReplicaLeituraMiddleware(None)
+        self.leituras = []
+
+        @leitura_na_replica
+        def view_leitura(request):
+            self.leituras.append(self.roteador.db_for_read(PerfilUsuario))
+            if 'escrever' in request.GET:
+                self.roteador.db_for_write(PerfilUsuario)
+                self.leituras.append(self.roteador.db_for_read(PerfilUsuario))
+            return HttpResponse()
+        self.view_leitura = view_leitura
+
+    def requisicao(self, request, view):
+        request.resolver_match = resolve(request.path)
+        # O que o handler do Django faz: process_view e, se não responder, a view
+        self.middleware.get_response = lambda request: (
+            self.middleware.process_view(request, view, (), {}) or view(request)
+        )
+        return self.middleware(request)
+
+    def test_view_somente_leitura_le_da_replica(self, *mocks):
+        resposta = self.requisicao(self.fabrica.get('/'), self.view_leitura)
+        self.assertEqual(self.leituras, ['replica'])
+        self.assertNotIn(COOKIE_PRIMARIO, resposta.cookies)
+        # Fora da view, tudo volta para o principal
+        self.assertIsNone(self.roteador.db_for_read(PerfilUsuario))
+
+    def test_escrita_na_view_volta_para_o_principal_e_pina(self, *mocks):
+        resposta = self.requisicao(self.fabrica.get('/?escrever=1'), self.view_leitura)
+        self.assertEqual(self.leituras, ['replica', None])
+        self.assertIn(COOKIE_PRIMARIO, resposta.cookies)
+
+    def test_usuario_pinado_le_do_principal(self, *mocks):
+        request = self.fabrica.get('/')
+        request.COOKIES[COOKIE_PRIMARIO] = '1'
+        self.requisicao(request, self.view_leitura)
+        self.assertEqual(self.leituras, [None])
+
+    def test_post_pina_no_principal(self, *mocks):
+        resposta = self.requisicao(self.fabrica.post('/'), self.view_leitura)
+        self.assertEqual(self.leituras, [None])
+        self.assertIn(COOKIE_PRIMARIO, resposta.cookies)
+
+    def test_changelist_do_admin_le_da_replica(self, *mocks):
+        def changelist(request):
+            self.leituras.append(self.roteador.db_for_read(PerfilUsuario))
+            return HttpResponse()
+        self.requisicao(self.fabrica.get(reverse('admin:ferias_perfilusuario_changelist')), changelist)
+        self.assertEqual(self.leituras, ['replica'])
+
+    def test_migrate_nunca_roda_na_replica(self, *mocks):
+        self.assertIs(self.roteador.allow_migrate('replica', 'ferias'), False)
+        self.assertIsNone(self.roteador.allow_migrate('default', 'ferias'))
+
+    def test_replica_fora_do_ar_usa_o_principal(self, disponivel, configurada):
+        disponivel.return_value = False
+        self.requisicao(self.fabrica.get('/'), self.view_leitura)
+        self.assertEqual(self.leituras, [None])
+
+
+class ReplicaLeituraSqliteTests(TransactionTestCase):
+    """Principal e réplica em dois arquivos SQLite, passando pelo handler do Django."""
+
+    def setUp(self):
+        admin = User.objects.create_superuser('admin', 'admin@exemplo.gov.br', 'x')
+        self.criar_solicitacao(admin, datetime.date(2030, 1, 1))
+
+        # A réplica é uma cópia do principal neste ponto ("atrasada" a partir daqui)
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        caminho = os.path.join(pasta, 'replica.sqlite3')
+        connection.ensure_connection()
+        destino = sqlite3.connect(caminho)
+        connection.connection.backup(destino)
+        destino.close()
+
+        connections.settings[db_router.ALIAS_REPLICA] = {**connections.settings['default'], 'NAME': caminho}
+        self.addCleanup(connections.settings.pop, db_router.ALIAS_REPLICA)
+        self.addCleanup(connections.__delitem__, db_router.ALIAS_REPLICA)
+        self.addCleanup(lambda: connections[db_router.ALIAS_REPLICA].close())
+        for patcher in (
+            # A réplica não está em settings.DATABASES: libera o alias só aqui
+            mock.patch.object(type(self), 'databases', {'default', db_router.ALIAS_REPLICA}),
+            mock.patch('ferias.db_router.replica_configurada', return_value=True),
+            mock.patch.dict(db_router._saude, {'disponivel': False, 'verificado_em': None}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.criar_solicitacao(admin, datetime.date(2030, 2, 1))
+        self.client.force_login(admin)
+
+    def criar_solicitacao(self, user, inicio):
+        SolicitacaoFerias.objects.create(
+            solicitante=user, data_inicio=inicio, data_fim=inicio + datetime.timedelta(days=9),
+        )
+
+    def test_changelist_renderiza_lendo_da_replica(self):
+        url = reverse('admin:ferias_solicitacaoferias_changelist')
+        resposta = self.client.get(url)
+        # TemplateResponse: a contagem sai na renderização, feita pelo handler
+        self.assertEqual(resposta.context['cl'].result_count, 1)
+        self.assertNotIn(COOKIE_PRIMARIO, resposta.cookies)
+
+        # Depois de uma escrita, o cookie pina o usuário no principal
+        self.client.cookies[COOKIE_PRIMARIO] = '1'
+        self.assertEqual(self.client.get(url).context['cl'].result_count, 2)
+
+    def test_sessao_gravada_depois_da_view_vai_para_o_principal(self):
+        self.client.get(reverse('admin:ferias_solicitacaoferias_changelist'))
+        with connections[db_router.ALIAS_REPLICA].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM django_session')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertIsNone(db_router._estado.get())
+
+
+def gravacoes_de_sessao(contexto):
+    return sum(
+        1 for q in contexto.captured_queries
+        if 'django_session' in q['sql'] and q['sql'].lstrip().upper().startswith(('UPDATE', 'INSERT'))
+    )
+
+
+class SessaoDeslizanteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = criar_usuario('leitor')
+        self.client.force_login(self.user)
+        self.url = reverse('ferias:api_eventos') + '?start=2030-01-01&end=2030-02-01'
+
+    def test_requisicoes_de_leitura_nao_regravam_a_sessao(self):
+        with CaptureQueriesContext(connection) as contexto:
+            for _ in range(20):
+                resposta = self.client.get(self.url)
+        self.assertEqual(gravacoes_de_sessao(contexto), 0)
+        # A expiração continua deslizante no cookie
+        self.assertEqual(resposta.cookies[settings.SESSION_COOKIE_NAME]['max-age'], settings.SESSION_COOKIE_AGE)
+
+    def test_sessao_modificada_e_gravada(self):
+        with CaptureQueriesContext(connection) as contexto:
+            self.client.get(reverse('ferias:definir_tema', args=['escuro']))
+        self.assertEqual(gravacoes_de_sessao(contexto), 1)
+        self.assertEqual(self.client.session['tema_preferido'], 'escuro')
+
+    @override_settings(FERIAS_SESSAO_LIMIAR_SEGUNDOS=0)
+    def test_limiar_vencido_regrava_a_expiracao(self):
+        with CaptureQueriesContext(connection) as contexto:
+            self.client.get(self.url)
+        self.assertEqual(gravacoes_de_sessao(contexto), 1)
+
+
+@unittest.skipUnless(BENCHMARK, 'benchmark: defina FERIAS_BENCHMARK=1')
+class SessaoDeslizanteBenchmark(TestCase):
+    REQUISICOES = 1000
+
+    def test_gravacoes_por_mil_requisicoes(self):
+        user = criar_usuario('leitor')
+        url = reverse('ferias:api_eventos') + '?start=2030-01-01&end=2030-02-01'
+        for engine in ('django.contrib.sessions.backends.db', 'ferias.sessoes'):
+            with override_settings(SESSION_ENGINE=engine):
+                cliente = self.client_class()
+                cliente.force_login(user)
+                inicio = time.perf_counter()
+                with CaptureQueriesContext(connection) as contexto:
+                    for _ in range(self.REQUISICOES):
+                        cliente.get(url)
+                duracao = time.perf_counter() - inicio
+            print(f'\n[benchmark sessão] {engine}: {gravacoes_de_sessao(contexto)} gravações em '
+                  f'{self.REQUISICOES} requisições ({self.REQUISICOES / duracao:.0f} req/s)')
+
+
+class FragmentosCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = criar_usuario('funcionario')
+        dar_saldo(self.user, dias=30)
+        self.client.force_login(self.user)
+
+    def consultas_de_historico(self, url):
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return sum(1 for q in contexto.captured_queries if 'ferias_solicitacaoferias' in q['sql']), resposta
+
+    def test_segunda_visita_ao_dashboard_sai_do_cache(self):
+        url = reverse('ferias:dashboard')
+        self.assertGreater(self.consultas_de_historico(url)[0], 0)
+        self.assertEqual(self.consultas_de_historico(url)[0], 0)
+
+        estatisticas = estatisticas_fragmentos()
+        self.assertEqual(estatisticas['dashboard_historico'], {'acertos': 1, 'falhas': 1, 'taxa_acerto': 0.5})
+
+    def test_nova_solicitacao_invalida_o_historico(self):
+        url = reverse('ferias:dashboard')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            SolicitacaoFerias.objects.create(
+                solicitante=self.user, data_inicio=datetime.date(2030, 3, 2), data_fim=datetime.date(2030, 3, 11),
+            )
+        consultas, resposta = self.consultas_de_historico(url)
+        self.assertGreater(consultas, 0)
+        self.assertContains(resposta, '02/03/2030 a 11/03/2030')
+
+    def test_novo_periodo_invalida_a_lista_do_perfil(self):
+        url = reverse('ferias:ver_perfil')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            PeriodoAquisitivo.objects.create(
+                perfil=self.user.perfil, data_inicio_aquisitivo=datetime.date(2001, 1, 1),
+                data_fim_aquisitivo=datetime.date(2001, 12, 31), dias_disponiveis=7,
+            )
+        self.assertContains(self.client.get(url), 'Saldo: 7 dias')
+
+    def test_estatisticas_so_para_a_equipe_tecnica(self):
+        url = reverse('ferias:api_estatisticas_cache')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertIn('dashboard_historico', self.client.get(url).json()['fragmentos'])
+
+
+def foto_jpeg(largura=1600, altura=1200, cor=(200, 30, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (largura, altura), cor).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class MiniaturasFotoTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.user = criar_usuario('funcionario')
+        self.client.force_login(self.user)
+
+    def enviar_foto(self, conteudo):
+        return self.client.post(reverse('ferias:editar_perfil'), {
+            'first_name': 'Funcionario', 'last_name': 'Teste', 'email': self.user.email,
+            'foto_perfil': SimpleUploadedFile('celular.jpg', conteudo, content_type='image/jpeg'),
+        })
+
+    def test_upload_gera_miniaturas_com_nome_pelo_hash(self):
+        self.assertEqual(self.enviar_foto(foto_jpeg()).status_code, 302)
+        perfil = PerfilUsuario.objects.get(user=self.user)
+        for campo, lado in (('foto_miniatura', 80), ('foto_cartao', 400)):
+            arquivo = getattr(perfil, campo)
+            self.assertRegex(arquivo.name, rf'^fotos_perfil/miniaturas/[0-9a-f]{{16}}_{lado}\.(webp|jpg)$')
+            with Image.open(arquivo.path) as miniatura:
+                self.assertEqual(miniatura.size, (lado, lado))
+        self.assertContains(self.client.get(reverse('ferias:dashboard')), perfil.foto_miniatura.url)
+
+        # Mesmo conteúdo, mesmo nome (a URL só muda quando a foto muda)
+        self.enviar_foto(foto_jpeg())
+        self.assertEqual(PerfilUsuario.objects.get(user=self.user).foto_miniatura.name, perfil.foto_miniatura.name)
+        self.enviar_foto(foto_jpeg(cor=(0, 0, 255)))
+        self.assertNotEqual(PerfilUsuario.objects.get(user=self.user).foto_miniatura.name, perfil.foto_miniatura.name)
+
+    def test_troca_e_remocao_pelo_admin_acompanham_as_miniaturas(self):
+        self.enviar_foto(foto_jpeg())
+        antiga = PerfilUsuario.objects.get(user=self.user).foto_cartao.name
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@exemplo.gov.br', 'x'))
+        url = reverse('admin:ferias_perfilusuario_change', args=[self.user.perfil.pk])
+        campos = {'user': self.user.pk, 'secretaria': 'SEMAD', 'data_contratacao': '2015-01-01'}
+
+        self.client.post(url, {**campos, 'foto_perfil': SimpleUploadedFile(
+            'nova.jpg', foto_jpeg(cor=(0, 0, 255)), content_type='image/jpeg',
+        )})
+        perfil = PerfilUsuario.objects.get(user=self.user)
+        self.assertNotEqual(perfil.foto_cartao.name, antiga)
+        self.assertTrue(default_storage.exists(perfil.foto_cartao.name))
+
+        self.client.post(url, {**campos, 'foto_perfil-clear': 'on'})
+        perfil = PerfilUsuario.objects.get(user=self.user)
+        self.assertEqual((perfil.foto_perfil.name, perfil.foto_miniatura.name, perfil.foto_cartao.name), ('', '', ''))
+
+    def test_backfill_processa_fotos_existentes(self):
+        perfis = [criar_usuario(f'antigo{i}').perfil for i in range(3)]
+        for i, perfil in enumerate(perfis):
+            perfil.foto_perfil.save(f'antiga{i}.jpg', ContentFile(foto_jpeg(cor=(i, i, i))))
+        quebrado = criar_usuario('quebrado').perfil
+        quebrado.foto_perfil.save('quebrada.jpg', ContentFile(b'nao e uma imagem'))
+
+        saida = io.StringIO()
+        call_command('gerar_miniaturas_fotos', workers=2, stdout=saida)
+        self.assertIn('Miniaturas geradas para 3 fotos', saida.getvalue())
+        self.assertIn('quebrada.jpg', saida.getvalue())
+        for perfil in perfis:
+            perfil.refresh_from_db()
+            self.assertTrue(default_storage.exists(perfil.foto_cartao.name))
+
+
+class ServirMidiaTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        os.makedirs(os.path.join(self.media, 'fotos_perfil', 'miniaturas'))
+        with open(os.path.join(self.media, 'fotos_perfil', 'original.jpg'), 'wb') as arquivo:
+            arquivo.write(b'0123456789')
+        with open(os.path.join(self.media, 'fotos_perfil', 'miniaturas', 'abc_80.webp'), 'wb') as arquivo:
+            arquivo.write(b'miniatura')
+        self.url = '/media/fotos_perfil/original.jpg'
+        self.user = criar_usuario('funcionario')
+
+    def test_original_exige_login_e_miniatura_e_publica(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        resposta = self.client.get('/media/fotos_perfil/miniaturas/abc_80.webp')
+        self.assertEqual(b''.join(resposta.streaming_content), b'miniatura')
+        self.assertEqual(resposta['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(resposta['Content-Type'], 'image/webp')
+
+    def test_ponto_ponto_nao_torna_o_original_publico(self):
+        resposta = self.client.get('/media/fotos_perfil/miniaturas/../original.jpg')
+        self.assertEqual(resposta.status_code, 302)
+        self.assertFalse(resposta.has_header('Cache-Control') and 'public' in resposta['Cache-Control'])
+
+        self.client.force_login(self.user)
+        resposta = self.client.get('/media/fotos_perfil/miniaturas/../original.jpg')
+        self.assertEqual(resposta['Cache-Control'], 'private, no-cache')
+
+    @override_settings(FERIAS_MIDIA_X_ACCEL='/_midia_protegida/')
+    def test_x_accel_usa_o_caminho_resolvido(self):
+        self.client.force_login(self.user)
+        resposta = self.client.get('/media/fotos_perfil/miniaturas/../original.jpg')
+        self.assertEqual(resposta['X-Accel-Redirect'], '/_midia_protegida/fotos_perfil/original.jpg')
+
+    def test_revalidacao_responde_304(self):
+        self.client.force_login(self.user)
+        resposta = self.client.get(self.url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=resposta['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=resposta['Last-Modified']).status_code, 304)
+
+    def test_intervalos_de_bytes(self):
+        self.client.force_login(self.user)
+        resposta = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(resposta.status_code, 206)
+        self.assertEqual(b''.join(resposta.streaming_content), b'2345')
+        self.assertEqual(resposta['Content-Range'], 'bytes 2-5/10')
+
+        resposta = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(resposta.streaming_content), b'789')
+
+        resposta = self.client.get(self.url, HTTP_RANGE='bytes=50-')
+        self.assertEqual(resposta.status_code, 416)
+        self.assertEqual(resposta['Content-Range'], 'bytes */10')
+
+        # If-Range com ETag antigo: o arquivo mudou, vai inteiro
+        resposta = self.client.get(self.url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"antigo"')
+        self.assertEqual(resposta.status_code, 200)
+
+    def test_caminho_fora_do_media_root(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/media/../config/settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/fotos_perfil/nao_existe.jpg').status_code, 404)
+
+    def test_verificacao_de_acesso_uma_vez_por_arquivo(self):
+        self.client.force_login(self.user)
+        self.client.get(self.url)
+        antes = resolver_midia.cache_info()
+        self.client.get(self.url)
+        depois = resolver_midia.cache_info()
+        self.assertEqual((depois.hits - antes.hits, depois.misses - antes.misses), (1, 0))
+
+    @override_settings(FERIAS_MIDIA_X_ACCEL='/_midia_protegida/')
+    def test_x_accel_redirect(self):
+        self.client.force_login(self.user)
+        resposta = self.client.get(self.url)
+        self.assertEqual(resposta['X-Accel-Redirect'], '/_midia_protegida/fotos_perfil/original.jpg')
+        self.assertEqual(resposta.content, b'')
+
+
+class EstaticosPrecomprimidosTests(TestCase):
+    def setUp(self):
+        self.raiz = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.raiz, ignore_errors=True)
+        configuracao = override_settings(STATIC_ROOT=self.raiz)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        call_command('compilar_estaticos', stdout=io.StringIO())
+        self.nome = staticfiles_storage.stored_name('ferias/css/style.css')
+        self.url = '/static/' + self.nome
+        with open(finders.find('ferias/css/style.css'), 'rb') as arquivo:
+            self.original = arquivo.read()
+
+    def test_build_gera_nome_com_hash_e_gzip(self):
+        self.assertRegex(self.nome, r'^ferias/css/style\.[0-9a-f]{12}\.css$')
+        self.assertTrue(os.path.isfile(os.path.join(self.raiz, self.nome + '.gz')))
+        # O {% static %} dos templates já aponta para o nome com hash
+        self.assertContains(self.client.get(reverse('login')), self.url)
+
+    def test_serve_a_variante_pelo_accept_encoding(self):
+        resposta = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(resposta['Content-Encoding'], 'gzip')
+        self.assertEqual(resposta['Content-Type'], 'text/css')
+        self.assertEqual(resposta['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertIn('Accept-Encoding', resposta['Vary'])
+        self.assertEqual(gzip.decompress(b''.join(resposta.streaming_content)), self.original)
+
+        resposta = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(resposta.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(resposta.streaming_content), self.original)
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=resposta['ETag']).status_code, 304)
+
+    def test_nome_sem_hash_sempre_revalida(self):
+        resposta = self.client.get('/static/ferias/css/style.css')
+        self.assertEqual(resposta['Cache-Control'], 'public, max-age=0, must-revalidate')
+
+
+class SeedFeriasTests(TestCase):
+    def test_gera_dados_coerentes(self):
+        saida = io.StringIO()
+        call_command('seed_ferias', usuarios=60, secretarias=3, equipe=4, stdout=saida)
+        self.assertIn('60 usuários em 3 secretarias', saida.getvalue())
+
+        perfis = PerfilUsuario.objects.filter(user__username__startswith='seed')
+        self.assertEqual(perfis.filter(gestor__isnull=True).count(), 3)
+        self.assertFalse(perfis.exclude(gestor__isnull=True).exclude(gestor__secretaria=F('secretaria')).exists())
+        self.assertEqual(HierarquiaPerfil.objects.filter(profundidade=0).count(), 60)
+        self.assertTrue(SolicitacaoFerias.objects.filter(status='PENDENTE_GESTOR').exists())
+        self.assertFalse(PeriodoAquisitivo.objects.filter(dias_disponiveis__lt=0).exists())
+
+        # O saldo mantido bate com os períodos e descontos gerados
+        conferencia = io.StringIO()
+        call_command('verificar_saldos', stdout=conferencia)
+        self.assertIn('Todos os saldos conferem', conferencia.getvalue())
+
+    def test_benchmark_mede_todas_as_views(self):
+        call_command('seed_ferias', usuarios=40, secretarias=2, stdout=io.StringIO())
+        pendentes = SolicitacaoFerias.objects.filter(status='PENDENTE_GESTOR').count()
+        resultados = medir_views(repeticoes=2)
+        self.assertEqual(urls_sem_cenario(), [])
+        self.assertEqual(set(resultados), set(CENARIOS))
+        for nome, medida in resultados.items():
+            self.assertLess(medida['status'], 500, nome)
+            self.assertLessEqual(medida['p50_ms'], medida['p95_ms'])
+        # As views que gravam rodam em transação desfeita
+        self.assertEqual(SolicitacaoFerias.objects.filter(status='PENDENTE_GESTOR').count(), pendentes)
+
+
+class InstrumentacaoSQLTests(TestCase):
+    def setUp(self):
+        self.user = criar_usuario('funcionario')
+        self.client.force_login(self.user)
+
+    def test_server_timing_com_consultas_da_requisicao(self):
+        resposta = self.client.get(reverse('ferias:dashboard'))
+        self.assertRegex(resposta['Server-Timing'], r'^sql;dur=[\d.]+;desc="\d+ consultas", dup;desc="\d+ repetidas", total;dur=[\d.]+$')
+
+    def test_consultas_repetidas_vao_para_o_log_e_para_as_metricas(self):
+        def view_n_mais_um(request):
+            for user in User.objects.all()[:1]:
+                for _ in range(6):
+                    PerfilUsuario.objects.filter(user=user).first()
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.resolver_match = resolve('/')
+        request.resolver_match.view_name = 'teste:n_mais_um'
+        with self.assertLogs('ferias.middleware', 'WARNING') as logs:
+            resposta = InstrumentacaoSQLMiddleware(view_n_mais_um)(request)
+        self.assertIn('Possível N+1 em teste:n_mais_um: 6 x SELECT', logs.output[0])
+        self.assertIn('dup;desc="5 repetidas"', resposta['Server-Timing'])
+
+        self.client.get(reverse('ferias:dashboard'))
+        self.user.is_staff = True
+        self.user.save()
+        metricas = self.client.get(reverse('metricas'))
+        self.assertEqual(metricas['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        texto = metricas.content.decode()
+        self.assertIn('ferias_sql_duplicadas_total{view="teste:n_mais_um"} 5', texto)
+        self.assertIn('ferias_sql_consultas_bucket{view="teste:n_mais_um",le="+Inf"} 1', texto)
+        self.assertIn('ferias_requisicao_segundos_count{view="ferias:dashboard"}', texto)
+
+    def test_metricas_so_para_a_equipe_tecnica(self):
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 302)
+
+
+class OcupacaoDiariaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = criar_usuario('ana')
+        ferias = [
+            ('bruno', 'SEMAD', 'Protocolo', (2030, 6, 25), (2030, 7, 5)),
+            ('carla', 'SEMAD', 'Protocolo', (2030, 7, 3), (2030, 7, 10)),
+            ('davi', 'SEMAD', 'Compras', (2030, 7, 5), (2030, 7, 5)),
+            ('elisa', 'SEMED', 'Protocolo', (2030, 7, 1), (2030, 7, 31)),
+        ]
+        for username, secretaria, lotacao, inicio, fim in ferias:
+            colega = criar_usuario(username, secretaria=secretaria, lotacao=lotacao)
+            SolicitacaoFerias.objects.create(
+                solicitante=colega, status='APROVADA_FINAL',
+                data_inicio=datetime.date(*inicio), data_fim=datetime.date(*fim),
+            )
+        SolicitacaoFerias.objects.create(
+            solicitante=cls.user, status='PENDENTE_GESTOR',
+            data_inicio=datetime.date(2030, 7, 1), data_fim=datetime.date(2030, 7, 20),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse('ferias:api_ocupacao')
+        self.janela = {'start': '2030-07-01', 'end': '2030-07-11'}
+
+    def test_soma_acumulada_recorta_na_janela(self):
+        intervalos = [
+            (datetime.date(2030, 6, 25), datetime.date(2030, 7, 5)),
+            (datetime.date(2030, 7, 3), datetime.date(2030, 7, 20)),
+        ]
+        self.assertEqual(
+            ocupacao.ocupacao_diaria(intervalos, datetime.date(2030, 7, 1), datetime.date(2030, 7, 8)),
+            [1, 1, 2, 2, 2, 1, 1],
+        )
+
+    def test_ocupacao_por_secretaria_e_lotacao(self):
+        resposta = self.client.get(self.url, {**self.janela, 'secretaria': 'SEMAD'})
+        dados = resposta.json()
+        self.assertEqual([dia['ausentes'] for dia in dados['dias']], [1, 1, 2, 2, 3, 1, 1, 1, 1, 1])
+        self.assertEqual(dados['dias'][4], {'data': '2030-07-05', 'ausentes': 3})
+        self.assertEqual((dados['pessoas'], dados['maximo']), (4, 3))
+
+        resposta = self.client.get(self.url, {**self.janela, 'lotacao': 'Protocolo'})
+        self.assertEqual([dia['ausentes'] for dia in resposta.json()['dias']][:5], [2, 2, 3, 3, 3])
+
+    def test_uma_consulta_de_solicitacoes_e_etag(self):
+        with CaptureQueriesContext(connection) as ctx:
+            primeira = self.client.get(self.url, self.janela)
+        self.assertEqual(len([q for q in ctx.captured_queries if 'ferias_solicitacaoferias' in q['sql']]), 1)
+        segunda = self.client.get(self.url, self.janela, HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(segunda.status_code, 304)
+
+    def test_sem_numpy_da_o_mesmo_resultado(self):
+        intervalos = list(ocupacao.intervalos_aprovados(datetime.date(2030, 6, 1), datetime.date(2030, 8, 1)))
+        esperado = ocupacao.ocupacao_diaria(intervalos, datetime.date(2030, 6, 1), datetime.date(2030, 8, 1))
+        with mock.patch.object(ocupacao, 'numpy', None):
+            self.assertEqual(
+                ocupacao.ocupacao_diaria(intervalos, datetime.date(2030, 6, 1), datetime.date(2030, 8, 1)), esperado
+            )
+        self.assertEqual(sum(esperado), 11 + 8 + 1 + 31)
+
+    def test_janela_invalida(self):
+        self.assertEqual(self.client.get(self.url, {'start': '2030-01-01', 'end': '2032-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start': '2030-02-01', 'end': '2030-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start': '9999-12-31'}).status_code, 400)
+
+    def test_calendario_em_modo_mapa(self):
+        resposta = self.client.get(reverse('ferias:calendario'), {'modo': 'mapa', 'secretaria': 'SEMAD'})
+        self.assertContains(resposta, 'data-modo="mapa"')
+        self.assertContains(resposta, f'data-url-ocupacao="{self.url}"')
+
+
+class CapacidadeSecretariaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = criar_usuario('ana', lotacao='Protocolo')
+        dar_saldo(cls.user)
+        ferias = [
+            ('bruno', 'Protocolo', (2030, 7, 1), (2030, 7, 15)),
+            ('carla', 'Protocolo', (2030, 7, 10), (2030, 7, 20)),
+            ('davi', 'Compras', (2030, 7, 12), (2030, 7, 30)),
+        ]
+        for username, lotacao, inicio, fim in ferias:
+            SolicitacaoFerias.objects.create(
+                solicitante=criar_usuario(username, lotacao=lotacao), status='APROVADA_FINAL',
+                data_inicio=datetime.date(*inicio), data_fim=datetime.date(*fim),
+            )
+        for i in range(6):
+            criar_usuario(f'colega{i}', lotacao='Compras')
+
+    def validar(self, inicio, fim):
+        return SolicitacaoFeriasForm({'data_inicio': inicio, 'data_fim': fim}, user=self.user)
+
+    def test_pico_numa_passada_ordenada(self):
+        intervalos = [
+            (datetime.date(2030, 7, 1), datetime.date(2030, 7, 15)),
+            (datetime.date(2030, 7, 10), datetime.date(2030, 7, 20)),
+            (datetime.date(2030, 7, 12), datetime.date(2030, 7, 30)),
+            (datetime.date(2030, 7, 16), datetime.date(2030, 7, 18)),
+        ]
+        self.assertEqual(
+            ocupacao.pico_de_ausencias(intervalos, datetime.date(2030, 7, 1)),
+            (3, datetime.date(2030, 7, 12), intervalos[2]),
+        )
+        self.assertEqual(ocupacao.pico_de_ausencias(intervalos, datetime.date(2030, 7, 1), limite=2)[0], 2)
+
+    def test_sem_regra_vale_o_padrao(self):
+        self.assertFalse(self.validar('2030-07-25', '2030-08-05').is_valid())
+        with self.settings(FERIAS_CAPACIDADE_PADRAO=None):
+            self.assertTrue(self.validar('2030-07-10', '2030-07-25').is_valid())
+
+    def test_limite_de_pessoas_na_secretaria(self):
+        RegraCapacidade.objects.create(secretaria='SEMAD', max_pessoas=3)
+        self.assertTrue(self.validar('2030-07-01', '2030-07-11').is_valid())
+        form = self.validar('2030-07-05', '2030-07-14')
+        self.assertFalse(form.is_valid())
+        self.assertIn('Em 12/07/2030 já há 3 pessoas da sua secretaria de férias (máximo de 3)',
+                      form.non_field_errors()[0])
+
+    def test_porcentagem_do_quadro(self):
+        # 10 pessoas na SEMAD: 25% = 2 ao mesmo tempo
+        RegraCapacidade.objects.create(secretaria='SEMAD', max_percentual=25)
+        self.assertFalse(self.validar('2030-07-10', '2030-07-19').is_valid())
+        self.assertTrue(self.validar('2030-07-21', '2030-08-01').is_valid())
+
+    def test_regra_da_lotacao_soma_com_a_da_secretaria(self):
+        RegraCapacidade.objects.create(secretaria='SEMAD', max_pessoas=5)
+        RegraCapacidade.objects.create(secretaria='SEMAD', lotacao='Protocolo', max_pessoas=2)
+        form = self.validar('2030-07-10', '2030-07-19')
+        self.assertFalse(form.is_valid())
+        self.assertIn('da sua lotação', form.non_field_errors()[0])
+        self.assertTrue(self.validar('2030-07-16', '2030-07-25').is_valid())
+
+    def test_regra_exige_algum_limite(self):
+        with self.assertRaises(ValidationError):
+            RegraCapacidade(secretaria='SEMAD').full_clean()
+
+
+@unittest.skipUnless(BENCHMARK, 'benchmark: defina FERIAS_BENCHMARK=1')
+class CapacidadeSecretariaBenchmark(TestCase):
+    """Validação de capacidade com 10k férias aprovadas na mesma secretaria."""
+
+    def test_pico_com_10k_intervalos(self):
+        user = criar_usuario('ana')
+        dar_saldo(user, 400)
+        colegas = [criar_usuario(f'colega{i}') for i in range(300)]
+        RegraCapacidade.objects.create(secretaria='SEMAD', max_percentual=20)
+        # 4 férias novas por dia, de 10 dias: ~40 pessoas fora ao mesmo tempo, por ~7 anos
+        aprovar_em_massa(colegas, 10_000, inicio=datetime.date(2030, 1, 1))
+
+        janelas = {
+            'janela de 30 dias': (datetime.date(2031, 3, 1), datetime.date(2031, 3, 30)),
+            'histórico inteiro': (datetime.date(2030, 1, 1), datetime.date(2036, 12, 31)),
+        }
+        for nome, (inicio, fim) in janelas.items():
+            amostras = []
+            for _ in range(20):
+                t0 = time.perf_counter()
+                self.assertIsNone(ocupacao.verificar_capacidade('SEMAD', None, inicio, fim))
+                amostras.append(time.perf_counter() - t0)
+            amostras.sort()
+            p50 = amostras[len(amostras) // 2]
+            print(f'\n[benchmark capacidade] 10k aprovadas, {nome}: p50 {p50 * 1000:.3f} ms')
+            self.assertLess(p50, 0.1)
+
+        t0 = time.perf_counter()
+        self.assertTrue(SolicitacaoFeriasForm(
+            {'data_inicio': '2031-03-01', 'data_fim': '2031-03-30'}, user=user
+        ).is_valid())
+        print(f'[benchmark capacidade] formulário completo: {(time.perf_counter() - t0) * 1000:.3f} ms')
+
+
+class SugestaoJanelasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = criar_usuario('ana')
+        dar_saldo(cls.user)
+        SolicitacaoFerias.objects.create(
+            solicitante=criar_usuario('bruno'), status='APROVADA_FINAL',
+            data_inicio=datetime.date(2030, 7, 1), data_fim=datetime.date(2030, 7, 15),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('ferias:sugestoes_janelas')
+
+    def sugerir(self, **params):
+        params = {'dias': 10, 'inicio': '2030-06-25', 'horizonte': 60, 'quantidade': 3, **params}
+        return self.client.get(self.url, params)
+
+    def test_primeiras_janelas_livres_passam_no_formulario(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resposta = self.sugerir()
+        self.assertEqual(resposta.json()['janelas'], [
+            {'data_inicio': '2030-07-16', 'data_fim': '2030-07-25'},
+            {'data_inicio': '2030-07-26', 'data_fim': '2030-08-04'},
+            {'data_inicio': '2030-08-05', 'data_fim': '2030-08-14'},
+        ])
+        self.assertEqual(len([q for q in ctx.captured_queries if 'ferias_solicitacaoferias' in q['sql']]), 1)
+        for janela in resposta.json()['janelas']:
+            form = SolicitacaoFeriasForm(janela, user=self.user)
+            self.assertTrue(form.is_valid(), form.errors)
+
+    def test_capacidade_maior_abre_a_janela_antes(self):
+        RegraCapacidade.objects.create(secretaria='SEMAD', max_pessoas=2)
+        self.assertEqual(self.sugerir(quantidade=1).json()['janelas'],
+                         [{'data_inicio': '2030-06-25', 'data_fim': '2030-07-04'}])
+
+    def test_saldo_e_tempo_de_casa(self):
+        resposta = self.sugerir(dias=61)
+        self.assertEqual(resposta.json()['janelas'], [])
+        self.assertIn('Saldo insuficiente', resposta.json()['motivo'])
+
+        PerfilUsuario.objects.filter(user=self.user).update(data_contratacao=datetime.date(2030, 1, 1))
+        resposta = self.sugerir(horizonte=400, quantidade=1)
+        self.assertEqual(resposta.json()['janelas'], [{'data_inicio': '2031-01-01', 'data_fim': '2031-01-10'}])
+        self.assertIn('01/01/2031', self.sugerir().json()['motivo'])
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.sugerir(horizonte=1000).status_code, 400)
+        self.assertIn('mínimo', self.sugerir(dias=5).json()['motivo'])
+        self.assertEqual(self.sugerir(inicio='9999-12-25').status_code, 400)
+
+
+def csv_servidores(linhas):
+    """Grava um CSV de importação num arquivo temporário e devolve o caminho."""
+    arquivo = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8', newline='')
+    with arquivo:
+        arquivo.write('matricula,nome,email,cargo,lotacao,secretaria,data_contratacao,matricula_gestor,saldos\n')
+        arquivo.writelines(linha + '\n' for linha in linhas)
+    return arquivo.name
+
+
+class ImportarServidoresTests(TestCase):
+    def setUp(self):
+        self.existente = criar_usuario('existente', matricula='M000')
+        self.caminho = csv_servidores([
+            'M001,Ana Maria Souza,ana@exemplo.gov.br,Analista,Protocolo,SEFAZ,2020-03-15,M002,10|30',
+            'M002,Bruno Lima,bruno@exemplo.gov.br,Coordenador,Protocolo,SEFAZ,15/01/2018,M000,',
+            'M003,Carla,,Assistente,,SEFAZ,data-ruim,,',
+            'M000,Repetido,,,,SEFAZ,2020-01-01,,',
+            'M004,Davi,ana@exemplo.gov.br,,,SEFAZ,2021-01-01,,',
+        ])
+        self.addCleanup(os.remove, self.caminho)
+
+    def importar(self, *args, **options):
+        saida, erros = io.StringIO(), io.StringIO()
+        call_command('importar_servidores', self.caminho, *args, stdout=saida, stderr=erros, **options)
+        return saida.getvalue(), erros.getvalue()
+
+    def test_importa_com_periodos_saldos_e_gestores(self):
+        saida, erros = self.importar(lote=1)
+        self.assertIn('2 servidores importados', saida)
+        self.assertIn('1 já cadastrados e 2 linhas com erro', saida)
+        self.assertIn('linha 4: data_contratacao inválida', erros)
+        self.assertIn('linha 6: e-mail repetido no arquivo', erros)
+
+        ana = PerfilUsuario.objects.select_related('user', 'gestor').get(matricula='M001')
+        self.assertEqual((ana.user.username, ana.user.first_name, ana.user.last_name), ('M001', 'Ana', 'Maria Souza'))
+        self.assertFalse(ana.user.has_usable_password())
+        self.assertEqual(ana.gestor.matricula, 'M002')
+        self.assertTrue(ana.onboarding_completo)
+        # Os saldos vão para os períodos mais recentes; os anteriores ficam fechados
+        periodos = list(ana.periodos_aquisitivos.order_by('data_inicio_aquisitivo').values_list('dias_disponiveis', 'status'))
+        self.assertEqual(periodos[-2:], [(10, 'ABERTO'), (30, 'ABERTO')])
+        self.assertTrue(all(periodo == (0, 'FECHADO') for periodo in periodos[:-2]))
+        self.assertEqual((ana.saldo_total, ana.periodo_a_vencer.dias_disponiveis), (40, 10))
+
+        bruno = PerfilUsuario.objects.get(matricula='M002')
+        self.assertFalse(bruno.onboarding_completo)
+        self.assertEqual(bruno.gestor, self.existente.perfil)
+        self.assertEqual(bruno.saldo_total, 30 * bruno.periodos_aquisitivos.count())
+
+        # Sem o signal, nenhum perfil "vazio" a mais; a hierarquia foi refeita
+        self.assertEqual(PerfilUsuario.objects.count(), User.objects.count())
+        self.assertEqual(list(HierarquiaPerfil.objects.filter(
+            ancestral=self.existente.perfil, profundidade__gt=0
+        ).order_by('profundidade').values_list('descendente__matricula', 'profundidade')), [('M002', 1), ('M001', 2)])
+
+        saida, _ = self.importar()
+        self.assertIn('0 servidores importados', saida)
+        self.assertIn('3 já cadastrados', saida)
+
+    def test_ciclo_de_gestores_e_email_sem_diferenciar_maiusculas(self):
+        User.objects.filter(pk=self.existente.pk).update(email='Bruno@Exemplo.gov.br')
+        with open(self.caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(
+                'matricula,nome,email,secretaria,data_contratacao,matricula_gestor\n'
+                'M010,Eva,,SEFAZ,2020-01-01,M011\n'
+                'M011,Fabio,,SEFAZ,2020-01-01,M010\n'
+                'M012,Gil,,SEFAZ,2020-01-01,M013\n'
+                'M013,Hugo,,SEFAZ,2020-01-01,M010\n'
+                'M014,Bruno,bruno@exemplo.gov.br,SEFAZ,2020-01-01,\n'
+            )
+        saida, erros = self.importar(lote=1)
+        self.assertIn('4 servidores importados', saida)
+        self.assertIn('linha 2: gestor M011 não ligado: fecharia um ciclo', erros)
+        self.assertIn('linha 6: e-mail já cadastrado: bruno@exemplo.gov.br', erros)
+
+        gestores = dict(PerfilUsuario.objects.filter(matricula__startswith='M01').values_list(
+            'matricula', 'gestor__matricula'
+        ))
+        self.assertEqual(gestores, {'M010': None, 'M011': 'M010', 'M012': 'M013', 'M013': 'M010'})
+        self.assertIn(('M010', 'M012', 2), set(HierarquiaPerfil.objects.values_list(
+            'ancestral__matricula', 'descendente__matricula', 'profundidade'
+        )))
+
+    def test_dry_run_nao_grava(self):
+        saida, _ = self.importar('--dry-run')
+        self.assertIn('2 servidores seriam importados', saida)
+        self.assertFalse(PerfilUsuario.objects.filter(matricula__in=['M001', 'M002']).exists())
+
+    def test_cabecalho_incompleto(self):
+        with open(self.caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write('matricula,nome\nM9,Fulano\n')
+        with self.assertRaisesMessage(CommandError, 'data_contratacao, secretaria'):
+            self.importar()
+
+
+@unittest.skipUnless(BENCHMARK, 'benchmark: defina FERIAS_BENCHMARK=1')
+class ImportarServidoresBenchmark(TestCase):
+    """50 mil linhas devem entrar em menos de um minuto no SQLite."""
+
+    def test_50k_linhas(self):
+        caminho = csv_servidores(
+            f'B{i:06d},Servidor {i},b{i}@exemplo.gov.br,Analista,Lotação {i % 20},SEC{i % 5},'
+            f'{2010 + i % 14}-{i % 12 + 1:02d}-01,{f"B{(i - 1) // 8:06d}" if i else ""},{"30" if i % 2 else ""}'
+            for i in range(50_000)
+        )
+        self.addCleanup(os.remove, caminho)
+        inicio = time.perf_counter()
+        saida = io.StringIO()
+        call_command('importar_servidores', caminho, stdout=saida)
+        duracao = time.perf_counter() - inicio
+        print(f'\n[benchmark importação] 50000 linhas em {duracao:.1f}s')
+        self.assertIn('50000 servidores importados', saida.getvalue())
+        self.assertEqual(PerfilUsuario.objects.filter(gestor__isnull=False, matricula__startswith='B').count(), 49_999)
+        self.assertLess(duracao, 60)
@@ -9,6 +9,7 @@ urlpatterns = [
     # URLs Principais
     path('', views.dashboard, name='dashboard'),
     path('solicitar/', views.solicitar_ferias, name='solicitar_ferias'),
+    path('solicitar/sugestoes/', views.api_sugestoes_janelas, name='sugestoes_janelas'),
     
     # URLs de Perfil
     path('perfil/', views.ver_perfil, name='ver_perfil'),
@@ -18,6 +19,7 @@ urlpatterns = [
     path('gestao/', views.dashboard_gestor, name='dashboard_gestor'),
     path('gestao/aprovar/<int:pk>/', views.aprovar_solicitacao, name='aprovar_solicitacao'),
     path('gestao/rejeitar/<int:pk>/', views.rejeitar_solicitacao, name='rejeitar_solicitacao'),
+    path('gestao/lote/', views.acao_em_lote, name='acao_em_lote'),
     
     # URLs do Onboarding
     path('onboarding/', views.onboarding_view, name='onboarding'),
@@ -25,5 +27,8 @@ urlpatterns = [
     # URLs de Utilidades
     path('tema/<str:tema>/', views.definir_tema, name='definir_tema'),
     path('api/eventos/', views.api_eventos_ferias, name='api_eventos'),
+    path('api/cache/estatisticas/', views.api_estatisticas_cache, name='api_estatisticas_cache'),
+    path('api/gestao/equipe/', views.api_equipe, name='api_equipe'),
+    path('api/ocupacao/', views.api_ocupacao, name='api_ocupacao'),
     path('calendario/', views.calendario_ferias, name='calendario'),
 ]
\ No newline at end of file
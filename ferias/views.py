@@ -2,23 +2,42 @@
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.utils import timezone
 from django.db import transaction, IntegrityError
-from django.core.exceptions import ValidationError
-from django.http import JsonResponse, HttpResponseRedirect
+from django.db.models import Q
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import JsonResponse, HttpResponse, HttpResponseRedirect
 from django.urls import reverse
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_POST
 import datetime
+import json
 from django.contrib import messages
 from django.contrib.auth import login # Para auto-login no cadastro
 
 # Importamos os novos modelos e formulários
 from .models import PerfilUsuario, PeriodoAquisitivo, SolicitacaoFerias, DescontoFerias
+from .middleware import SESSAO_ONBOARDING
+from .db_router import leitura_na_replica
+from .metricas import exportar_prometheus
+from .cache import (
+    versao_eventos, chave_payload_eventos, chave_payload_ocupacao, estatisticas_fragmentos, versao_fragmentos,
+    TEMPO_PAYLOAD_EVENTOS,
+)
+from .ocupacao import JANELA_MAXIMA_OCUPACAO, mapa_de_ocupacao, sugerir_janelas
+from .services import (
+    efetivar_aprovacao, processar_lote, recalcular_saldos, rejeitar_pendentes, reservar_periodos, subarvore,
+    RESULTADOS_LOTE,
+)
 from .forms import (
     SolicitacaoFeriasForm, CustomLoginForm, UserEditForm, 
     PerfilUsuarioEditForm, CadastroForm
 )
 
 # --- VIEW DO DASHBOARD ---
+@leitura_na_replica
 @login_required
 def dashboard(request):
     try:
@@ -26,19 +45,18 @@ def dashboard(request):
     except PerfilUsuario.DoesNotExist:
         perfil = None
 
-    solicitacoes = SolicitacaoFerias.objects.filter(solicitante=request.user).order_by('-data_solicitacao')
+    # Querysets preguiçosos: com os fragmentos no cache, não chegam a rodar
+    solicitacoes = SolicitacaoFerias.objects.filter(
+        solicitante=request.user
+    ).prefetch_related('periodos_utilizados').order_by('-data_solicitacao')
     # Checa se o usuário logado é gestor de ALGUÉM
     is_gestor = PerfilUsuario.objects.filter(gestor=perfil).exists()
 
-    periodo_ativo = PeriodoAquisitivo.objects.filter(
-        perfil=perfil,
-        dias_disponiveis__gt=0
-    ).order_by('data_inicio_aquisitivo').first()
-
     context = {
+        'perfil': perfil,
         'solicitacoes': solicitacoes,
         'is_gestor': is_gestor,
-        'periodo_ativo': periodo_ativo,
+        'versao_fragmentos': versao_fragmentos(request.user.pk),
     }
     return render(request, 'ferias/dashboard.html', context)
 
@@ -49,44 +67,80 @@ def solicitar_ferias(request):
     if request.method == 'POST':
         form = SolicitacaoFeriasForm(request.POST, user=request.user)
         if form.is_valid():
-            solicitacao = form.save(commit=False)
-            solicitacao.solicitante = request.user
-            solicitacao.status = 'PENDENTE_GESTOR' 
-            solicitacao.save() 
-            
-            dias_a_descontar = (form.cleaned_data['data_fim'] - form.cleaned_data['data_inicio']).days + 1
             perfil = request.user.perfil
-            
-            periodos_com_saldo = PeriodoAquisitivo.objects.filter(
-                perfil=perfil,
-                dias_disponiveis__gt=0
-            ).order_by('data_inicio_aquisitivo')
-            
-            for periodo in periodos_com_saldo:
-                if dias_a_descontar == 0:
-                    break
-                if periodo.dias_disponiveis >= dias_a_descontar:
-                    DescontoFerias.objects.create(
-                        solicitacao=solicitacao,
-                        periodo_aquisitivo=periodo,
-                        dias_descontados=dias_a_descontar
-                    )
-                    dias_a_descontar = 0
-                else:
-                    dias_para_descontar_deste_periodo = periodo.dias_disponiveis
-                    DescontoFerias.objects.create(
-                        solicitacao=solicitacao,
-                        periodo_aquisitivo=periodo,
-                        dias_descontados=dias_para_descontar_deste_periodo
-                    )
-                    dias_a_descontar -= dias_para_descontar_deste_periodo
-            
-            return redirect('ferias:dashboard')
+            try:
+                with transaction.atomic():
+                    solicitacao = form.save(commit=False)
+                    solicitacao.solicitante = request.user
+                    solicitacao.secretaria = perfil.secretaria
+                    solicitacao.status = 'PENDENTE_GESTOR'
+                    solicitacao.save()
+                    # Cascata pelos períodos, descontando o que outras pendentes já reservaram
+                    reservar_periodos(solicitacao, perfil)
+            except IntegrityError:
+                form.add_error(None, "Seu saldo mudou enquanto o pedido era enviado. Confira os dias e tente de novo.")
+            else:
+                return redirect('ferias:dashboard')
     else:
         form = SolicitacaoFeriasForm(user=request.user)
     return render(request, 'ferias/solicitar_ferias.html', {'form': form})
 
+HORIZONTE_PADRAO_SUGESTOES = 180
+MAXIMO_SUGESTOES = 20
+# Ninguém planeja férias para daqui a mais de 10 anos (e datas perto de
+# 9999 estourariam as contas de data da sugestão)
+INICIO_MAXIMO_SUGESTOES = datetime.timedelta(days=3653)
+
+@login_required
+def api_sugestoes_janelas(request):
+    """
+    Primeiras janelas livres para ?dias=N (>= 10) a partir de ?inicio (padrão:
+    hoje) até ?horizonte dias depois, respeitando saldo, tempo de casa e a
+    capacidade da secretaria/lotação. ?quantidade limita o número de janelas.
+    """
+    try:
+        perfil = request.user.perfil
+    except PerfilUsuario.DoesNotExist:
+        return JsonResponse({'erro': 'Usuário sem perfil.'}, status=403)
+
+    try:
+        dias = int(request.GET['dias'])
+        horizonte = int(request.GET.get('horizonte', HORIZONTE_PADRAO_SUGESTOES))
+        quantidade = int(request.GET.get('quantidade', 5))
+        inicio = _parse_data_param(request.GET.get('inicio')) or timezone.now().date()
+    except (KeyError, ValueError):
+        return JsonResponse({'erro': 'Informe dias (inteiro) e, opcionalmente, inicio, horizonte e quantidade.'}, status=400)
+    if not (0 < horizonte <= JANELA_MAXIMA_OCUPACAO and 0 < quantidade <= MAXIMO_SUGESTOES):
+        return JsonResponse({
+            'erro': f'horizonte vai de 1 a {JANELA_MAXIMA_OCUPACAO} dias e quantidade de 1 a {MAXIMO_SUGESTOES}.'
+        }, status=400)
+    if inicio > timezone.now().date() + INICIO_MAXIMO_SUGESTOES:
+        return JsonResponse({'erro': 'inicio pode ser no máximo daqui a 10 anos.'}, status=400)
+
+    try:
+        janelas, motivo = sugerir_janelas(perfil, dias, inicio, horizonte, quantidade)
+    except OverflowError:
+        return JsonResponse({'erro': 'Janela fora do calendário.'}, status=400)
+    return JsonResponse({
+        'dias': dias,
+        'inicio': inicio.isoformat(),
+        'horizonte': horizonte,
+        'saldo_livre': perfil.saldo_livre,
+        'motivo': motivo,
+        'janelas': [
+            {'data_inicio': comeco.isoformat(), 'data_fim': fim.isoformat()} for comeco, fim in janelas
+        ],
+    })
+
 # --- VIEW DO PAINEL DO GESTOR ---
+ITENS_POR_PAGINA_GESTOR = 25
+
+def _filtro_equipe(perfil_gestor, escopo):
+    """Q das solicitações da equipe direta ou de toda a subárvore do gestor."""
+    if escopo == 'subarvore':
+        return Q(solicitante__perfil__in=subarvore(perfil_gestor))
+    return Q(solicitante__in=PerfilUsuario.objects.filter(gestor=perfil_gestor).values('user_id'))
+
 @login_required
 def dashboard_gestor(request):
     try:
@@ -99,16 +153,40 @@ def dashboard_gestor(request):
         messages.error(request, "Você não tem permissão para acessar o painel do gestor.")
         return redirect('ferias:dashboard')
 
-    equipe_qs = PerfilUsuario.objects.filter(gestor=perfil_gestor)
-    membros_da_equipe_users = [p.user for p in equipe_qs]
-    
+    # Equipe como subquery (nada de montar a lista de usuários em Python).
+    # ?escopo=subarvore inclui todos os níveis abaixo, via HierarquiaPerfil.
+    escopo = 'subarvore' if request.GET.get('escopo') == 'subarvore' else 'diretos'
     solicitacoes_pendentes = SolicitacaoFerias.objects.filter(
-        solicitante__in=membros_da_equipe_users, 
+        _filtro_equipe(perfil_gestor, escopo),
         status='PENDENTE_GESTOR'
-    ).order_by('data_inicio')
+    ).select_related('solicitante__perfil').prefetch_related('periodos_utilizados').order_by('data_inicio', 'pk')
+
+    # Paginação por cursor (keyset): ?apos=<data_inicio>_<pk> do último item visto
+    cursor = request.GET.get('apos')
+    if cursor:
+        try:
+            data_cursor, pk_cursor = cursor.split('_')
+            data_cursor = datetime.date.fromisoformat(data_cursor)
+            pk_cursor = int(pk_cursor)
+        except ValueError:
+            return redirect('ferias:dashboard_gestor')
+        solicitacoes_pendentes = solicitacoes_pendentes.filter(
+            Q(data_inicio__gt=data_cursor) | Q(data_inicio=data_cursor, pk__gt=pk_cursor)
+        )
+
+    pagina = list(solicitacoes_pendentes[:ITENS_POR_PAGINA_GESTOR + 1])
+    proximo_cursor = None
+    if len(pagina) > ITENS_POR_PAGINA_GESTOR:
+        pagina = pagina[:ITENS_POR_PAGINA_GESTOR]
+        ultimo = pagina[-1]
+        proximo_cursor = f"{ultimo.data_inicio.isoformat()}_{ultimo.pk}"
     
     context = {
-        'solicitacoes_pendentes': solicitacoes_pendentes,
+        'solicitacoes_pendentes': pagina,
+        'proximo_cursor': proximo_cursor,
+        'pagina_inicial': not cursor,
+        'escopo': escopo,
+        'perfil_gestor': perfil_gestor,
     }
     return render(request, 'ferias/dashboard_gestor.html', context)
 
@@ -116,29 +194,17 @@ def dashboard_gestor(request):
 @login_required
 @transaction.atomic
 def aprovar_solicitacao(request, pk):
-    solicitacao = get_object_or_404(SolicitacaoFerias, pk=pk)
+    # Trava a solicitação: duas aprovações simultâneas não descontam duas vezes
+    solicitacao = get_object_or_404(SolicitacaoFerias.objects.select_for_update(), pk=pk)
     
     # TODO: Checar permissão (se o user é o gestor do solicitante)
-    
-    solicitacao.status = 'APROVADA_FINAL'
-    solicitacao.aprovador_gestor = request.user
-    solicitacao.data_aprovacao_gestor = timezone.now()
-    
-    descontos_a_fazer = DescontoFerias.objects.filter(solicitacao=solicitacao)
+
+    if solicitacao.status != 'PENDENTE_GESTOR':
+        messages.error(request, "Esta solicitação já foi analisada.")
+        return redirect('ferias:dashboard_gestor')
     
     try:
-        for desconto in descontos_a_fazer:
-            periodo = desconto.periodo_aquisitivo
-            
-            if periodo.dias_disponiveis >= desconto.dias_descontados:
-                periodo.dias_disponiveis -= desconto.dias_descontados
-                if periodo.dias_disponiveis == 0:
-                    periodo.status = 'FECHADO'
-                periodo.save()
-            else:
-                raise IntegrityError("Falha na aprovação. Saldo insuficiente detectado.")
-        
-        solicitacao.save()
+        efetivar_aprovacao(solicitacao, request.user)
         messages.success(request, "Férias aprovadas com sucesso!")
         
     except IntegrityError:
@@ -146,24 +212,80 @@ def aprovar_solicitacao(request, pk):
     
     return redirect('ferias:dashboard_gestor')
 
+# --- VIEW DE AÇÃO EM LOTE (APROVAR/REJEITAR VÁRIAS) ---
+@login_required
+@require_POST
+def acao_em_lote(request):
+    try:
+        perfil_gestor = request.user.perfil
+    except PerfilUsuario.DoesNotExist:
+        return redirect('ferias:dashboard')
+
+    ids = request.POST.getlist('solicitacoes')
+    acao = request.POST.get('acao')
+    quer_json = 'application/json' in request.headers.get('Accept', '')
+
+    if not ids:
+        if quer_json:
+            return JsonResponse({'erro': 'Nenhuma solicitação selecionada.'}, status=400)
+        messages.error(request, "Selecione ao menos uma solicitação.")
+        return redirect('ferias:dashboard_gestor')
+
+    try:
+        resultado = processar_lote(
+            perfil_gestor, request.user, ids, acao,
+            motivo=request.POST.get('motivo_rejeicao', ''),
+        )
+    except ValueError:
+        if quer_json:
+            return JsonResponse({'erro': 'Ação ou solicitações inválidas.'}, status=400)
+        messages.error(request, "Ação ou solicitações inválidas.")
+        return redirect('ferias:dashboard_gestor')
+    except PermissionDenied:
+        if quer_json:
+            return JsonResponse({'erro': 'Há solicitações de fora da sua equipe.'}, status=403)
+        messages.error(request, "Você só pode analisar solicitações da sua equipe.")
+        return redirect('ferias:dashboard_gestor')
+
+    if quer_json:
+        return JsonResponse({'resultado': [
+            {'id': pk, 'resultado': chave, 'descricao': RESULTADOS_LOTE[chave]}
+            for pk, chave in sorted(resultado.items())
+        ]})
+
+    contagem = {}
+    for chave in resultado.values():
+        contagem[chave] = contagem.get(chave, 0) + 1
+    resumo = ', '.join(f"{RESULTADOS_LOTE[chave]}: {total}" for chave, total in contagem.items())
+    if contagem.get('aprovada') or contagem.get('rejeitada'):
+        messages.success(request, f"Ação em lote concluída. {resumo}.")
+    else:
+        messages.error(request, f"Nenhuma solicitação foi alterada. {resumo}.")
+    return redirect('ferias:dashboard_gestor')
+
 # --- VIEW DE REJEIÇÃO ---
 @login_required
+@transaction.atomic
 def rejeitar_solicitacao(request, pk):
     solicitacao = get_object_or_404(SolicitacaoFerias, pk=pk)
     
     # TODO: Checar permissão
     
     if request.method == 'POST':
-        solicitacao.status = 'REJEITADA'
-        solicitacao.aprovador_gestor = request.user 
-        solicitacao.data_aprovacao_gestor = timezone.now()
-        solicitacao.motivo_rejeicao = request.POST.get('motivo_rejeicao', '')
-        solicitacao.save()
-        messages.success(request, "Solicitação rejeitada.")
+        # Mesmo caminho da rejeição em lote: trava a linha e só rejeita se
+        # ainda estiver pendente (devolvendo os dias reservados)
+        if rejeitar_pendentes(
+            SolicitacaoFerias.objects.filter(pk=solicitacao.pk), request.user,
+            motivo=request.POST.get('motivo_rejeicao', ''),
+        ):
+            messages.success(request, "Solicitação rejeitada.")
+        else:
+            messages.error(request, "Esta solicitação já foi analisada.")
     
     return redirect('ferias:dashboard_gestor')
 
 # --- VIEWS DE PERFIL ---
+@leitura_na_replica
 @login_required
 def ver_perfil(request):
     try:
@@ -176,7 +298,8 @@ def ver_perfil(request):
     ).order_by('data_inicio_aquisitivo')
     context = {
         'perfil': perfil,
-        'periodos_abertos': periodos_abertos
+        'periodos_abertos': periodos_abertos,
+        'versao_fragmentos': versao_fragmentos(request.user.pk),
     }
     return render(request, 'ferias/perfil.html', context)
 
@@ -265,6 +388,8 @@ def onboarding_view(request):
             
             perfil.onboarding_completo = True
             perfil.save()
+            recalcular_saldos(PerfilUsuario.objects.filter(pk=perfil.pk))
+            request.session[SESSAO_ONBOARDING] = True
             
             return redirect('ferias:dashboard')
 
@@ -277,21 +402,209 @@ def onboarding_view(request):
     return render(request, 'ferias/onboarding.html', context)
 
 # --- VIEWS DE UTILIDADE ---
+def _parse_data_param(valor):
+    """
+    Converte o parâmetro 'start'/'end' do FullCalendar em date.
+    O FullCalendar envia ISO 8601 com hora e fuso (ex: 2025-10-26T00:00:00-03:00),
+    então só os 10 primeiros caracteres interessam.
+    """
+    if not valor:
+        return None
+    return datetime.date.fromisoformat(valor[:10])
+
+def _eventos_json(linhas):
+    """
+    Gera o JSON dos eventos aos pedaços, direto das tuplas do banco,
+    sem materializar instâncias de modelo.
+    """
+    yield '['
+    for i, (first_name, last_name, username, data_inicio, data_fim) in enumerate(linhas):
+        nome = f"{first_name} {last_name}".strip() or username
+        if i:
+            yield ','
+        yield json.dumps({
+            'title': nome,
+            'start': data_inicio.isoformat(),
+            'end': (data_fim + datetime.timedelta(days=1)).isoformat(),
+        })
+    yield ']'
+
+def _janela_eventos(request):
+    """Lê (inicio, fim, secretaria, lotacao) da query string. Levanta ValueError se inválida."""
+    return (
+        _parse_data_param(request.GET.get('start')),
+        _parse_data_param(request.GET.get('end')),
+        request.GET.get('secretaria') or None,
+        request.GET.get('lotacao') or None,
+    )
+
+def _etag_eventos(request):
+    try:
+        janela = _janela_eventos(request)
+    except ValueError:
+        return None
+    versao, _ = versao_eventos()
+    return chave_payload_eventos(versao, *janela)
+
+def _modificado_eventos(request):
+    _, modificado = versao_eventos()
+    return modificado
+
+@leitura_na_replica
 @login_required
+@condition(etag_func=_etag_eventos, last_modified_func=_modificado_eventos)
 def api_eventos_ferias(request):
-    ferias_aprovadas = SolicitacaoFerias.objects.filter(status='APROVADA_FINAL')
-    eventos = []
-    for ferias in ferias_aprovadas:
-        eventos.append({
-            'title': ferias.solicitante.get_full_name() or ferias.solicitante.username,
-            'start': ferias.data_inicio,
-            'end': ferias.data_fim + datetime.timedelta(days=1),
-        })
-    return JsonResponse(eventos, safe=False)
+    try:
+        inicio, fim, secretaria, lotacao = _janela_eventos(request)
+    except ValueError:
+        return JsonResponse({'erro': 'Parâmetros start/end inválidos.'}, status=400)
+
+    versao, _ = versao_eventos()
+    chave = chave_payload_eventos(versao, inicio, fim, secretaria, lotacao)
+    payload = cache.get(chave)
+
+    if payload is None:
+        ferias_aprovadas = SolicitacaoFerias.objects.filter(status='APROVADA_FINAL')
+        # Sobreposição com a janela [inicio, fim) pedida pelo calendário
+        if fim:
+            ferias_aprovadas = ferias_aprovadas.filter(data_inicio__lt=fim)
+        if inicio:
+            ferias_aprovadas = ferias_aprovadas.filter(data_fim__gte=inicio)
+        if secretaria:
+            ferias_aprovadas = ferias_aprovadas.filter(solicitante__perfil__secretaria=secretaria)
+        if lotacao:
+            ferias_aprovadas = ferias_aprovadas.filter(solicitante__perfil__lotacao=lotacao)
+
+        linhas = ferias_aprovadas.order_by('data_inicio').values_list(
+            'solicitante__first_name', 'solicitante__last_name', 'solicitante__username',
+            'data_inicio', 'data_fim',
+        ).iterator(chunk_size=2000)
+
+        payload = ''.join(_eventos_json(linhas))
+        cache.set(chave, payload, TEMPO_PAYLOAD_EVENTOS)
+
+    resposta = HttpResponse(payload, content_type='application/json')
+    # O navegador guarda, mas sempre revalida com If-None-Match/If-Modified-Since
+    patch_cache_control(resposta, private=True, no_cache=True)
+    return resposta
+
+def _janela_ocupacao(request):
+    """
+    Lê (inicio, fim, secretaria, lotacao) da query string. Sem start/end,
+    usa os próximos 30 dias. Levanta ValueError se a janela for inválida.
+    """
+    inicio, fim, secretaria, lotacao = _janela_eventos(request)
+    inicio = inicio or timezone.now().date()
+    try:
+        fim = fim or inicio + datetime.timedelta(days=30)
+    except OverflowError:
+        # start=9999-12-31 sem end: os 30 dias passariam de date.max
+        raise ValueError('janela de ocupação fora do calendário')
+    if not 0 < (fim - inicio).days <= JANELA_MAXIMA_OCUPACAO:
+        raise ValueError('janela de ocupação inválida')
+    return inicio, fim, secretaria, lotacao
+
+def _etag_ocupacao(request):
+    try:
+        janela = _janela_ocupacao(request)
+    except ValueError:
+        return None
+    versao, _ = versao_eventos()
+    return chave_payload_ocupacao(versao, *janela)
+
+@leitura_na_replica
+@login_required
+@condition(etag_func=_etag_ocupacao, last_modified_func=_modificado_eventos)
+def api_ocupacao(request):
+    """
+    Quantas pessoas estão de férias aprovadas em cada dia da janela
+    start/end, por secretaria e/ou lotação (o mapa de calor do calendário).
+    """
+    try:
+        janela = _janela_ocupacao(request)
+    except ValueError:
+        return JsonResponse(
+            {'erro': f'Parâmetros start/end inválidos (máximo de {JANELA_MAXIMA_OCUPACAO} dias).'}, status=400
+        )
+
+    versao, _ = versao_eventos()
+    chave = chave_payload_ocupacao(versao, *janela)
+    payload = cache.get(chave)
+    if payload is None:
+        payload = json.dumps(mapa_de_ocupacao(*janela))
+        cache.set(chave, payload, TEMPO_PAYLOAD_EVENTOS)
+
+    resposta = HttpResponse(payload, content_type='application/json')
+    patch_cache_control(resposta, private=True, no_cache=True)
+    return resposta
+
+@staff_member_required
+def metricas(request):
+    """Histogramas por view (tempo, consultas e tempo de SQL) no formato texto do Prometheus."""
+    return HttpResponse(exportar_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@staff_member_required
+def api_estatisticas_cache(request):
+    """Acertos/falhas dos fragmentos em cache (contadores deste processo, se o cache for LocMem)."""
+    return JsonResponse({'fragmentos': estatisticas_fragmentos()})
+
+@login_required
+def api_equipe(request):
+    """
+    Pendências e ausências (férias aprovadas na janela start/end) da equipe
+    do gestor. ?escopo=diretos limita aos subordinados diretos; o padrão é
+    a subárvore inteira.
+    """
+    try:
+        perfil_gestor = request.user.perfil
+    except PerfilUsuario.DoesNotExist:
+        return JsonResponse({'erro': 'Usuário sem perfil.'}, status=403)
+
+    escopo = 'diretos' if request.GET.get('escopo') == 'diretos' else 'subarvore'
+    try:
+        inicio, fim, _, _ = _janela_ocupacao(request)
+    except ValueError:
+        return JsonResponse(
+            {'erro': f'Parâmetros start/end inválidos (máximo de {JANELA_MAXIMA_OCUPACAO} dias).'}, status=400
+        )
+
+    equipe = SolicitacaoFerias.objects.filter(_filtro_equipe(perfil_gestor, escopo))
+    campos = (
+        'pk', 'solicitante__first_name', 'solicitante__last_name', 'solicitante__username',
+        'solicitante__perfil__gestor_id', 'data_inicio', 'data_fim',
+    )
+
+    def serializar(linhas):
+        return [
+            {
+                'id': pk,
+                'nome': f"{first_name} {last_name}".strip() or username,
+                'direto': gestor_id == perfil_gestor.pk,
+                'data_inicio': data_inicio.isoformat(),
+                'data_fim': data_fim.isoformat(),
+            }
+            for pk, first_name, last_name, username, gestor_id, data_inicio, data_fim in linhas
+        ]
+
+    pendentes = equipe.filter(status='PENDENTE_GESTOR').order_by('data_inicio', 'pk').values_list(*campos)
+    ausencias = equipe.filter(
+        status='APROVADA_FINAL', data_inicio__lt=fim, data_fim__gte=inicio
+    ).order_by('data_inicio', 'pk').values_list(*campos)
+
+    return JsonResponse({
+        'escopo': escopo,
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'pendentes': serializar(pendentes),
+        'ausencias': serializar(ausencias),
+    })
 
+@leitura_na_replica
 @login_required
 def calendario_ferias(request):
-    return render(request, 'ferias/calendario.html')
+    # ?modo=mapa troca os eventos por pessoa pelo mapa de calor da ocupação
+    modo = 'mapa' if request.GET.get('modo') == 'mapa' else 'eventos'
+    return render(request, 'ferias/calendario.html', {'modo': modo})
 
 @login_required
 def definir_tema(request, tema):